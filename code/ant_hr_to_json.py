@@ -8,9 +8,25 @@ Run from HRP_shreayaa/code with venv active:
 
 This script:
 
-- Runs `python -m openant scan --device_type HeartRate --auto_create`
-- Parses its text output to extract device_id + heart_rate
-- Prints one JSON object per HR sample to stdout (newline-delimited)
+- Opens one or more ANT+ sticks in-process through openant and lets
+  ant_scheduler.py spread heart-rate straps over their channels
+- Prints one JSON object per heartbeat to stdout (newline-delimited), with
+  the RR interval from the strap, or compact hr_wire binary frames with
+  --format binary
+
+--device-id N (repeatable) opens known straps without scanning; --pairing
+FILE remembers straps between runs; --sticks N uses several dongles.
+--source replay runs the same scheduler against simulated sticks that replay
+recorded logs (outputs/hr_logs by default), e.g. a 40-strap room:
+
+    python ant_hr_to_json.py --source replay --devices 40 --sticks 6
+
+--source scan keeps the old behaviour of running
+`python -m openant scan --device_type HeartRate --auto_create` and parsing
+its text output (one line per broadcast, rr_ms always null).
+
+Diagnostics go to stderr through hr_logging: one [summary] line per second
+by default, or every [raw]/[match]/[json] line with --log-level DEBUG.
 
 JSON format emitted (matches simulator):
 
@@ -20,17 +36,33 @@ JSON format emitted (matches simulator):
       "ts_iso": "...",
       "device_id": 51861,
       "bpm": 88,
-      "rr_ms": null
+      "rr_ms": 681.6
     }
   }
 """
 
+import argparse
 import json
+import logging
 import re
 import subprocess
 import sys
 from datetime import datetime, timezone
 
+from pathlib import Path
+
+from ant_scheduler import ChannelScheduler, PairingStore
+from ant_source import CHANNELS_PER_STICK, OpenantStick, ReplayAir, SimulatedStick
+from hr_logging import ThroughputSummary, add_logging_arguments, get_logger, setup_logging
+from hr_wire import MessageWriter, add_format_argument
+
+log = get_logger("hr_to_json")
+raw_log = get_logger("raw")
+match_log = get_logger("match")
+json_log = get_logger("json")
+
+DEFAULT_REPLAY = Path(__file__).resolve().parents[1] / "outputs" / "hr_logs"
+
 # Be forgiving: just look for "heart_rate_<digits>" and "heart_rate=<digits>"
 HR_LINE_RE = re.compile(
     r"heart_rate_(\d+).*heart_rate=(\d+)",
@@ -38,7 +70,63 @@ HR_LINE_RE = re.compile(
 )
 
 
-def main() -> None:
+class ReadingEmitter:
+    """Build hr_single messages and write them to stdout."""
+
+    def __init__(self, out: MessageWriter, summary: ThroughputSummary) -> None:
+        self.out = out
+        self.summary = summary
+
+    def __call__(self, device_id: int, heart_rate: float, rr_ms: float | None = None) -> None:
+        payload = {
+            "type": "hr_single",
+            "reading": {
+                "ts_iso": datetime.now(timezone.utc).isoformat(),
+                "device_id": device_id,
+                "bpm": heart_rate,
+                "rr_ms": rr_ms,
+            },
+        }
+        match_log.debug("device=%s hr=%s rr=%s", device_id, heart_rate, rr_ms)
+        if json_log.isEnabledFor(logging.DEBUG):
+            json_log.debug("%s", json.dumps(payload))
+        self.summary.record(str(device_id))
+
+        # JSON line (or binary frame) to stdout (this is what we’ll pipe)
+        self.out.emit(payload)
+
+
+def build_sticks(args: argparse.Namespace) -> list:
+    if args.source == "native":
+        return [OpenantStick(i, args.channels) for i in range(args.sticks)]
+    air = ReplayAir.from_paths(
+        args.replay or [DEFAULT_REPLAY], devices=args.devices, speed=args.speed
+    )
+    log.info("replaying %d straps", len(air.device_ids()))
+    return [SimulatedStick(air, i, args.channels) for i in range(args.sticks)]
+
+
+def run_scheduler(emit: ReadingEmitter, args: argparse.Namespace) -> None:
+    scheduler = ChannelScheduler(
+        build_sticks(args),
+        emit,
+        known=args.device_id,
+        store=PairingStore(args.pairing) if args.pairing else None,
+        discover=not args.device_id,
+        drop_after=args.drop_after,
+    )
+    log.info("starting %s ANT+ heart-rate source on %d stick(s)", args.source, args.sticks)
+    log.info("make sure at least one strap is on & awake")
+    try:
+        scheduler.run()
+    except KeyboardInterrupt:
+        log.info("received Ctrl+C, stopping")
+    finally:
+        for stick, devices in scheduler.status().items():
+            log.info("stick %d channels: %s", stick, devices)
+
+
+def run_scan(emit: ReadingEmitter) -> None:
     cmd = [
         sys.executable,
         "-u",
@@ -50,9 +138,9 @@ def main() -> None:
         "--auto_create",
     ]
 
-    print("=== hr_to_json: starting ANT+ heart-rate scan ===", file=sys.stderr)
-    print("Subprocess command:", " ".join(cmd), file=sys.stderr)
-    print("Make sure at least one strap is on & awake.\n", file=sys.stderr)
+    log.info("starting ANT+ heart-rate scan")
+    log.info("subprocess command: %s", " ".join(cmd))
+    log.info("make sure at least one strap is on & awake")
 
     proc = subprocess.Popen(
         cmd,
@@ -69,7 +157,7 @@ def main() -> None:
             line = line.rstrip("\r\n")
 
             # Debug: show every line we get from openant
-            print(f"[raw] {line}", file=sys.stderr)
+            raw_log.debug("%s", line)
 
             # Try to extract device id + heart rate from any line
             m = HR_LINE_RE.search(line)
@@ -77,34 +165,11 @@ def main() -> None:
                 continue
 
             device_id_str, hr_str = m.groups()
-            device_id = int(device_id_str)
-            heart_rate = int(hr_str)
-
-            # ISO timestamp in UTC
-            ts_iso = datetime.now(timezone.utc).isoformat()
-
-            payload = {
-                "type": "hr_single",
-                "reading": {
-                    "ts_iso": ts_iso,
-                    "device_id": device_id,
-                    "bpm": heart_rate,
-                    "rr_ms": None,  # we don't have RR interval yet
-                },
-            }
-
-            # For debugging, show what we matched on stderr
-            print(f"[match] device={device_id} hr={heart_rate}", file=sys.stderr)
-
-            # NEW: also show the JSON we’re about to emit
-            json_line = json.dumps(payload)
-            print(f"[json] {json_line}", file=sys.stderr)
-
-            # JSON line to stdout (this is what we’ll pipe)
-            print(json_line, flush=True)
+            # the scan text has no RR interval
+            emit(int(device_id_str), int(hr_str))
 
     except KeyboardInterrupt:
-        print("\n=== hr_to_json: received Ctrl+C, stopping ===", file=sys.stderr)
+        log.info("received Ctrl+C, stopping")
     finally:
         try:
             proc.terminate()
@@ -117,5 +182,51 @@ def main() -> None:
             pass
 
 
+def main() -> None:
+    ap = argparse.ArgumentParser(description="ANT+ heart-rate straps → newline-delimited JSON")
+    ap.add_argument(
+        "--source", choices=("native", "replay", "scan"), default="native",
+        help="native: openant in-process with RR intervals; replay: simulated sticks "
+             "replaying CSV logs; scan: parse `openant scan` output",
+    )
+    ap.add_argument(
+        "--device-id", type=int, action="append", default=[],
+        help="Open this strap directly instead of scanning (repeatable)",
+    )
+    ap.add_argument("--sticks", type=int, default=1, help="Number of ANT USB sticks to use")
+    ap.add_argument(
+        "--channels", type=int, default=CHANNELS_PER_STICK,
+        help=f"Channels to use per stick (default: {CHANNELS_PER_STICK})",
+    )
+    ap.add_argument("--pairing", help="JSON file of known straps, read at start and updated")
+    ap.add_argument(
+        "--drop-after", type=float, default=5.0,
+        help="Free a strap's channel after this many silent seconds (default: 5)",
+    )
+    ap.add_argument(
+        "--replay", action="append",
+        help=f"CSV log file or directory to replay (repeatable; default: {DEFAULT_REPLAY})",
+    )
+    ap.add_argument("--devices", type=int, default=0, help="Replay: clone logs up to this many straps")
+    ap.add_argument("--speed", type=float, default=1.0, help="Replay: time scale (default: 1)")
+    add_format_argument(ap)
+    add_logging_arguments(ap)
+    args = ap.parse_args()
+    setup_logging(args.log_level, stream=sys.stderr, sample=args.log_sample)
+    summary = ThroughputSummary()
+    emit = ReadingEmitter(MessageWriter(args.format), summary)
+
+    try:
+        if args.source in ("native", "replay"):
+            run_scheduler(emit, args)
+        else:
+            run_scan(emit)
+    except (RuntimeError, ValueError) as exc:
+        log.error("%s", exc)
+        sys.exit(1)
+    finally:
+        summary.flush()
+
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""Multi-strap, multi-stick ANT+ acquisition.
+
+An ANT USB stick has a handful of channels (8 on the ANTUSB2 / ANTUSB-m),
+and each heart-rate strap needs one. ``ChannelScheduler`` spreads straps
+over one or more sticks and merges everything into a single reading
+callback:
+
+- Known straps (from ``--device-id`` or the pairing file) are opened first,
+  each on the least-loaded stick with a free channel.
+- One spare channel searches for new straps. When it pairs, that channel
+  becomes the strap's and a new search channel opens elsewhere.
+- A strap silent for ``drop_after`` seconds is dropped and its channel
+  reused. It is retried after ``retry_after`` seconds, so more straps than
+  channels rotate instead of starving.
+- When sticks are uneven by two or more channels, one strap at a time is
+  moved to the emptiest stick.
+
+All scheduling happens on the thread calling ``run()``; sticks only post
+pages to a queue, so no locking is needed around the channel map.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import queue
+import time
+from collections.abc import Callable, Iterable
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any
+
+from ant_source import SEARCH, BeatTracker, Page
+from hr_logging import get_logger
+
+log = get_logger("ant")
+
+OnReading = Callable[[int, int, "float | None"], None]
+
+
+class PairingStore:
+    """Straps seen before, persisted as JSON so they are opened directly next time."""
+
+    def __init__(self, path: str | Path) -> None:
+        self.path = Path(path)
+        self.devices: dict[int, dict[str, Any]] = {}
+        self._dirty = False
+        if self.path.exists():
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+            self.devices = {int(k): v for k, v in data.get("devices", {}).items()}
+
+    def known(self) -> list[int]:
+        """Device IDs, most recently seen first."""
+        return sorted(self.devices, key=lambda d: self.devices[d].get("last_seen", ""), reverse=True)
+
+    def remember(self, device_id: int, stick: int) -> None:
+        self.devices[device_id] = {
+            "stick": stick,
+            "last_seen": datetime.now(timezone.utc).isoformat(),
+        }
+        self._dirty = True
+
+    def save(self) -> None:
+        if not self._dirty:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        devices = {str(k): v for k, v in sorted(self.devices.items())}
+        tmp.write_text(json.dumps({"devices": devices}, indent=2) + "\n", encoding="utf-8")
+        os.replace(tmp, self.path)
+        self._dirty = False
+
+
+@dataclass
+class Channel:
+    stick: int
+    slot: int
+    device_id: int
+    opened: float
+    last_seen: float | None = None
+
+
+class ChannelScheduler:
+    """Allocate strap channels across sticks and merge their readings."""
+
+    def __init__(
+        self,
+        sticks: list[Any],
+        on_reading: OnReading,
+        known: Iterable[int] = (),
+        store: PairingStore | None = None,
+        discover: bool = True,
+        drop_after: float = 5.0,
+        retry_after: float = 10.0,
+        tick: float = 0.5,
+    ) -> None:
+        self.sticks = sticks
+        self.on_reading = on_reading
+        self.store = store
+        self.discover = discover
+        self.drop_after = drop_after
+        self.retry_after = retry_after
+        self.tick = tick
+        self.channels: dict[tuple[int, int], Channel] = {}
+        self.assigned: dict[int, Channel] = {}
+        self.waiting: dict[int, float] = {}
+        self._trackers: dict[int, BeatTracker] = {}
+        self._events: queue.SimpleQueue[Page] = queue.SimpleQueue()
+        self._running = False
+        for device_id in [*known, *(store.known() if store else [])]:
+            self.waiting.setdefault(device_id, 0.0)
+
+    # -- lifecycle ----------------------------------------------------------
+
+    def run(self) -> None:
+        """Start every stick and schedule until ``stop()`` or Ctrl+C."""
+        self._running = True
+        try:
+            for stick in self.sticks:
+                stick.start(self._events.put)
+            next_tick = 0.0
+            while self._running:
+                try:
+                    self._on_page(self._events.get(timeout=self.tick))
+                except queue.Empty:
+                    pass
+                now = time.monotonic()
+                if now >= next_tick:
+                    self.schedule(now)
+                    next_tick = now + self.tick
+        finally:
+            for stick in self.sticks:
+                try:
+                    stick.stop()
+                except Exception as exc:
+                    log.warning("stick %d did not stop cleanly: %s", stick.index, exc)
+            if self.store is not None:
+                self.store.save()
+
+    def stop(self) -> None:
+        self._running = False
+
+    def status(self) -> dict[int, list[int]]:
+        """Device IDs per stick (0 marks the search channel)."""
+        status: dict[int, list[int]] = {stick.index: [] for stick in self.sticks}
+        for channel in self.channels.values():
+            status[channel.stick].append(channel.device_id)
+        return status
+
+    # -- pages --------------------------------------------------------------
+
+    def _on_page(self, page: Page) -> None:
+        channel = self.channels.get((page.stick, page.slot))
+        if channel is None or not page.device_id:
+            return
+        if channel.device_id == SEARCH:
+            if not self._paired(channel, page.device_id):
+                return
+        elif channel.device_id != page.device_id:
+            return  # late page from before the slot was retuned
+
+        channel.last_seen = time.monotonic()
+        tracker = self._trackers.setdefault(channel.device_id, BeatTracker())
+        new_beat, rr_ms = tracker.update(page.beat_count, page.beat_time, page.previous_beat_time)
+        if new_beat and page.heart_rate:
+            self.on_reading(channel.device_id, page.heart_rate, rr_ms)
+
+    def _paired(self, channel: Channel, device_id: int) -> bool:
+        """The search channel found a strap: keep it unless it is already open."""
+        if device_id in self.assigned:
+            self._tune(channel, SEARCH)
+            return False
+        channel.device_id = device_id
+        self.assigned[device_id] = channel
+        self.waiting.pop(device_id, None)
+        if self.store is not None:
+            self.store.remember(device_id, channel.stick)
+        log.info("paired strap %05d on stick %d", device_id, channel.stick)
+        return True
+
+    # -- scheduling ---------------------------------------------------------
+
+    def schedule(self, now: float) -> None:
+        self._drop_silent(now)
+        self._open_waiting(now)
+        self._ensure_search(now)
+        self._rebalance(now)
+        if self.store is not None:
+            self.store.save()
+
+    def _drop_silent(self, now: float) -> None:
+        for channel in list(self.channels.values()):
+            if channel.device_id == SEARCH:
+                continue
+            if now - (channel.last_seen or channel.opened) > self.drop_after:
+                device_id = channel.device_id
+                self._release(channel)
+                self._trackers.pop(device_id, None)
+                self.waiting[device_id] = now + self.retry_after
+                log.info("strap %05d silent, channel freed (retry in %.0fs)", device_id, self.retry_after)
+
+    def _open_waiting(self, now: float) -> None:
+        due = sorted((at, device_id) for device_id, at in self.waiting.items() if at <= now)
+        for _, device_id in due:
+            stick = self._least_loaded()
+            if stick is None:
+                search = self._search_channel()
+                if search is None:
+                    return
+                # known straps come before discovery
+                self._release(search)
+                stick = search.stick
+            self._open(stick, device_id, now)
+            del self.waiting[device_id]
+
+    def _ensure_search(self, now: float) -> None:
+        if not self.discover or self._search_channel() is not None:
+            return
+        stick = self._least_loaded()
+        if stick is not None:
+            self._open(stick, SEARCH, now)
+
+    def _rebalance(self, now: float) -> None:
+        loads = {stick.index: self._load(stick.index) for stick in self.sticks}
+        if len(loads) < 2:
+            return
+        busiest = max(loads, key=loads.__getitem__)
+        emptiest = min(loads, key=loads.__getitem__)
+        if loads[busiest] - loads[emptiest] < 2:
+            return
+        movable = [
+            c for c in self.channels.values() if c.stick == busiest and c.device_id != SEARCH
+        ]
+        if not movable:
+            return
+        channel = min(movable, key=lambda c: c.last_seen or c.opened)
+        device_id = channel.device_id
+        self._release(channel)
+        self._open(emptiest, device_id, now)
+        log.info("moved strap %05d from stick %d to stick %d", device_id, busiest, emptiest)
+
+    # -- channel bookkeeping ------------------------------------------------
+
+    def _load(self, stick: int) -> int:
+        return sum(1 for c in self.channels.values() if c.stick == stick)
+
+    def _least_loaded(self) -> int | None:
+        candidates = [
+            (self._load(stick.index), stick.index)
+            for stick in self.sticks
+            if self._load(stick.index) < stick.capacity
+        ]
+        return min(candidates)[1] if candidates else None
+
+    def _search_channel(self) -> Channel | None:
+        return next((c for c in self.channels.values() if c.device_id == SEARCH), None)
+
+    def _open(self, stick: int, device_id: int, now: float) -> Channel:
+        used = {slot for s, slot in self.channels if s == stick}
+        slot = next(i for i in range(self.sticks[stick].capacity) if i not in used)
+        channel = Channel(stick, slot, device_id, now)
+        self.channels[(stick, slot)] = channel
+        if device_id != SEARCH:
+            self.assigned[device_id] = channel
+        self.sticks[stick].tune(slot, device_id)
+        return channel
+
+    def _tune(self, channel: Channel, device_id: int) -> None:
+        channel.device_id = device_id
+        channel.opened = time.monotonic()
+        channel.last_seen = None
+        self.sticks[channel.stick].tune(channel.slot, device_id)
+
+    def _release(self, channel: Channel) -> None:
+        del self.channels[(channel.stick, channel.slot)]
+        if self.assigned.get(channel.device_id) is channel:
+            del self.assigned[channel.device_id]
+        self.sticks[channel.stick].release(channel.slot)
@@ -0,0 +1,458 @@
+#!/usr/bin/env python3
+"""ANT+ heart-rate sticks: openant hardware and a replaying simulator.
+
+Both stick types expose the same small interface used by
+``ant_scheduler.ChannelScheduler``:
+
+    capacity            number of channels ("slots") the stick can hold
+    start(post)         begin receiving; data pages are passed to ``post``
+    tune(slot, id)      point a slot at a strap (id 0 = search for any strap)
+    release(slot)       close a slot
+    stop()
+
+``post`` receives ``Page`` tuples. Readings are derived from pages by
+``BeatTracker``: one reading per heartbeat (when the strap's beat count
+changes) rather than per 4 Hz broadcast, with the RR interval taken from the
+profile's beat event times (1/1024 s, rolling over every 64 s) — the gap
+between consecutive beats, or page 4's "previous heartbeat time" when a
+broadcast was missed in between.
+
+``OpenantStick`` runs an openant ``Node`` in-process (no more scraping
+``python -m openant scan`` output) and decodes the HR pages itself.
+``SimulatedStick`` serves straps from a ``ReplayAir`` built from recorded
+CSV logs such as ``outputs/hr_logs``, so the scheduler can be exercised
+without hardware and with more straps than the room has.
+"""
+
+from __future__ import annotations
+
+import bisect
+import csv
+import random
+import threading
+import time
+from collections.abc import Callable, Iterable
+from dataclasses import dataclass
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, NamedTuple
+
+from hr_logging import get_logger
+from hr_wire import epoch_seconds
+
+BEAT_TIME_ROLLOVER = 64.0
+HEART_RATE_DEVICE_TYPE = 120
+HEART_RATE_PERIOD = 8070  # 32768/8070 = ~4.06 pages per second
+ANTPLUS_RF_FREQ = 57  # 2457 MHz
+CHANNELS_PER_STICK = 8
+SEARCH = 0
+MAX_DEVICE_ID = 0xFFFF
+
+log = get_logger("ant")
+
+
+class Page(NamedTuple):
+    """One heart-rate data page as received on a stick slot."""
+
+    stick: int
+    slot: int
+    device_id: int
+    heart_rate: int
+    beat_count: int
+    beat_time: float
+    previous_beat_time: float | None = None
+
+
+Post = Callable[[Page], None]
+
+
+class BeatTracker:
+    """Turn successive HR data pages from one strap into beats with RR."""
+
+    def __init__(self) -> None:
+        self._count: int | None = None
+        self._time = 0.0
+
+    def update(
+        self, beat_count: int, beat_time: float, previous_beat_time: float | None = None
+    ) -> tuple[bool, float | None]:
+        """Return ``(new_beat, rr_ms)`` for one data page."""
+        last_count, last_time = self._count, self._time
+        self._count, self._time = beat_count, beat_time
+        if last_count is None or beat_count == last_count:
+            return last_count is None, None
+
+        beats = (beat_count - last_count) % 256
+        if beats == 1:
+            gap = (beat_time - last_time) % BEAT_TIME_ROLLOVER
+        elif previous_beat_time is not None and previous_beat_time >= 0:
+            gap = (beat_time - previous_beat_time) % BEAT_TIME_ROLLOVER
+        else:
+            return True, None
+        return True, round(gap * 1000.0, 1) if gap > 0 else None
+
+
+def _openant() -> tuple[Any, Any, Any]:
+    try:
+        from openant.devices import ANTPLUS_NETWORK_KEY
+        from openant.easy.channel import Channel
+        from openant.easy.node import Node
+    except ImportError:
+        raise RuntimeError("The native ANT+ source requires: pip install openant") from None
+    return Node, ANTPLUS_NETWORK_KEY, Channel
+
+
+def parse_broadcast(
+    data: Any,
+) -> tuple[int | None, int, int, float, float | None] | None:
+    """Decode an HR broadcast: ``(device_id, heart_rate, beat_count, beat_time, previous)``.
+
+    ``device_id`` comes from the extended message bytes (None without them);
+    ``previous`` is page 4's previous heartbeat time. Both times are in seconds.
+    """
+    if len(data) < 8:
+        return None
+    device_id = data[9] | data[10] << 8 if len(data) >= 11 and data[8] & 0x80 else None
+    previous = None
+    if data[0] & 0x7F == 4:
+        previous = (data[2] | data[3] << 8) / 1024.0
+    return device_id, data[7], data[6], (data[4] | data[5] << 8) / 1024.0, previous
+
+
+_OPEN_LOCK = threading.Lock()
+
+
+def _open_node(index: int) -> Any:
+    """Open the ``index``-th ANT USB stick.
+
+    openant always opens the first matching USB device, so for later sticks
+    the ``usb`` module seen by openant's driver (and only it) is swapped for
+    one whose ``core.find`` returns the chosen device while the Node opens.
+    """
+    Node, _, _ = _openant()
+    if index == 0:
+        return Node()
+    import usb.core
+    from openant.base import driver
+
+    sticks = [
+        dev for dev in usb.core.find(find_all=True, idVendor=0x0FCF)
+        if dev.idProduct in (0x1008, 0x1009)
+    ]
+    if index >= len(sticks):
+        raise RuntimeError(f"ANT stick #{index} not found ({len(sticks)} connected)")
+    target = sticks[index]
+
+    def find(*args: Any, find_all: bool = False, **kwargs: Any) -> Any:
+        if not find_all and kwargs.get("idProduct") == target.idProduct:
+            return target
+        return usb.core.find(*args, find_all=find_all, **kwargs)
+
+    core = SimpleNamespace(**vars(usb.core))
+    core.find = find
+    with _OPEN_LOCK:
+        original = driver.usb
+        driver.usb = SimpleNamespace(**vars(original))
+        driver.usb.core = core
+        try:
+            return Node()
+        finally:
+            driver.usb = original
+
+
+class OpenantStick:
+    """One ANT USB stick: an openant Node whose HR receive channels are slots.
+
+    Channels are configured through openant's public channel API and the HR
+    pages are decoded here. Slots are retuned in place (close, set id,
+    reopen) rather than removed and recreated, which keeps openant's channel
+    numbering stable.
+    """
+
+    def __init__(self, index: int = 0, capacity: int = CHANNELS_PER_STICK) -> None:
+        self.index = index
+        self.capacity = capacity
+        self._node: Any = None
+        self._thread: threading.Thread | None = None
+        self._slots: dict[int, Any] = {}
+        self._devices: dict[int, int] = {}  # slot -> tuned (or found) device id
+        self._open: set[int] = set()
+        self._post: Post | None = None
+
+    def start(self, post: Post) -> None:
+        _, network_key, _ = _openant()
+        self._post = post
+        self._node = _open_node(self.index)
+        self._node.set_network_key(0x00, network_key)
+        self.capacity = min(self.capacity, self._node.max_channels)
+        self._thread = threading.Thread(
+            target=self._node.start, name=f"ant-stick-{self.index}", daemon=True
+        )
+        self._thread.start()
+        log.info("stick %d open (%d channels)", self.index, self.capacity)
+
+    def tune(self, slot: int, device_id: int, trans_type: int = 0) -> None:
+        channel = self._slots.get(slot)
+        if channel is None:
+            _, _, Channel = _openant()
+            channel = self._node.new_channel(Channel.Type.BIDIRECTIONAL_RECEIVE, 0x00, 0x01)
+            channel.on_broadcast_data = self._forward(slot)
+            channel.set_search_timeout(0xFF)
+            channel.enable_extended_messages(1)
+            channel.set_period(HEART_RATE_PERIOD)
+            channel.set_rf_freq(ANTPLUS_RF_FREQ)
+            self._slots[slot] = channel
+        elif slot in self._open:
+            channel.close()
+        self._devices[slot] = device_id
+        channel.set_id(device_id, HEART_RATE_DEVICE_TYPE, trans_type)
+        channel.open()
+        self._open.add(slot)
+
+    def release(self, slot: int) -> None:
+        if slot in self._open:
+            self._open.discard(slot)
+            self._slots[slot].close()
+
+    def stop(self) -> None:
+        if self._node is None:
+            return
+        for channel in self._slots.values():
+            try:
+                self._node.remove_channel(channel)
+            except Exception:
+                pass
+        self._slots.clear()
+        self._devices.clear()
+        self._open.clear()
+        node, self._node = self._node, None
+        node.stop()
+
+    def _forward(self, slot: int) -> Callable[[Any], None]:
+        def on_broadcast_data(data: Any) -> None:
+            page = parse_broadcast(data)
+            if page is None or self._post is None:
+                return
+            device_id, heart_rate, beat_count, beat_time, previous = page
+            if device_id is None:
+                device_id = self._devices.get(slot, SEARCH)
+            if device_id == SEARCH:
+                return  # a wildcard channel's page without the strap's id
+            self._post(Page(
+                self.index, slot, device_id, heart_rate, beat_count, beat_time, previous
+            ))
+
+        return on_broadcast_data
+
+
+# -- replay simulation ------------------------------------------------------
+
+
+@dataclass
+class _Trace:
+    times: list[float]
+    bpm: list[float]
+    rr_ms: list[float | None]
+    offset: float = 0.0
+    beat: float = 0.0
+    previous: float | None = None
+    next_beat: float | None = None
+    count: int = 0
+
+
+def load_traces(paths: Iterable[str | Path]) -> dict[int, tuple[list[float], list[float], list[float | None]]]:
+    """Read ``timestamp,device_id,bpm,rr_ms`` CSV logs (files or directories)."""
+    rows: dict[int, list[tuple[float, float, float | None]]] = {}
+    for path in paths:
+        path = Path(path)
+        files = sorted(path.glob("*.csv")) if path.is_dir() else [path]
+        for file in files:
+            with file.open(newline="", encoding="utf-8-sig") as f:
+                for row in csv.DictReader(f):
+                    try:
+                        device_id = int(float(row["device_id"]))
+                        bpm = float(row["bpm"])
+                    except (KeyError, TypeError, ValueError):
+                        continue
+                    rr = row.get("rr_ms") or None
+                    rows.setdefault(device_id, []).append(
+                        (epoch_seconds(row.get("timestamp")), bpm, float(rr) if rr else None)
+                    )
+    traces = {}
+    for device_id, samples in rows.items():
+        samples.sort()
+        start = samples[0][0]
+        traces[device_id] = (
+            [t - start for t, _, _ in samples],
+            [bpm for _, bpm, _ in samples],
+            [rr for _, _, rr in samples],
+        )
+    return traces
+
+
+class ReplayAir:
+    """Simulated straps "in the room", replaying recorded HR logs.
+
+    Each strap beats at the recorded RR intervals (or 60000/bpm) while its
+    log has samples; a gap longer than ``gap`` seconds in the log makes the
+    strap go silent for that long, like a real dropout. ``devices`` clones
+    the recorded straps under new IDs, phase-shifted, to fill a bigger room.
+    ``speed`` scales replay time; beats stay at their recorded RR.
+    """
+
+    def __init__(
+        self,
+        traces: dict[int, tuple[list[float], list[float], list[float | None]]],
+        devices: int = 0,
+        speed: float = 1.0,
+        loop: bool = True,
+        gap: float = 5.0,
+        seed: int | None = None,
+    ) -> None:
+        if not traces:
+            raise ValueError("no heart-rate samples to replay")
+        self.speed = speed
+        self.loop = loop
+        self.gap = gap
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self._traces: dict[int, _Trace] = {
+            device_id: _Trace(*trace) for device_id, trace in traces.items()
+        }
+        sources = list(self._traces.items())
+        next_id = max(self._traces) + 1
+        while len(self._traces) < devices and next_id <= MAX_DEVICE_ID:
+            _, source = sources[(len(self._traces) - len(sources)) % len(sources)]
+            clone = _Trace(source.times, source.bpm, source.rr_ms)
+            clone.offset = self._rng.uniform(0, self._duration(clone))
+            self._traces[next_id] = clone
+            next_id += 1
+
+    @classmethod
+    def from_paths(cls, paths: Iterable[str | Path], **kwargs: Any) -> ReplayAir:
+        return cls(load_traces(paths), **kwargs)
+
+    def device_ids(self) -> list[int]:
+        return sorted(self._traces)
+
+    def _duration(self, trace: _Trace) -> float:
+        return trace.times[-1] + max(self.gap, 1.0)
+
+    def _elapsed(self, now: float) -> float:
+        return (now - self._started) * self.speed
+
+    def _position(self, trace: _Trace, now: float) -> float | None:
+        position = self._elapsed(now) + trace.offset
+        duration = self._duration(trace)
+        if position >= duration:
+            if not self.loop:
+                return None
+            position %= duration
+        return position
+
+    def _row(self, trace: _Trace, position: float) -> int | None:
+        row = bisect.bisect_right(trace.times, position) - 1
+        if row < 0 or position - trace.times[row] > self.gap:
+            return None
+        return row
+
+    def present(self, device_id: int, now: float) -> bool:
+        trace = self._traces.get(device_id)
+        if trace is None:
+            return False
+        position = self._position(trace, now)
+        return position is not None and self._row(trace, position) is not None
+
+    def search(self, now: float) -> int | None:
+        """Pair a wildcard channel with some strap in range, like the radio would."""
+        candidates = [device_id for device_id in self._traces if self.present(device_id, now)]
+        return self._rng.choice(candidates) if candidates else None
+
+    def page(self, device_id: int, now: float) -> tuple[int, int, float, float | None] | None:
+        """Current ``(heart_rate, beat_count, beat_time, previous_beat_time)``, or None if silent."""
+        with self._lock:
+            trace = self._traces.get(device_id)
+            if trace is None:
+                return None
+            position = self._position(trace, now)
+            row = None if position is None else self._row(trace, position)
+            if row is None:
+                trace.next_beat = None
+                return None
+            # Beats run on a clock that does not wrap when the log loops.
+            elapsed = self._elapsed(now)
+            if trace.next_beat is None:
+                trace.next_beat = elapsed
+            rr = trace.rr_ms[row] or 60000.0 / trace.bpm[row]
+            while trace.next_beat <= elapsed:
+                trace.previous, trace.beat = trace.beat, trace.next_beat
+                trace.count = (trace.count + 1) % 256
+                trace.next_beat += max(rr, 200.0) / 1000.0
+            return (
+                round(trace.bpm[row]),
+                trace.count,
+                trace.beat % BEAT_TIME_ROLLOVER,
+                None if trace.previous is None else trace.previous % BEAT_TIME_ROLLOVER,
+            )
+
+
+class SimulatedStick:
+    """A stick whose channels receive from a ``ReplayAir`` at ~4 pages/s."""
+
+    def __init__(
+        self,
+        air: ReplayAir,
+        index: int = 0,
+        capacity: int = CHANNELS_PER_STICK,
+        page_rate: float = 4.0,
+        search_delay: float = 1.0,
+    ) -> None:
+        self.air = air
+        self.index = index
+        self.capacity = capacity
+        self.page_rate = page_rate
+        self.search_delay = search_delay
+        self._slots: dict[int, list[Any]] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self, post: Post) -> None:
+        self._thread = threading.Thread(
+            target=self._run, args=(post,), name=f"sim-stick-{self.index}", daemon=True
+        )
+        self._thread.start()
+
+    def tune(self, slot: int, device_id: int, trans_type: int = 0) -> None:
+        with self._lock:
+            self._slots[slot] = [device_id, time.monotonic()]
+
+    def release(self, slot: int) -> None:
+        with self._lock:
+            self._slots.pop(slot, None)
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self, post: Post) -> None:
+        period = 1.0 / (self.page_rate * self.air.speed)
+        while not self._stop.wait(period):
+            now = time.monotonic()
+            with self._lock:
+                slots = list(self._slots.items())
+            for slot, (device_id, tuned_at) in slots:
+                if device_id == SEARCH:
+                    if now - tuned_at < self.search_delay / self.air.speed:
+                        continue
+                    device_id = self.air.search(now)
+                    if device_id is None:
+                        continue
+                    with self._lock:
+                        if self._slots.get(slot) == [SEARCH, tuned_at]:
+                            self._slots[slot] = [device_id, tuned_at]
+                page = self.air.page(device_id, now)
+                if page is not None:
+                    post(Page(self.index, slot, device_id, *page))
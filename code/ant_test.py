@@ -15,29 +15,33 @@ Run examples (simulation):
 Try real ANT later (requires: pip install openant + FitCent ANT310 plugged in):
   python code/ant_test.py --single --ant
   python code/ant_test.py --multi --ant
+
+Add --format binary to emit compact hr_wire frames instead of JSON lines.
 """
 
-import argparse, time, json, sys, random, math, datetime as dt, importlib
+import argparse, time, sys, random, math, datetime as dt, importlib.util
+
+from hr_wire import MessageWriter, add_format_argument
+
+out = MessageWriter("json")  # replaced from --format in the CLI block
 
 def now_iso(): 
     return dt.datetime.utcnow().isoformat() + "Z"
 
-#Simulation
-def sim_single(hz=1.0, base=78.0, spread=4.0, dev=10001): #Emit ONE device's heart-rate reading at ~hz samples/sec.
-    print("[sim] single-device stream starting...", file=sys.stderr)
+#Simulation generators: yield one message per tick so callers can print them or consume them in-process
+def iter_sim_single(hz=1.0, base=78.0, spread=4.0, dev=10001): #ONE device's heart-rate reading at ~hz samples/sec.
     period = 1.0 / max(hz, 1e-6) # Sample period derived from requested Hz
     phase = random.random() * 2 * math.pi # Each simulated device gets its own sine phase so BPM changes look organic
     while True:
         wobble = math.sin(time.time()*0.3 + phase) * 2.0 # A light, smooth wobble + noise to look like a real heart rate trace
         bpm = max(40, min(180, base + random.uniform(-spread, spread) + wobble))
         rr  = int(60000.0 / max(bpm, 1e-3))
-        print(json.dumps({"type":"hr_single",
-                          "reading":{"ts_iso":now_iso(),"device_id":dev,
-                                     "bpm":round(bpm,1),"rr_ms":rr}}), flush=True)
+        yield {"type":"hr_single",
+               "reading":{"ts_iso":now_iso(),"device_id":dev,
+                          "bpm":round(bpm,1),"rr_ms":rr}}
         time.sleep(period)
 
-def sim_multi(n=6, hz=1.0, base=78.0, spread=8.0): #Emit MANY devices at once; one JSON batch per tick.
-    print(f"[sim] multi-device stream starting with {n} devices...", file=sys.stderr)
+def iter_sim_multi(n=6, hz=1.0, base=78.0, spread=8.0): #MANY devices at once; one batch per tick.
     period = 1.0 / max(hz, 1e-6)
     phases = [random.random()*2*math.pi for _ in range(n)] # Give each device its own phase so their BPMs don't all move in lockstep
     while True:
@@ -48,9 +52,20 @@ def sim_multi(n=6, hz=1.0, base=78.0, spread=8.0): #Emit MANY devices at once; o
             rr  = int(60000.0 / max(bpm, 1e-3))
             readings.append({"ts_iso":now_iso(),"device_id":10000+i,
                              "bpm":round(bpm,1),"rr_ms":rr})
-        print(json.dumps({"type":"hr_batch","readings":readings}), flush=True)
+        yield {"type":"hr_batch","readings":readings}
         time.sleep(period)
 
+#Simulation
+def sim_single(hz=1.0, base=78.0, spread=4.0, dev=10001): #Emit ONE device's heart-rate reading at ~hz samples/sec.
+    print("[sim] single-device stream starting...", file=sys.stderr)
+    for msg in iter_sim_single(hz, base, spread, dev):
+        out.emit(msg)
+
+def sim_multi(n=6, hz=1.0, base=78.0, spread=8.0): #Emit MANY devices at once; one JSON batch per tick.
+    print(f"[sim] multi-device stream starting with {n} devices...", file=sys.stderr)
+    for msg in iter_sim_multi(n, hz, base, spread):
+        out.emit(msg)
+
 #Placeholder for REAL single-device ANT+ capture using `openant`. If `openant` is missing (or not yet configured), we fall back to simulation.
 def real_single(hz=1.0):
     if importlib.util.find_spec("openant") is None:
@@ -59,12 +74,30 @@ def real_single(hz=1.0):
     print("[ant] openant detected (stub) → sim until hardware wired", file=sys.stderr)
     return sim_single(hz=hz)
 
-def real_multi(hz=1.0):
+def real_multi(hz=1.0, sticks=1): #Every strap in range, spread over one or more sticks by ant_scheduler; one JSON batch per tick.
     if importlib.util.find_spec("openant") is None:
         print("[ant] openant not installed → sim", file=sys.stderr)
-        return sim_multi(n=6, hz=hz)
-    print("[ant] openant detected (stub) → sim until hardware wired", file=sys.stderr)
-    return sim_multi(n=6, hz=hz)
+        return sim_multi(hz=hz)
+    import threading
+    from ant_scheduler import ChannelScheduler
+    from ant_source import OpenantStick
+    latest = {} # newest reading per strap; a batch is emitted every 1/hz seconds
+    lock = threading.Lock() # on_reading runs on the scheduler thread
+    def on_reading(device_id, bpm, rr_ms):
+        with lock:
+            latest[device_id] = {"ts_iso":now_iso(),"device_id":device_id,"bpm":bpm,"rr_ms":rr_ms}
+    scheduler = ChannelScheduler([OpenantStick(i) for i in range(sticks)], on_reading)
+    print(f"[ant] scanning for heart-rate straps on {sticks} stick(s)...", file=sys.stderr)
+    threading.Thread(target=scheduler.run, daemon=True).start()
+    try:
+        while True:
+            time.sleep(1.0 / max(hz, 1e-6))
+            with lock:
+                batch, latest = latest, {}
+            if batch:
+                out.emit({"type":"hr_batch","readings":list(batch.values())})
+    finally:
+        scheduler.stop()
 
 #CLI (Command Line Interface)
 if __name__ == "__main__":
@@ -78,9 +111,15 @@ if __name__ == "__main__":
 
     ap.add_argument("--devices", type=int, default=6, help="simulation device count (multi)")
     ap.add_argument("--hz", type=float, default=1.0, help="samples/sec")
+    ap.add_argument("--sticks", type=int, default=1, help="ANT USB sticks to use (multi --ant)")
+    add_format_argument(ap)
     args = ap.parse_args()
+    out = MessageWriter(args.format)
 
     if args.single:
         (real_single if args.ant else sim_single)(hz=args.hz)
     else:
-        (real_multi  if args.ant else sim_multi)(n=args.devices, hz=args.hz)
+        if args.ant:
+            real_multi(hz=args.hz, sticks=args.sticks)
+        else:
+            sim_multi(n=args.devices, hz=args.hz)
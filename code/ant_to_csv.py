@@ -17,19 +17,25 @@ If --out is omitted, this script auto-creates:
 It reads lines like:
   {"type":"hr_single","reading":{...}}
   {"type":"hr_batch","readings":[...]}
+or the equivalent hr_wire binary frames (detected automatically).
 
 And writes rows into a CSV log:
   timestamp,device_id,bpm,rr_ms
+
+Rows are buffered and written in batches (see csv_sink.py); use
+--flush-rows 1 --fsync for the most durable, slowest behaviour.
 """
 
 import argparse
 import sys
 import json
-import csv
 import re
 import glob
 from pathlib import Path
 
+from csv_sink import CSVSink, FlushPolicy, exit_on_signals
+from hr_wire import InputStream, iso_timestamp
+
 
 # ---------- paths & filenames ----------
 
@@ -105,6 +111,27 @@ def extract_rows(msg):
     return rows
 
 
+def iter_rows(source: InputStream):
+    """Yield the CSV rows of each message, from JSON lines or binary frames."""
+    if source.binary:
+        for readings in source.frames():
+            yield [
+                [iso_timestamp(r.timestamp), r.device_id, r.bpm, r.rr_ms]
+                for r in readings
+            ]
+        return
+
+    for line in source.lines():
+        line = line.strip()
+        if not line or not line.startswith(b"{"):
+            continue
+        try:
+            msg = json.loads(line)
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            continue
+        yield extract_rows(msg)
+
+
 # ---------- main ----------
 
 def main():
@@ -116,8 +143,25 @@ def main():
             "If omitted, auto-names hr_log_###.csv under outputs/hr_logs."
         ),
     )
+    ap.add_argument(
+        "--flush-rows", type=int, default=256,
+        help="Write buffered rows to the file after this many rows (default: 256)",
+    )
+    ap.add_argument(
+        "--flush-ms", type=float, default=250.0,
+        help="Write buffered rows at least this often, in ms (default: 250)",
+    )
+    ap.add_argument("--fsync", action="store_true", help="fsync every batch to disk")
+    ap.add_argument("--verbose", action="store_true", help="Echo every row to stderr")
     args = ap.parse_args()
 
+    policy = FlushPolicy(
+        max_rows=max(1, args.flush_rows),
+        max_delay=max(0.0, args.flush_ms) / 1000.0,
+        durability="fsync" if args.fsync else "os",
+    )
+    exit_on_signals()
+
     output_dir = get_output_dir()
 
     if args.out:
@@ -129,29 +173,23 @@ def main():
     # This should always appear as soon as ant_to_csv.py starts
     print(f"[ant->csv] Writing to log file: {outfile_path}", file=sys.stderr)
 
-    with outfile_path.open("w", newline="") as f:
-        writer = csv.writer(f)
-        writer.writerow(["timestamp", "device_id", "bpm", "rr_ms"])  # CSV header
-
+    with CSVSink(outfile_path, ["timestamp", "device_id", "bpm", "rr_ms"], policy) as sink:
         try:
-            for line in sys.stdin:
-                line = line.strip()
-                if not line or not line.startswith("{"):
-                    continue
-                try:
-                    msg = json.loads(line)
-                except json.JSONDecodeError:
-                    continue
-
-                for row in extract_rows(msg):
-                    writer.writerow(row)
+            for rows in iter_rows(InputStream(sys.stdin.buffer)):
+                sink.write_rows(rows)
+                if args.verbose:
                     # Debug each row so we *know* it's flowing:
-                    print(f"[ant->csv] {row}", file=sys.stderr)
+                    for row in rows:
+                        print(f"[ant->csv] {row}", file=sys.stderr)
 
         except KeyboardInterrupt:
             print("\n[ant->csv] stopped by user", file=sys.stderr)
 
-    print(f"[ant->csv] CSV log saved to: {outfile_path}", file=sys.stderr)
+    print(
+        f"[ant->csv] CSV log saved to: {outfile_path} "
+        f"({sink.rows_written} rows, {sink.flushes} flushes)",
+        file=sys.stderr,
+    )
 
 
 if __name__ == "__main__":
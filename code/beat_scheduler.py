@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""Beat-synchronous events from RR intervals.
+
+The other outputs follow the group BPM at the ``--interval`` cadence. For
+per-beat effects, ``BeatScheduler`` predicts each participant's next beat
+and fires every beat sink *ahead* of it by that sink's latency, so an OSC
+``/beat`` reaches Live, or a light flashes, as the heart actually beats.
+
+Prediction (``BeatPredictor``):
+- The period is the median of the last ``history`` RR intervals, so a
+  missed or doubled beat does not move it. Without RR it falls back to
+  60 / bpm.
+- The phase comes from arrivals. A reading that carries RR is emitted when
+  a strap reports a new beat, so its arrival marks a beat. Each arrival
+  pulls the running prediction halfway towards it, so transport jitter
+  does not jerk the phase. Sources that repeat readings faster than the
+  heart beats only refine the period; a reading marks a beat only once
+  half a period has passed since the last one.
+
+All timing runs on one thread around a heap of deadlines on
+``time.monotonic()``. Deadlines are absolute (anchor + k * period), so
+sleep error never accumulates. A reading that changes a prediction bumps
+that participant's generation; stale heap entries are skipped when popped.
+That is O(log n) per beat, comfortably hundreds of participants.
+"""
+
+from __future__ import annotations
+
+import heapq
+import itertools
+import math
+import statistics
+import threading
+import time
+from collections import deque
+from collections.abc import Iterable
+from dataclasses import dataclass
+from typing import Any, Protocol
+
+from hr_logging import get_logger
+from hr_readings import MAX_PERIOD, MIN_PERIOD, rr_seconds
+
+log = get_logger("beats")
+
+HISTORY = 8
+PHASE_GAIN = 0.5
+STALE_AFTER = 3.0
+# Default lead time per beat sink in milliseconds (--beat-latency overrides).
+BEAT_LATENCY_MS = {"osc": 5.0, "lights": 80.0}
+
+
+class BeatPredictor:
+    """One participant's beat period and phase."""
+
+    def __init__(self, history: int = HISTORY) -> None:
+        self.rr: deque[float] = deque(maxlen=history)
+        self.period: float | None = None
+        self.anchor: float | None = None  # the time of one (predicted) beat
+        self.seen = 0.0
+        self.marked = -math.inf  # last arrival taken as a beat
+
+    def observe(self, now: float, rr_ms: Any, bpm: float | None) -> None:
+        self.seen = now
+        intervals = rr_seconds(rr_ms)
+        if self.period is not None and self.anchor is not None:
+            # keep the anchor near now so a period change does not shift the phase
+            self.anchor = self.beat_before(now)
+        if intervals:
+            self.rr.extend(intervals)
+            self.period = statistics.median(self.rr)
+        elif not self.rr and bpm:
+            self.period = min(MAX_PERIOD, max(MIN_PERIOD, 60.0 / bpm))
+        if self.period is None:
+            return
+        if self.anchor is None:
+            self.anchor = self.marked = now
+        elif intervals and now - self.marked >= self.period / 2:
+            nearest = self.anchor + round((now - self.anchor) / self.period) * self.period
+            self.anchor = nearest + PHASE_GAIN * (now - nearest)
+            self.marked = now
+
+    def beat_before(self, t: float) -> float:
+        assert self.period is not None and self.anchor is not None
+        return self.anchor + math.floor((t - self.anchor) / self.period) * self.period
+
+    def next_after(self, t: float) -> float:
+        assert self.period is not None
+        return self.beat_before(t) + self.period
+
+
+@dataclass(frozen=True)
+class Beat:
+    device_id: str
+    at: float  # predicted beat time on time.monotonic()
+    period: float
+
+    @property
+    def bpm(self) -> float:
+        return 60.0 / self.period
+
+
+class BeatSink(Protocol):
+    name: str
+    latency: float  # seconds between beat() and the beat being seen or heard
+
+    def beat(self, beat: Beat) -> None: ...
+
+
+@dataclass
+class BeatStats:
+    fired: int = 0
+    late: int = 0  # fired more than ``tolerance`` after the deadline
+    max_lateness: float = 0.0
+    errors: int = 0
+
+
+class BeatScheduler:
+    """Predict every participant's beats and fire each sink ahead of them."""
+
+    def __init__(
+        self,
+        sinks: Iterable[BeatSink],
+        history: int = HISTORY,
+        stale_after: float = STALE_AFTER,
+        tolerance: float = 0.005,
+    ) -> None:
+        self.sinks = list(sinks)
+        self.history = history
+        self.stale_after = stale_after
+        self.tolerance = tolerance
+        self.stats = BeatStats()
+        self._predictors: dict[str, BeatPredictor] = {}
+        self._generation: dict[str, int] = {}
+        self._last: dict[tuple[str, int], float] = {}
+        # (deadline, tiebreak, device, sink index, generation, beat time)
+        self._heap: list[tuple[float, int, str, int, int, float]] = []
+        self._order = itertools.count()
+        self._cond = threading.Condition()
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="beat-scheduler", daemon=True)
+
+    def start(self) -> BeatScheduler:
+        self._thread.start()
+        return self
+
+    def close(self) -> None:
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        if self._thread.is_alive():
+            self._thread.join(2.0)
+
+    def participants(self) -> int:
+        with self._cond:
+            return len(self._predictors)
+
+    def observe(
+        self, device_id: str, rr_ms: Any, bpm: float | None, now: float | None = None
+    ) -> None:
+        """Fold one reading into the device's prediction and reschedule its beats."""
+        now = time.monotonic() if now is None else now
+        with self._cond:
+            predictor = self._predictors.get(device_id)
+            if predictor is None:
+                predictor = self._predictors[device_id] = BeatPredictor(self.history)
+            predictor.observe(now, rr_ms, bpm)
+            if predictor.period is None:
+                return
+            generation = self._generation[device_id] = self._generation.get(device_id, 0) + 1
+            for index in range(len(self.sinks)):
+                self._push(device_id, index, generation, now)
+            self._cond.notify()
+
+    def _push(self, device_id: str, index: int, generation: int, now: float) -> None:
+        predictor = self._predictors[device_id]
+        latency = self.sinks[index].latency
+        # A beat re-predicted inside its lead time still fires (a little late) as long
+        # as it has not happened yet, and no sink ever gets the same beat twice.
+        last = self._last.get((device_id, index), -math.inf)
+        beat_at = predictor.next_after(max(now, last + predictor.period / 2))
+        entry = (beat_at - latency, next(self._order), device_id, index, generation, beat_at)
+        heapq.heappush(self._heap, entry)
+
+    def _forget(self, device_id: str) -> None:
+        del self._predictors[device_id]
+        del self._generation[device_id]
+        for index in range(len(self.sinks)):
+            self._last.pop((device_id, index), None)
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._stopping:
+                    now = time.monotonic()
+                    if self._heap and self._heap[0][0] <= now:
+                        break
+                    self._cond.wait(self._heap[0][0] - now if self._heap else None)
+                if self._stopping:
+                    return
+                deadline, _, device_id, index, generation, beat_at = heapq.heappop(self._heap)
+                if generation != self._generation.get(device_id):
+                    continue
+                predictor = self._predictors[device_id]
+                if now - predictor.seen > self.stale_after:
+                    self._forget(device_id)
+                    log.debug("device=%s silent, beats stopped", device_id)
+                    continue
+                self._last[(device_id, index)] = beat_at
+                beat = Beat(device_id, beat_at, predictor.period)
+                self._push(device_id, index, generation, deadline)
+
+            sink = self.sinks[index]
+            lateness = time.monotonic() - deadline
+            try:
+                sink.beat(beat)
+            except Exception as exc:  # keep the timing thread alive
+                self.stats.errors += 1
+                log.warning("%s beat failed: %s", sink.name, exc)
+                continue
+            self.stats.fired += 1
+            self.stats.late += lateness > self.tolerance
+            self.stats.max_lateness = max(self.stats.max_lateness, lateness)
+
+
+class OscBeatSink:
+    """One OSC event per predicted beat through an ``osc_sink.OscBundler``.
+
+    ``address`` may contain ``{device}`` (``/hr/{device}/beat <bpm>``);
+    otherwise the device id is sent first (``/beat <device_id> <bpm>``).
+    """
+
+    name = "osc"
+
+    def __init__(
+        self, client: Any, address: str = "/hr/{device}/beat", latency: float = 0.005
+    ) -> None:
+        self.client = client
+        self.address = address
+        self.latency = latency
+        self._per_device = "{device}" in address
+        self._addresses: dict[str, str] = {}
+
+    def beat(self, beat: Beat) -> None:
+        bpm = round(beat.bpm, 1)
+        if self._per_device:
+            address = self._addresses.get(beat.device_id)
+            if address is None:
+                address = self._addresses[beat.device_id] = self.address.format(
+                    device=beat.device_id
+                )
+            self.client.send(address, bpm)
+        else:
+            device = int(beat.device_id) if beat.device_id.isdigit() else beat.device_id
+            self.client.send(self.address, device, bpm)
+
+
+class LightPulseSink:
+    """Flash entertainment lights on beats: one participant per light, round robin.
+
+    With ``device`` set, every light pulses with that participant only.
+    """
+
+    name = "lights"
+
+    def __init__(self, stream: Any, latency: float = 0.08, device: str | None = None) -> None:
+        self.stream = stream
+        self.latency = latency
+        self.device = device
+        self._lights: dict[str, int] = {}
+
+    def beat(self, beat: Beat) -> None:
+        if self.device is not None:
+            if beat.device_id == self.device:
+                self.stream.pulse()
+            return
+        light = self._lights.get(beat.device_id)
+        if light is None:
+            lights = self.stream.lights
+            light = self._lights[beat.device_id] = lights[len(self._lights) % len(lights)]
+        self.stream.pulse([light])
+
+
+class LogBeatSink:
+    """Dry-run stand-in: log each beat and how far ahead of it it fired."""
+
+    def __init__(self, name: str, latency: float) -> None:
+        self.name = name
+        self.latency = latency
+
+    def beat(self, beat: Beat) -> None:
+        log.debug(
+            "would fire %s device=%s bpm=%.1f lead=%.1fms",
+            self.name, beat.device_id, beat.bpm, (beat.at - time.monotonic()) * 1000,
+        )
+
+
+def parse_latencies(values: list[str] | None) -> dict[str, float]:
+    """Parse repeated ``sink=ms`` options into seconds, over the defaults."""
+    latencies = {name: ms / 1000.0 for name, ms in BEAT_LATENCY_MS.items()}
+    for value in values or []:
+        name, sep, ms = value.partition("=")
+        try:
+            latencies[name.strip()] = float(ms) / 1000.0
+        except ValueError:
+            sep = ""
+        if not sep or name.strip() not in BEAT_LATENCY_MS:
+            raise ValueError(
+                f"expected SINK=MS with SINK in {tuple(BEAT_LATENCY_MS)}, got {value!r}"
+            )
+    return latencies
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""Benchmark newline-JSON decoding on streams built from hr_data.csv.
+
+Compares the original path (json.loads + extract_readings on text lines)
+with ReadingDecoder on each installed backend, for both hr_single and
+hr_batch streams.
+
+    python3 code/bench_decode.py
+    python3 code/bench_decode.py --repeat 200 --batch-size 6
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import json
+import time
+from pathlib import Path
+from typing import Callable
+
+from hr_readings import BACKENDS, ReadingDecoder, extract_readings
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+def load_rows(path: Path) -> list[dict]:
+    with path.open(newline="", encoding="utf-8") as handle:
+        return [
+            {
+                "ts_iso": row["timestamp"],
+                "device_id": int(row["device_id"]),
+                "bpm": float(row["bpm"]),
+                "rr_ms": int(row["rr_ms"]) if row["rr_ms"] else None,
+            }
+            for row in csv.DictReader(handle)
+        ]
+
+
+def single_stream(rows: list[dict]) -> list[str]:
+    return [json.dumps({"type": "hr_single", "reading": row}) for row in rows]
+
+
+def batch_stream(rows: list[dict], size: int) -> list[str]:
+    return [
+        json.dumps({"type": "hr_batch", "readings": rows[start:start + size]})
+        for start in range(0, len(rows), size)
+    ]
+
+
+def measure(decode: Callable, lines: list, repeat: int) -> tuple[float, int]:
+    readings = 0
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for line in lines:
+            readings += len(decode(line))
+    elapsed = time.perf_counter() - started
+    return len(lines) * repeat / elapsed, readings
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Benchmark HR JSON decoding backends")
+    ap.add_argument("--csv", default=str(ROOT / "hr_data.csv"), help="Source CSV of readings")
+    ap.add_argument("--repeat", type=int, default=100, help="Passes over each stream")
+    ap.add_argument("--batch-size", type=int, default=6, help="Readings per hr_batch line")
+    args = ap.parse_args()
+
+    rows = load_rows(Path(args.csv))
+    streams = {
+        "hr_single": single_stream(rows),
+        "hr_batch": batch_stream(rows, max(1, args.batch_size)),
+    }
+
+    for name, text_lines in streams.items():
+        byte_lines = [line.encode() for line in text_lines]
+        baseline, expected = measure(
+            lambda line: extract_readings(json.loads(line)), text_lines, args.repeat
+        )
+        print(f"{name}: {len(text_lines)} lines x {args.repeat}")
+        print(f"  {'baseline':<9} {baseline:>12,.0f} lines/s  1.00x")
+        for backend in BACKENDS[1:]:
+            try:
+                decoder = ReadingDecoder(backend)
+            except RuntimeError:
+                print(f"  {backend:<9} {'not installed':>12}")
+                continue
+            rate, readings = measure(decoder.decode, byte_lines, args.repeat)
+            assert readings == expected, (backend, readings, expected)
+            print(f"  {backend:<9} {rate:>12,.0f} lines/s  {rate / baseline:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,401 @@
+#!/usr/bin/env python3
+"""End-to-end latency benchmark for the HR -> light/sound pipeline.
+
+Feeds integrated_prototype.py and/or hr_router_live.py a synthetic
+``hr_batch`` stream (sim_multi style: one batch per tick for N devices) and
+captures what comes out at a local OSC UDP listener and, for the prototype,
+a fake Hue bridge (fake_hue_bridge.py).
+
+Latency is measured with a probe device. Every tick the probe's BPM takes a
+new value from a 600-value code book (60.0-119.9 in 0.1 steps). The probe
+is placed last in the batch, and its send time is remembered. The first OSC
+message at /hr/99999/bpm or Hue action carrying that value ends the
+measurement. Background devices use BPMs outside the code book, so they
+never match. All times come from this process's clock.
+
+    python3 code/bench_latency.py
+    python3 code/bench_latency.py --devices 1 100 500 --rates 1 10 --duration 10
+    python3 code/bench_latency.py --compare outputs/bench/latency_prev.json
+
+Results (p50/p95/p99 per output, throughput, lost probes) are printed and
+written as JSON, tagged with the git commit, so versions can be compared.
+Requires phue (for --hue) in the interpreter that runs the pipeline scripts.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import random
+import socket
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable
+
+from fake_hue_bridge import FakeHueBridge, RequestRecord
+from hr_mapping import smooth_mapping
+
+ROOT = Path(__file__).resolve().parents[1]
+CODE = ROOT / "code"
+TARGETS = ("prototype", "router")
+PROBE_ID = 99999
+CODES = 600
+OSC_ADDR = "/bpm"
+PROBE_ADDR = f"/hr/{PROBE_ID}/bpm"  # the probe's own address; /bpm may be a blend
+
+
+def probe_bpm(seq: int) -> float:
+    return round(60.0 + (seq % CODES) / 10.0, 1)
+
+
+def probe_code(bpm: float) -> int | None:
+    if not 60.0 <= bpm < 60.0 + CODES / 10.0:
+        return None
+    return round((bpm - 60.0) * 10.0) % CODES
+
+
+# smooth mapping is monotonic over 60-120 BPM, so each code has its own hue
+HUE_CODES = {smooth_mapping(probe_bpm(seq)).hue_native: seq for seq in range(CODES)}
+
+
+def percentile(ordered: list[float], q: float) -> float:
+    rank = max(0, min(len(ordered) - 1, round(q / 100.0 * len(ordered) + 0.5) - 1))
+    return ordered[rank]
+
+
+# -- capture -----------------------------------------------------------------
+
+
+def _osc_string(data: bytes, offset: int) -> tuple[str, int]:
+    end = data.index(b"\0", offset)
+    return data[offset:end].decode(), (end + 4) & ~3
+
+
+def parse_osc(data: bytes) -> list[tuple[str, list[Any]]]:
+    """Decode an OSC packet (message or bundle) into ``(address, args)`` pairs."""
+    if data.startswith(b"#bundle\0"):
+        messages, offset = [], 16
+        while offset + 4 <= len(data):
+            (size,) = struct.unpack_from(">i", data, offset)
+            messages.extend(parse_osc(data[offset + 4:offset + 4 + size]))
+            offset += 4 + size
+        return messages
+    address, offset = _osc_string(data, 0)
+    tags, offset = _osc_string(data, offset)
+    args: list[Any] = []
+    for tag in tags[1:]:
+        if tag == "f":
+            args.append(struct.unpack_from(">f", data, offset)[0])
+            offset += 4
+        elif tag == "i":
+            args.append(struct.unpack_from(">i", data, offset)[0])
+            offset += 4
+        elif tag == "d":
+            args.append(struct.unpack_from(">d", data, offset)[0])
+            offset += 8
+        elif tag == "s":
+            value, offset = _osc_string(data, offset)
+            args.append(value)
+    return [(address, args)]
+
+
+class OscCapture:
+    """UDP listener standing in for Ableton/VDMX/Max."""
+
+    def __init__(self, on_value: Callable[[float, float], None]) -> None:
+        self.on_value = on_value
+        self.messages = 0
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 << 20)
+        self._sock.bind(("127.0.0.1", 0))
+        self._sock.settimeout(0.2)
+        self.port = self._sock.getsockname()[1]
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="osc-capture", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                data = self._sock.recv(65536)
+            except socket.timeout:
+                continue
+            received = time.perf_counter()
+            for address, args in parse_osc(data):
+                self.messages += 1
+                if address == PROBE_ADDR and args:
+                    self.on_value(received, float(args[0]))
+
+    def close(self) -> None:
+        self._stop.set()
+        self._thread.join()
+        self._sock.close()
+
+
+@dataclass
+class OutputStats:
+    received: int = 0
+    probes: int = 0
+    lost: int = 0
+    p50_ms: float | None = None
+    p95_ms: float | None = None
+    p99_ms: float | None = None
+    max_ms: float | None = None
+    mean_ms: float | None = None
+
+
+class ProbeBook:
+    """Send times of probe codes and the latencies observed for them."""
+
+    def __init__(self) -> None:
+        self.sent: dict[int, float] = {}
+        self.latencies: list[float] = []
+        self.received = 0
+        self._lock = threading.Lock()
+
+    def send(self, seq: int, at: float) -> None:
+        with self._lock:
+            self.sent[seq % CODES] = at
+
+    def arrive(self, code: int | None, at: float) -> None:
+        with self._lock:
+            self.received += 1
+            if code is None:
+                return
+            sent = self.sent.pop(code, None)
+            if sent is not None:
+                self.latencies.append((at - sent) * 1000.0)
+
+    def stats(self, probes: int) -> OutputStats:
+        ordered = sorted(self.latencies)
+        if not ordered:
+            return OutputStats(self.received, probes, probes)
+        return OutputStats(
+            received=self.received,
+            probes=probes,
+            lost=probes - len(ordered),
+            p50_ms=round(percentile(ordered, 50), 3),
+            p95_ms=round(percentile(ordered, 95), 3),
+            p99_ms=round(percentile(ordered, 99), 3),
+            max_ms=round(ordered[-1], 3),
+            mean_ms=round(sum(ordered) / len(ordered), 3),
+        )
+
+
+# -- runs --------------------------------------------------------------------
+
+
+@dataclass
+class RunResult:
+    target: str
+    devices: int
+    rate_hz: float
+    duration_s: float
+    injected: int = 0
+    injected_per_s: float = 0.0
+    delivered_per_s: float = 0.0
+    outputs: dict[str, OutputStats] = field(default_factory=dict)
+    returncode: int | None = None
+
+
+def target_command(target: str, osc_port: int, bridge: str | None, extra: list[str]) -> list[str]:
+    osc = ["--osc", "--osc-ip", "127.0.0.1", "--osc-port", str(osc_port), "--osc-addr", OSC_ADDR]
+    if target == "router":
+        return [sys.executable, str(CODE / "hr_router_live.py"), *osc, *extra]
+    command = [
+        sys.executable, str(CODE / "integrated_prototype.py"), *osc,
+        "--device", str(PROBE_ID), "--mapping", "smooth", "--interval", "0",
+        "--log-level", "WARNING",
+    ]
+    if bridge is not None:
+        command += ["--hue", "--ip", bridge, "--group", "Bench"]
+    return command + extra
+
+
+def batch_line(seq: int, devices: int, rng: random.Random) -> bytes:
+    readings = [
+        {"ts_iso": time.time(), "device_id": 10000 + i, "bpm": round(rng.uniform(150, 170), 1), "rr_ms": None}
+        for i in range(devices - 1)
+    ]
+    readings.append({"ts_iso": time.time(), "device_id": PROBE_ID, "bpm": probe_bpm(seq), "rr_ms": None})
+    return (json.dumps({"type": "hr_batch", "readings": readings}) + "\n").encode()
+
+
+def run_once(
+    target: str, devices: int, rate: float, duration: float, hue: bool, extra: list[str],
+    warmup: float = 1.0,
+) -> RunResult:
+    result = RunResult(target, devices, rate, duration)
+    osc_book, hue_book = ProbeBook(), ProbeBook()
+    osc = OscCapture(lambda at, value: osc_book.arrive(probe_code(round(value, 1)), at))
+
+    def on_hue(record: RequestRecord) -> None:
+        if record.method == "PUT" and isinstance(record.body, dict) and "hue" in record.body:
+            hue_book.arrive(HUE_CODES.get(record.body["hue"]), record.received)
+
+    bridge = None
+    if hue and target == "prototype":
+        # No bridge rate limits here: this measures our pipeline, not the bridge.
+        bridge = FakeHueBridge(groups=["Bench"], on_request=on_hue, limits=False).start()
+
+    home = tempfile.TemporaryDirectory(prefix="bench_latency_")
+    env = {**os.environ, "HOME": home.name, "USERPROFILE": home.name, "PYTHONUNBUFFERED": "1"}
+    proc = subprocess.Popen(
+        target_command(target, osc.port, bridge.address if bridge else None, extra),
+        stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, env=env,
+    )
+    assert proc.stdin is not None
+    rng = random.Random(devices)
+    period = 1.0 / rate
+    started = time.perf_counter()
+    seq = probes = 0
+    try:
+        # Probes sent during warm-up (interpreter start, Hue connect) are not timed.
+        while (now := time.perf_counter()) - started < warmup + duration:
+            line = batch_line(seq, devices, rng)
+            at = time.perf_counter()
+            if at - started >= warmup:
+                osc_book.send(seq, at)
+                hue_book.send(seq, at)
+                probes += 1
+            proc.stdin.write(line)
+            proc.stdin.flush()
+            seq += 1
+            time.sleep(max(0.0, started + seq * period - time.perf_counter()))
+        elapsed = time.perf_counter() - started
+        try:  # communicate() closes stdin, so the pipeline drains and exits
+            _, stderr = proc.communicate(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            _, stderr = proc.communicate()
+        time.sleep(0.2)  # let the last datagrams land
+    except BrokenPipeError:
+        elapsed = time.perf_counter() - started
+        _, stderr = proc.communicate()
+    finally:
+        osc.close()
+        if bridge is not None:
+            bridge.close()
+        home.cleanup()
+
+    result.returncode = proc.returncode
+    if proc.returncode:
+        print(stderr.decode(errors="replace")[-2000:], file=sys.stderr)
+    result.injected = seq * devices
+    result.injected_per_s = round(result.injected / elapsed, 1)
+    result.delivered_per_s = round(osc.messages / elapsed, 1)
+    result.outputs["osc"] = osc_book.stats(probes)
+    if bridge is not None:
+        result.outputs["hue"] = hue_book.stats(probes)
+    return result
+
+
+# -- reporting -----------------------------------------------------------------
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _ms(value: float | None) -> str:
+    return "      -  " if value is None else f"{value:7.1f}ms"
+
+
+def print_result(result: RunResult) -> None:
+    for name, stats in result.outputs.items():
+        print(
+            f"{result.target:<9} devices={result.devices:<4} rate={result.rate_hz:<4g} "
+            f"{name:<4} p50={_ms(stats.p50_ms)} p95={_ms(stats.p95_ms)} "
+            f"p99={_ms(stats.p99_ms)} lost={stats.lost}/{stats.probes} "
+            f"in={result.injected_per_s:.0f}/s out={result.delivered_per_s:.0f}/s",
+            flush=True,
+        )
+
+
+def compare(previous: dict[str, Any], runs: list[dict[str, Any]]) -> None:
+    """Print p95 changes against a previous results file."""
+    key = lambda run: (run["target"], run["devices"], run["rate_hz"])
+    before = {key(run): run for run in previous.get("runs", [])}
+    print(f"\nvs {previous.get('commit') or 'previous'} ({previous.get('created', '?')}):")
+    for run in runs:
+        old = before.get(key(run))
+        if old is None:
+            continue
+        for name, stats in run["outputs"].items():
+            was, now = old["outputs"].get(name, {}).get("p95_ms"), stats["p95_ms"]
+            if not was or now is None:
+                continue
+            print(
+                f"  {run['target']:<9} devices={run['devices']:<4} rate={run['rate_hz']:<4g} "
+                f"{name:<4} p95 {_ms(was)} -> {_ms(now)} ({(now - was) / was * 100:+.0f}%)"
+            )
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Measure HR -> OSC/Hue latency and throughput")
+    ap.add_argument("--targets", nargs="+", choices=TARGETS, default=list(TARGETS))
+    ap.add_argument("--devices", nargs="+", type=int, default=[1, 10, 100, 500])
+    ap.add_argument("--rates", nargs="+", type=float, default=[1.0, 10.0], help="Batches per second")
+    ap.add_argument("--duration", type=float, default=5.0, help="Timed seconds per run (default: 5)")
+    ap.add_argument(
+        "--warmup", type=float, default=1.0,
+        help="Untimed seconds at the start of each run (default: 1)",
+    )
+    ap.add_argument("--no-hue", action="store_true", help="Skip the fake Hue bridge")
+    ap.add_argument(
+        "--target-args", default="",
+        help='Extra arguments for the pipeline scripts, e.g. "--engine sync"',
+    )
+    ap.add_argument("--output", help="Results JSON (default: outputs/bench/latency_<time>.json)")
+    ap.add_argument("--compare", help="Previous results JSON to compare p95 against")
+    args = ap.parse_args()
+    if any(n < 1 for n in args.devices) or any(r <= 0 for r in args.rates):
+        ap.error("--devices must be >= 1 and --rates > 0")
+
+    extra = args.target_args.split()
+    runs = []
+    for target in args.targets:
+        for devices in args.devices:
+            for rate in args.rates:
+                result = run_once(
+                    target, devices, rate, args.duration, not args.no_hue, extra, args.warmup
+                )
+                print_result(result)
+                runs.append(asdict(result))
+
+    report = {
+        "created": datetime.now(timezone.utc).isoformat(),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "target_args": extra,
+        "warmup_s": args.warmup,
+        "runs": runs,
+    }
+    output = Path(args.output) if args.output else (
+        ROOT / "outputs" / "bench" / f"latency_{datetime.now():%Y%m%d_%H%M%S}.json"
+    )
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+    print(f"\nwrote {output}")
+    if args.compare:
+        compare(json.loads(Path(args.compare).read_text(encoding="utf-8")), runs)
+
+
+if __name__ == "__main__":
+    main()
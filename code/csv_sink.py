@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""Buffered CSV sink shared by the prototype and ant_to_csv.py.
+
+Rows are formatted into an in-memory buffer and written to the file in
+batches when any threshold is reached: a row count, a byte size, or a
+maximum age of the oldest buffered row (checked by a small timer thread so
+rows do not sit in memory when input goes quiet). ``close()`` always writes
+whatever is left.
+
+Durability is configurable:
+
+    "os"     each batch is handed to the OS; survives the process crashing
+    "fsync"  each batch is also fsync'd; survives power loss
+
+Anything still buffered (at most one batch) is lost if the process is
+killed hard, so ``max_rows=1`` reproduces the old flush-every-row behaviour.
+"""
+
+from __future__ import annotations
+
+import csv
+import io
+import os
+import signal
+import threading
+import time
+from collections.abc import Iterable, Mapping, Sequence
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+DURABILITY = ("os", "fsync")
+
+
+@dataclass(frozen=True)
+class FlushPolicy:
+    max_rows: int = 256
+    max_bytes: int = 64 * 1024
+    max_delay: float = 0.25
+    durability: str = "os"
+
+    def __post_init__(self) -> None:
+        if self.max_rows < 1:
+            raise ValueError("max_rows must be at least 1")
+        if self.max_bytes < 1:
+            raise ValueError("max_bytes must be at least 1")
+        if self.max_delay < 0:
+            raise ValueError("max_delay must be zero or greater")
+        if self.durability not in DURABILITY:
+            raise ValueError(f"durability must be one of {DURABILITY}")
+
+
+class CSVSink:
+    def __init__(
+        self,
+        path: str | Path,
+        header: Sequence[str],
+        policy: FlushPolicy | None = None,
+    ) -> None:
+        self.path = Path(path)
+        self.header = list(header)
+        self.policy = policy or FlushPolicy()
+        self.rows_written = 0
+        self.flushes = 0
+
+        self._handle = self.path.open("w", newline="", encoding="utf-8")
+        self._buffer = io.StringIO()
+        self._writer = csv.writer(self._buffer)
+        self._buffered_rows = 0
+        self._oldest: float | None = None
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+
+        self._writer.writerow(self.header)
+        self._flush_locked()
+
+        self._timer: threading.Thread | None = None
+        if self.policy.max_delay > 0:
+            self._timer = threading.Thread(target=self._flush_periodically, name="csv-flush", daemon=True)
+            self._timer.start()
+
+    def __enter__(self) -> "CSVSink":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def write_row(self, row: Sequence[Any] | Mapping[str, Any]) -> None:
+        with self._lock:
+            self._append(row)
+            self._maybe_flush()
+
+    def write_rows(self, rows: Iterable[Sequence[Any] | Mapping[str, Any]]) -> None:
+        with self._lock:
+            for row in rows:
+                self._append(row)
+            self._maybe_flush()
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush_locked()
+
+    def close(self) -> None:
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        if self._timer is not None:
+            self._timer.join()
+        with self._lock:
+            self._flush_locked()
+            self._handle.close()
+
+    def _append(self, row: Sequence[Any] | Mapping[str, Any]) -> None:
+        if self._closed.is_set():
+            raise ValueError("write to a closed CSV sink")
+        if isinstance(row, Mapping):
+            row = [row.get(name) for name in self.header]
+        self._writer.writerow(row)
+        self._buffered_rows += 1
+        self.rows_written += 1
+        if self._oldest is None:
+            self._oldest = time.monotonic()
+
+    def _maybe_flush(self) -> None:
+        if (
+            self._buffered_rows >= self.policy.max_rows
+            or self._buffer.tell() >= self.policy.max_bytes
+        ):
+            self._flush_locked()
+
+    def _flush_locked(self) -> None:
+        data = self._buffer.getvalue()
+        if not data:
+            return
+        self._handle.write(data)
+        self._handle.flush()
+        if self.policy.durability == "fsync":
+            os.fsync(self._handle.fileno())
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        self._buffered_rows = 0
+        self._oldest = None
+        self.flushes += 1
+
+    def _flush_periodically(self) -> None:
+        delay = self.policy.max_delay
+        while not self._closed.wait(delay):
+            with self._lock:
+                if self._oldest is not None and time.monotonic() - self._oldest >= delay:
+                    self._flush_locked()
+
+
+def exit_on_signals(*signums: int) -> None:
+    """Turn termination signals into SystemExit so ``finally`` blocks close sinks."""
+
+    def handler(signum: int, frame: Any) -> None:
+        raise SystemExit(128 + signum)
+
+    for signum in signums or (signal.SIGTERM, getattr(signal, "SIGHUP", None)):
+        if signum is not None:
+            signal.signal(signum, handler)
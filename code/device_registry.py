@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""Per-device state in preallocated arrays, with silence eviction.
+
+Every strap the prototype ever heard used to stay in a ``dict`` for the
+rest of the run, so one that left the room kept pulling on the group
+average. ``DeviceRegistry`` keeps the latest state of the *active* devices
+in parallel ``array`` columns indexed by slot:
+
+    bpm      latest BPM
+    seen     time.monotonic() of the latest reading
+    rr       latest RR interval in ms (NaN when none)
+    quality  0-1 signal quality of the latest reading (1.0 unless a filter says)
+
+``slots`` maps device id -> slot, in least-recently-seen order, so
+``evict`` only looks at the devices that have actually gone quiet. Freed
+slots are reused, and the columns grow only when more devices are active
+at once than ever before. Memory therefore follows the size of the room,
+not the number of straps seen over a run.
+
+    registry = DeviceRegistry(timeout=10.0)
+    registry.update("51861", 88.0, rr_ms=682)
+    for device_id, bpm in registry.evict():
+        ...
+"""
+
+from __future__ import annotations
+
+import math
+import time
+from array import array
+from collections import OrderedDict
+from collections.abc import Iterator
+from typing import Any
+
+from hr_readings import rr_value
+
+CAPACITY = 64
+TIMEOUT = 10.0
+
+
+class DeviceRegistry:
+    """Latest bpm / seen / rr / quality per active device, by slot."""
+
+    def __init__(self, capacity: int = CAPACITY, timeout: float | None = TIMEOUT) -> None:
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        if timeout is not None and timeout <= 0:
+            raise ValueError("timeout must be positive (or None to keep devices forever)")
+        self.timeout = timeout
+        self.evicted = 0
+        self.slots: OrderedDict[str, int] = OrderedDict()
+        self.bpm = array("d", [math.nan]) * capacity
+        self.seen = array("d", [0.0]) * capacity
+        self.rr = array("d", [math.nan]) * capacity
+        self.quality = array("f", [0.0]) * capacity
+        self._free = list(range(capacity - 1, -1, -1))
+
+    def __len__(self) -> int:
+        return len(self.slots)
+
+    def __contains__(self, device_id: object) -> bool:
+        return device_id in self.slots
+
+    @property
+    def capacity(self) -> int:
+        return len(self.bpm)
+
+    def get(self, device_id: str) -> float | None:
+        slot = self.slots.get(device_id)
+        return None if slot is None else self.bpm[slot]
+
+    def device_ids(self) -> list[str]:
+        return list(self.slots)
+
+    def items(self) -> Iterator[tuple[str, float]]:
+        """(device_id, bpm) for every active device, least recently seen first."""
+        bpm = self.bpm
+        return ((device_id, bpm[slot]) for device_id, slot in self.slots.items())
+
+    def update(
+        self,
+        device_id: str,
+        bpm: float,
+        rr_ms: Any = None,
+        quality: float = 1.0,
+        now: float | None = None,
+    ) -> float | None:
+        """Store a reading; returns the device's previous BPM (None if it is new)."""
+        slots = self.slots
+        slot = slots.get(device_id)
+        if slot is None:
+            previous = None
+            slot = slots[device_id] = self._allocate()
+        else:
+            previous = self.bpm[slot]
+            slots.move_to_end(device_id)
+        self.bpm[slot] = bpm
+        self.seen[slot] = time.monotonic() if now is None else now
+        self.rr[slot] = rr_value(rr_ms)
+        self.quality[slot] = quality
+        return previous
+
+    def remove(self, device_id: str) -> float | None:
+        """Forget a device; returns its last BPM (None if it was not active)."""
+        slot = self.slots.pop(device_id, None)
+        if slot is None:
+            return None
+        bpm = self.bpm[slot]
+        self.bpm[slot] = self.rr[slot] = math.nan
+        self._free.append(slot)
+        return bpm
+
+    def evict(self, now: float | None = None) -> list[tuple[str, float]]:
+        """Drop devices silent for longer than ``timeout``; returns (device_id, last bpm)."""
+        if self.timeout is None or not self.slots:
+            return []
+        cutoff = (time.monotonic() if now is None else now) - self.timeout
+        seen = self.seen
+        evicted = []
+        for device_id, slot in self.slots.items():
+            if seen[slot] >= cutoff:
+                break  # in least-recently-seen order, so the rest are newer
+            evicted.append((device_id, self.bpm[slot]))
+        for device_id, _ in evicted:
+            self.remove(device_id)
+        self.evicted += len(evicted)
+        return evicted
+
+    def _allocate(self) -> int:
+        if not self._free:
+            size = self.capacity
+            self.bpm.extend(array("d", [math.nan]) * size)
+            self.seen.extend(array("d", [0.0]) * size)
+            self.rr.extend(array("d", [math.nan]) * size)
+            self.quality.extend(array("f", [0.0]) * size)
+            self._free = list(range(2 * size - 1, size - 1, -1))
+        return self._free.pop()
+
@@ -0,0 +1,500 @@
+#!/usr/bin/env python3
+"""Local stand-in for the Hue bridge v1 REST API.
+
+Answers the requests ``phue.Bridge`` makes (registration, config, groups,
+group actions, lights, light state) so Hue output paths can run without a
+physical bridge.
+
+Commands are paced like a real bridge's Zigbee side. Group actions are
+applied at most ``group_rate`` per second (about 1/s on real hardware) and
+light state changes ``light_rate`` per second (about 10/s). Commands queue
+up behind those limits. Once the queue is more than ``backlog`` seconds
+deep, new commands are refused with error 901, as an overloaded bridge
+does. Responses are sent on arrival, or when the command is applied with
+``block``.
+
+With ``stream_port`` it also listens for Entertainment API streaming
+(HueStream v1 over plain UDP; a real bridge wraps it in DTLS). Messages
+count only while a group has streaming switched on, as on a real bridge;
+``stream_stats()`` reports their rate, gaps and sequence losses.
+
+Every request is recorded with arrival, applied and response times.
+``stats()`` summarises them, and ``on_request`` lets a caller such as
+bench_latency.py observe them live.
+
+    python3 code/fake_hue_bridge.py --port 8765 --group Office --report hue.json
+    python3 code/integrated_prototype.py --hue --ip 127.0.0.1:8765 --group Office
+    python3 code/fake_hue_bridge.py --port 8765 --stream-port 2100
+    python3 code/hue_entertainment.py --ip 127.0.0.1:8765 --plain
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import re
+import socket
+import threading
+import time
+from collections.abc import Callable, Iterable
+from dataclasses import asdict, dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any
+
+from hue_entertainment import decode_message
+
+USERNAME = "fakehueuser"
+GROUP_RATE = 1.0
+LIGHT_RATE = 10.0
+BACKLOG = 2.0
+
+_GROUP_PATH = re.compile(r"^/api/([^/]+)/groups/?(\w+)?(/action)?/?$")
+_LIGHT_PATH = re.compile(r"^/api/([^/]+)/lights/?(\w+)?(/state)?/?$")
+_USER_PATH = re.compile(r"^/api/([^/]+)(/config)?/?$")
+
+
+@dataclass
+class RequestRecord:
+    received: float  # time.perf_counter() when the request body was read
+    method: str
+    path: str
+    body: Any
+    handled: float = 0.0  # response sent
+    kind: str = "read"  # "group" / "light" commands are rate limited
+    applied: float | None = None  # when the command took effect
+    rejected: bool = False
+
+    @property
+    def queue_delay(self) -> float | None:
+        return None if self.applied is None else self.applied - self.received
+
+
+class CommandPacer:
+    """Schedule commands of one kind at most ``rate`` per second."""
+
+    def __init__(self, rate: float, backlog: float) -> None:
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.backlog = backlog
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def admit(self, now: float) -> float | None:
+        """Return when a command arriving ``now`` is applied, or None if refused."""
+        with self._lock:
+            at = max(now, self._next)
+            if at - now > self.backlog:
+                return None
+            self._next = at + self.interval
+            return at
+
+
+@dataclass
+class KindStats:
+    commands: int = 0
+    rejected: int = 0
+    per_second: float = 0.0
+    mean_delay_ms: float | None = None
+    max_delay_ms: float | None = None
+
+
+def summarise(records: list[RequestRecord]) -> dict[str, KindStats]:
+    """Command counts, refusals, achieved rate and queue delay per kind."""
+    stats: dict[str, KindStats] = {}
+    for kind in ("group", "light"):
+        chosen = [r for r in records if r.kind == kind]
+        delays = [r.queue_delay * 1000 for r in chosen if r.queue_delay is not None]
+        applied = sorted(r.applied for r in chosen if r.applied is not None)
+        span = applied[-1] - applied[0] if len(applied) > 1 else 0.0
+        stats[kind] = KindStats(
+            commands=len(chosen),
+            rejected=sum(r.rejected for r in chosen),
+            per_second=round((len(applied) - 1) / span, 2) if span > 0 else 0.0,
+            mean_delay_ms=round(sum(delays) / len(delays), 1) if delays else None,
+            max_delay_ms=round(max(delays), 1) if delays else None,
+        )
+    return stats
+
+
+@dataclass
+class StreamStats:
+    messages: int = 0
+    ignored: int = 0  # arrived while no group was streaming
+    invalid: int = 0
+    lost: int = 0  # sequence numbers skipped
+    per_second: float = 0.0  # this rate and the gap cover the latest session only
+    max_gap_ms: float | None = None
+
+
+class StreamReceiver:
+    """Decode HueStream datagrams and keep the latest colour per light."""
+
+    def __init__(self, host: str, port: int, active: Callable[[], bool]) -> None:
+        self.active = active
+        self.colors: dict[int, tuple[int, int, int]] = {}
+        self._stats = StreamStats()
+        self._times: list[float] = []
+        self._sequence: int | None = None
+        self._lock = threading.Lock()
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._sock.bind((host, port))
+        self._sock.settimeout(0.2)
+        self._closed = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="fake-hue-stream", daemon=True)
+
+    @property
+    def port(self) -> int:
+        return self._sock.getsockname()[1]
+
+    def start(self) -> StreamReceiver:
+        self._thread.start()
+        return self
+
+    def close(self) -> None:
+        self._closed.set()
+        self._thread.join(1.0)
+        self._sock.close()
+
+    def stats(self) -> StreamStats:
+        with self._lock:
+            stats = StreamStats(**asdict(self._stats))
+            times = list(self._times)
+        if len(times) > 1:
+            stats.per_second = round((len(times) - 1) / (times[-1] - times[0]), 2)
+            stats.max_gap_ms = round(max(b - a for a, b in zip(times, times[1:])) * 1000, 1)
+        return stats
+
+    def reset(self) -> None:
+        """A new streaming session: sequence numbers and timing start over."""
+        with self._lock:
+            self._sequence = None
+            self._times.clear()
+
+    def _run(self) -> None:
+        while not self._closed.is_set():
+            try:
+                data = self._sock.recv(4096)
+            except socket.timeout:
+                continue
+            except OSError:
+                return
+            self._receive(data, time.perf_counter())
+
+    def _receive(self, data: bytes, now: float) -> None:
+        active = self.active()  # before our lock: the bridge calls reset() under its own
+        with self._lock:
+            try:
+                sequence, _, colors = decode_message(data)
+            except ValueError:
+                self._stats.invalid += 1
+                return
+            if not active:
+                self._stats.ignored += 1
+                return
+            if self._sequence is not None:
+                self._stats.lost += (sequence - self._sequence - 1) & 0xFF
+            self._sequence = sequence
+            self._stats.messages += 1
+            self._times.append(now)
+            self.colors.update(colors)
+
+
+@dataclass
+class _Group:
+    name: str
+    lights: list[str]
+    action: dict[str, Any] = field(
+        default_factory=lambda: {"on": False, "bri": 254, "hue": 0, "sat": 0, "colormode": "hs"}
+    )
+    stream: dict[str, Any] = field(default_factory=lambda: {"active": False})
+
+
+class FakeHueBridge:
+    """A threaded HTTP server holding a few groups, one light per group."""
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        groups: Iterable[str] = ("Office",),
+        on_request: Callable[[RequestRecord], None] | None = None,
+        group_rate: float = GROUP_RATE,
+        light_rate: float = LIGHT_RATE,
+        backlog: float = BACKLOG,
+        block: bool = False,
+        limits: bool = True,
+        stream_port: int | None = None,
+    ) -> None:
+        self.groups = {
+            str(i): _Group(name, [str(i)]) for i, name in enumerate(groups, start=1)
+        }
+        self.lights = {
+            gid: {"name": f"{group.name} light", "type": "Extended color light",
+                  "state": {**group.action, "reachable": True}}
+            for gid, group in self.groups.items()
+        }
+        self.on_request = on_request
+        self.block = block
+        self.pacers = {
+            "group": CommandPacer(group_rate if limits else 0.0, backlog),
+            "light": CommandPacer(light_rate if limits else 0.0, backlog),
+        }
+        self.requests: list[RequestRecord] = []
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread: threading.Thread | None = None
+        self.stream = (
+            None if stream_port is None
+            else StreamReceiver(host, stream_port, self._streaming).start()
+        )
+
+    @property
+    def address(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"{host}:{port}"
+
+    def start(self) -> FakeHueBridge:
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="fake-hue-bridge", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def close(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+        if self.stream is not None:
+            self.stream.close()
+
+    def __enter__(self) -> FakeHueBridge:
+        return self.start()
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+    def stats(self) -> dict[str, KindStats]:
+        with self._lock:
+            return summarise(list(self.requests))
+
+    def stream_stats(self) -> StreamStats | None:
+        return None if self.stream is None else self.stream.stats()
+
+    def _streaming(self) -> bool:
+        with self._lock:
+            return any(group.stream.get("active") for group in self.groups.values())
+
+    # -- API ----------------------------------------------------------------
+
+    def handle(self, method: str, path: str, body: Any) -> Any:
+        if path.rstrip("/") == "/api" and method == "POST":
+            return [{"success": {"username": USERNAME}}]
+
+        match = _GROUP_PATH.match(path)
+        if match:
+            user, group_id, action = match.groups()
+            if user != USERNAME:
+                return _error(1, path, "unauthorized user")
+            return self._groups(method, path, group_id, action is not None, body)
+
+        match = _LIGHT_PATH.match(path)
+        if match:
+            user, light_id, state = match.groups()
+            if user != USERNAME:
+                return _error(1, path, "unauthorized user")
+            return self._lights(method, path, light_id, state is not None, body)
+
+        match = _USER_PATH.match(path)
+        if match and method == "GET":
+            if match.group(1) != USERNAME:
+                return _error(1, path, "unauthorized user")
+            config = {"name": "Fake Hue Bridge", "apiversion": "1.50.0", "swversion": "1950207110"}
+            if match.group(2):
+                return config
+            return {
+                "config": config,
+                "groups": self._groups("GET", path, None, False, None),
+                "lights": self._lights("GET", path, None, False, None),
+            }
+        return _error(4, path, f"method, {method}, not available for resource, {path}")
+
+    def _groups(self, method: str, path: str, group_id: str | None, action: bool, body: Any) -> Any:
+        with self._lock:
+            if group_id is None:
+                return {gid: self._describe(group) for gid, group in self.groups.items()}
+            group = self.groups.get(group_id)
+            if group is None:
+                return _error(3, path, f"resource, {path}, not available")
+            if method == "GET":
+                return self._describe(group)
+            if not isinstance(body, dict):
+                return _error(2, path, "body contains invalid json")
+            target = group.action if action else group.__dict__
+            prefix = f"/groups/{group_id}/action" if action else f"/groups/{group_id}"
+            if not action and self.stream is not None and body.get("stream", {}).get("active"):
+                self.stream.reset()
+            target.update(body)
+            if action:
+                for light_id in group.lights:
+                    self.lights[light_id]["state"].update(body)
+            return [{"success": {f"{prefix}/{key}": value}} for key, value in body.items()]
+
+    def _lights(self, method: str, path: str, light_id: str | None, state: bool, body: Any) -> Any:
+        with self._lock:
+            if light_id is None:
+                return {lid: dict(light) for lid, light in self.lights.items()}
+            light = self.lights.get(light_id)
+            if light is None:
+                return _error(3, path, f"resource, {path}, not available")
+            if method == "GET":
+                return dict(light)
+            if not isinstance(body, dict):
+                return _error(2, path, "body contains invalid json")
+            target = light["state"] if state else light
+            target.update(body)
+            prefix = f"/lights/{light_id}/state" if state else f"/lights/{light_id}"
+            return [{"success": {f"{prefix}/{key}": value}} for key, value in body.items()]
+
+    def _pace(self, record: RequestRecord) -> float:
+        """Classify a request and apply the rate limits; return the response delay."""
+        if record.method != "PUT":
+            return 0.0
+        if _GROUP_PATH.match(record.path) and record.path.rstrip("/").endswith("/action"):
+            record.kind = "group"
+        elif _LIGHT_PATH.match(record.path) and record.path.rstrip("/").endswith("/state"):
+            record.kind = "light"
+        else:
+            return 0.0
+        record.applied = self.pacers[record.kind].admit(record.received)
+        if record.applied is None:
+            record.rejected = True
+            return 0.0
+        return record.applied - record.received if self.block else 0.0
+
+    @staticmethod
+    def _describe(group: _Group) -> dict[str, Any]:
+        return {
+            "name": group.name,
+            "lights": list(group.lights),
+            "type": "Room",
+            "action": dict(group.action),
+            "stream": dict(group.stream),
+            "state": {"all_on": group.action.get("on", False), "any_on": group.action.get("on", False)},
+        }
+
+    def _record(self, record: RequestRecord) -> None:
+        with self._lock:
+            self.requests.append(record)
+        if self.on_request is not None:
+            self.on_request(record)
+
+    def _handler_class(self) -> type[BaseHTTPRequestHandler]:
+        bridge = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _serve(self) -> None:
+                length = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(length) if length else b""
+                record = RequestRecord(time.perf_counter(), self.command, self.path, None)
+                try:
+                    record.body = json.loads(raw) if raw else None
+                except ValueError:
+                    record.body = raw.decode("utf-8", "replace")
+                delay = bridge._pace(record)
+                if record.rejected:
+                    result = _error(901, self.path, "Internal error, 503")
+                else:
+                    if delay > 0:
+                        time.sleep(delay)
+                    result = bridge.handle(self.command, self.path, record.body)
+                payload = json.dumps(result).encode()
+                record.handled = time.perf_counter()
+                bridge._record(record)
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            do_GET = do_PUT = do_POST = do_DELETE = _serve
+
+            def log_message(self, format: str, *args: Any) -> None:
+                pass
+
+        return Handler
+
+
+def _error(kind: int, address: str, description: str) -> list[dict[str, Any]]:
+    return [{"error": {"type": kind, "address": address, "description": description}}]
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Serve a fake Hue bridge v1 API on localhost")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--group", action="append", help="Group name (repeatable; default: Office)")
+    ap.add_argument(
+        "--group-rate", type=float, default=GROUP_RATE,
+        help=f"Group actions applied per second (default: {GROUP_RATE:g})",
+    )
+    ap.add_argument(
+        "--light-rate", type=float, default=LIGHT_RATE,
+        help=f"Light state changes applied per second (default: {LIGHT_RATE:g})",
+    )
+    ap.add_argument(
+        "--backlog", type=float, default=BACKLOG,
+        help=f"Seconds of queued commands before refusing with error 901 (default: {BACKLOG:g})",
+    )
+    ap.add_argument("--block", action="store_true", help="Respond only once a command is applied")
+    ap.add_argument("--no-limits", action="store_true", help="Apply every command immediately")
+    ap.add_argument(
+        "--stream-port", type=int,
+        help="Also receive Entertainment streaming on this UDP port (plain UDP, no DTLS)",
+    )
+    ap.add_argument("--quiet", action="store_true", help="Do not print each request")
+    ap.add_argument("--report", help="Write every request's timing to this JSON file on exit")
+    args = ap.parse_args()
+
+    def show(record: RequestRecord) -> None:
+        if args.quiet:
+            return
+        timing = ""
+        if record.rejected:
+            timing = " REFUSED (901)"
+        elif record.queue_delay is not None:
+            timing = f" applied +{record.queue_delay * 1000:.0f}ms"
+        print(f"[fake-hue] {record.method} {record.path} {json.dumps(record.body)}{timing}", flush=True)
+
+    bridge = FakeHueBridge(
+        args.host, args.port, args.group or ["Office"], on_request=show,
+        group_rate=args.group_rate, light_rate=args.light_rate, backlog=args.backlog,
+        block=args.block, limits=not args.no_limits, stream_port=args.stream_port,
+    )
+    print(f"[fake-hue] listening on {bridge.address} (username {USERNAME})", flush=True)
+    if bridge.stream is not None:
+        print(f"[fake-hue] entertainment stream on udp port {bridge.stream.port}", flush=True)
+    try:
+        bridge._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        bridge._server.server_close()
+        for kind, stats in bridge.stats().items():
+            print(f"[fake-hue] {kind}: {asdict(stats)}", flush=True)
+        if bridge.stream is not None:
+            print(f"[fake-hue] stream: {asdict(bridge.stream.stats())}", flush=True)
+            bridge.stream.close()
+        if args.report:
+            start = bridge.requests[0].received if bridge.requests else 0.0
+            rows = [
+                {**asdict(r), "received": r.received - start, "handled": r.handled - start,
+                 "applied": None if r.applied is None else r.applied - start}
+                for r in bridge.requests
+            ]
+            Path(args.report).write_text(json.dumps(rows, indent=1) + "\n", encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
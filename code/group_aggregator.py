@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+"""Incremental group heart-rate aggregation.
+
+The integrated prototype used to recompute ``fmean`` over every device and
+then over the whole moving window for each reading. The classes here keep
+running sums instead, so the mean costs O(1) per update no matter how many
+straps or how long the window is. Median and trimmed mean split the values
+into heaps (the trimmed low tail, the middle, the trimmed high tail) with
+lazy deletion, so they cost O(log n) per update.
+
+    aggregator = GroupAggregator(window=10, statistic="median")
+    snapshot = aggregator.update("51861", 88.0)
+    snapshot.current, snapshot.moving
+
+``update_many`` folds a whole ``hr_batch`` in and moves the window once,
+since a batch is one tick of the room rather than one tick per strap.
+
+Latest values live in a ``DeviceRegistry``. With a ``timeout``, ``expire``
+drops straps that have gone quiet so they stop pulling on the group value.
+"""
+
+from __future__ import annotations
+
+import math
+from collections import Counter, deque
+from collections.abc import Callable, Iterable
+from dataclasses import dataclass
+from heapq import heapify, heappop, heappush
+from typing import Any
+
+from device_registry import DeviceRegistry
+
+STATISTICS = ("mean", "median", "trimmed")
+
+# Float running sums slowly accumulate rounding error; re-derive them exactly
+# from the stored values after this many updates.
+RESUM_EVERY = 4096
+
+
+def validate_statistic(statistic: str, trim: float) -> None:
+    if statistic not in STATISTICS:
+        raise ValueError(f"unknown statistic {statistic!r}; expected one of {STATISTICS}")
+    if not 0.0 <= trim < 0.5:
+        raise ValueError("trim must be at least 0 and below 0.5")
+
+
+class _LazyHeap:
+    """A min-heap (max-heap with ``sign=-1``) with a running sum and lazy deletion.
+
+    ``discard`` only notes the value; it leaves the heap when it reaches the
+    top, or when dead entries outnumber live ones and the heap is rebuilt.
+    """
+
+    def __init__(self, sign: int = 1) -> None:
+        self.sign = sign
+        self.items: list[float] = []  # values times sign
+        self.dead: Counter[float] = Counter()
+        self.size = 0
+        self.total = 0.0
+
+    def top(self) -> float:
+        return self.sign * self.items[0]
+
+    def push(self, value: float) -> None:
+        heappush(self.items, self.sign * value)
+        self.size += 1
+        self.total += value
+
+    def pop(self) -> float:
+        value = self.sign * heappop(self.items)
+        self.size -= 1
+        self.total -= value
+        self._prune()
+        return value
+
+    def discard(self, value: float) -> None:
+        """Remove one ``value``, which must be in the heap."""
+        self.dead[self.sign * value] += 1
+        self.size -= 1
+        self.total -= value
+        if len(self.items) > 2 * self.size + 32:
+            self._compact()
+        else:
+            self._prune()
+
+    def resum(self) -> None:
+        self._compact()
+        self.total = math.fsum(self.items) * self.sign
+
+    def _prune(self) -> None:
+        # keep the top live, so top() never needs to look past it
+        items, dead = self.items, self.dead
+        while items and dead[items[0]]:
+            dead[items[0]] -= 1
+            if not dead[items[0]]:
+                del dead[items[0]]
+            heappop(items)
+
+    def _compact(self) -> None:
+        live = []
+        for item in self.items:
+            if self.dead[item]:
+                self.dead[item] -= 1
+            else:
+                live.append(item)
+        heapify(live)
+        self.items = live
+        self.dead.clear()
+
+
+class RunningStatistic:
+    """A multiset of floats with a running sum and, for order statistics, heaps.
+
+    Median and trimmed mean keep the ``cut`` smallest values in a max-heap,
+    the ``cut`` largest in a min-heap and the rest in a middle reachable
+    from both ends; the median is a trimmed mean that keeps one or two
+    values. Plain means skip the heaps and stay at constant cost.
+    """
+
+    def __init__(self, statistic: str = "mean", trim: float = 0.1) -> None:
+        validate_statistic(statistic, trim)
+        self.statistic = statistic
+        self.trim = trim
+        self.total = 0.0
+        self.count = 0
+        self._ordered = statistic != "mean"
+        self._low = _LazyHeap(-1)
+        self._high = _LazyHeap()
+        self._mid_min = _LazyHeap()  # the middle values twice, once per end
+        self._mid_max = _LazyHeap(-1)
+
+    def add(self, value: float) -> None:
+        self.total += value
+        self.count += 1
+        if self._ordered:
+            if self._low.size and value < self._low.top():
+                self._low.push(value)
+            elif self._high.size and value > self._high.top():
+                self._high.push(value)
+            else:
+                self._push_middle(value)
+            self._rebalance()
+
+    def remove(self, value: float) -> None:
+        self.total -= value
+        self.count -= 1
+        if self._ordered:
+            if self._low.size and value <= self._low.top():
+                self._low.discard(value)
+            elif self._high.size and value >= self._high.top():
+                self._high.discard(value)
+            else:
+                self._mid_min.discard(value)
+                self._mid_max.discard(value)
+            self._rebalance()
+        if self.count == 0:
+            self.total = 0.0
+
+    def replace(self, old: float, new: float) -> None:
+        self.remove(old)
+        self.add(new)
+
+    def resum(self, values: Iterable[float]) -> None:
+        """Reset the running sums from the exact stored values."""
+        self.total = math.fsum(values)
+        if self._ordered:
+            self._low.resum()
+            self._high.resum()
+
+    def value(self) -> float:
+        if self.count == 0:
+            return math.nan
+        if not self._ordered:
+            return self.total / self.count
+        if self.statistic == "median":
+            return (self._mid_min.top() + self._mid_max.top()) / 2.0
+        if self._low.size == 0:
+            return self.total / self.count
+        return (self.total - self._low.total - self._high.total) / self._mid_min.size
+
+    def _cut(self) -> int:
+        if self.statistic == "median":
+            return max(0, (self.count - 1) // 2)
+        return int(self.count * self.trim)
+
+    def _push_middle(self, value: float) -> None:
+        self._mid_min.push(value)
+        self._mid_max.push(value)
+
+    def _pop_middle(self, end: _LazyHeap, other: _LazyHeap) -> float:
+        value = end.pop()
+        other.discard(value)
+        return value
+
+    def _rebalance(self) -> None:
+        # cut < count / 2, so the middle never runs dry
+        cut = self._cut()
+        low, high = self._low, self._high
+        while low.size > cut:
+            self._push_middle(low.pop())
+        while high.size > cut:
+            self._push_middle(high.pop())
+        while low.size < cut:
+            low.push(self._pop_middle(self._mid_min, self._mid_max))
+        while high.size < cut:
+            high.push(self._pop_middle(self._mid_max, self._mid_min))
+
+
+class MovingStatistic:
+    """Fixed-size window over a stream of values with an O(1) mean."""
+
+    def __init__(self, size: int, statistic: str = "mean", trim: float = 0.1) -> None:
+        if size < 1:
+            raise ValueError("window size must be at least 1")
+        self.size = size
+        self._values: deque[float] = deque()
+        self._stat = RunningStatistic(statistic, trim)
+        self._updates = 0
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def push(self, value: float) -> float:
+        if len(self._values) == self.size:
+            self._stat.remove(self._values.popleft())
+        self._values.append(value)
+        self._stat.add(value)
+        self._updates += 1
+        if self._updates % RESUM_EVERY == 0:
+            self._stat.resum(self._values)
+        return self._stat.value()
+
+    def value(self) -> float:
+        return self._stat.value()
+
+    def clear(self) -> None:
+        while self._values:
+            self._stat.remove(self._values.popleft())
+
+
+@dataclass(frozen=True)
+class GroupSnapshot:
+    devices: int
+    current: float
+    moving: float
+
+
+class GroupAggregator:
+    """Latest BPM per device plus a moving window of the group value.
+
+    ``current`` is the statistic across each device's latest BPM and
+    ``moving`` is the same statistic across the last ``window`` group values.
+    """
+
+    def __init__(
+        self,
+        window: int,
+        statistic: str = "mean",
+        trim: float = 0.1,
+        timeout: float | None = None,
+    ) -> None:
+        self.registry = DeviceRegistry(timeout=timeout)
+        self._devices = RunningStatistic(statistic, trim)
+        self._history = MovingStatistic(window, statistic, trim)
+        self._updates = 0
+
+    def __len__(self) -> int:
+        return len(self.registry)
+
+    def __contains__(self, device_id: object) -> bool:
+        return device_id in self.registry
+
+    def get(self, device_id: str) -> float | None:
+        return self.registry.get(device_id)
+
+    def device_ids(self) -> list[str]:
+        return self.registry.device_ids()
+
+    def update(
+        self,
+        device_id: str,
+        bpm: float,
+        rr_ms: Any = None,
+        now: float | None = None,
+        quality: float = 1.0,
+    ) -> GroupSnapshot:
+        self._fold(device_id, bpm, rr_ms, now, quality)
+        return self._push()
+
+    def update_many(
+        self,
+        readings: Iterable[tuple[str, float, Any]],
+        now: float | None = None,
+        quality: Callable[[str], float] | None = None,
+    ) -> GroupSnapshot:
+        """Fold in ``(device_id, bpm, rr_ms)``, then push one group value for all of them.
+
+        ``quality`` maps a device id to its 0-1 signal quality (hr_filter.py).
+        """
+        fold = self._fold
+        for device_id, bpm, rr_ms in readings:
+            fold(device_id, bpm, rr_ms, now, 1.0 if quality is None else quality(device_id))
+        return self._push()
+
+    def _fold(
+        self, device_id: str, bpm: float, rr_ms: Any, now: float | None, quality: float
+    ) -> None:
+        previous = self.registry.update(device_id, bpm, rr_ms, quality, now)
+        if previous is None:
+            self._devices.add(bpm)
+        else:
+            self._devices.replace(previous, bpm)
+
+        self._updates += 1
+        if self._updates % RESUM_EVERY == 0:
+            self._devices.resum(bpm for _, bpm in self.registry.items())
+
+    def remove(self, device_id: str) -> bool:
+        """Forget a device so it no longer pulls on the group value."""
+        previous = self.registry.remove(device_id)
+        if previous is None:
+            return False
+        self._devices.remove(previous)
+        return True
+
+    def expire(self, now: float | None = None) -> list[str]:
+        """Remove devices silent for longer than the timeout; returns their ids."""
+        evicted = self.registry.evict(now)
+        for _, bpm in evicted:
+            self._devices.remove(bpm)
+        return [device_id for device_id, _ in evicted]
+
+    def snapshot(self) -> GroupSnapshot:
+        return GroupSnapshot(
+            devices=len(self.registry),
+            current=self._devices.value(),
+            moving=self._history.value(),
+        )
+
+    def _push(self) -> GroupSnapshot:
+        current = self._devices.value()
+        moving = self._history.push(current)
+        return GroupSnapshot(devices=len(self.registry), current=current, moving=moving)
@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+"""Asyncio router core shared by integrated_prototype.py and hr_router_live.py.
+
+The synchronous loops ran their sinks one after another, so a slow sink
+delayed every other sink. ``AsyncEngine`` instead gives each sink its own
+task fed by a bounded queue. What happens when a queue is full is a
+per-sink backpressure policy:
+
+    block        wait for room (nothing is lost; ingest slows down)
+    drop-oldest  discard the oldest queued item to make room
+    coalesce     keep only the newest item (for "latest value wins" sinks)
+
+Sinks are plain objects with ``emit(item)``. If a sink sets ``blocking =
+True`` its emits run in a worker thread, several queued items per hop.
+
+Readings come from stdin (read on a helper thread, so it works with any
+event loop and either wire format) or from TCP clients with ``--listen``.
+Queue depth, drops and coalesces are available from ``metrics()`` and are
+logged periodically under ``[queues]``.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import io
+import signal
+import threading
+from collections.abc import AsyncIterator, Callable, Iterable, Iterator
+from dataclasses import dataclass
+from typing import Any, BinaryIO
+
+from hr_logging import get_logger
+from hr_readings import DecodeError, Reading, ReadingDecoder
+from hr_wire import FRAME_COUNT, MAGIC, RECORD, decode_record, read_batches
+
+POLICIES = ("block", "drop-oldest", "coalesce")
+
+queues_log = get_logger("queues")
+_STOP = object()
+
+
+@dataclass
+class QueueMetrics:
+    depth: int = 0
+    max_depth: int = 0
+    delivered: int = 0
+    dropped: int = 0
+    coalesced: int = 0
+    failed: int = 0
+
+
+class SinkQueue:
+    """One sink, its bounded queue, and the task that drains it."""
+
+    def __init__(self, name: str, sink: Any, policy: str = "block", maxsize: int = 1024) -> None:
+        if policy not in POLICIES:
+            raise ValueError(f"unknown policy {policy!r}; expected one of {POLICIES}")
+        self.name = name
+        self.sink = sink
+        self.policy = policy
+        self.metrics = QueueMetrics()
+        self._blocking = getattr(sink, "blocking", False)
+        self._queue: asyncio.Queue = asyncio.Queue(1 if policy == "coalesce" else max(1, maxsize))
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run(), name=f"sink-{self.name}")
+
+    async def put(self, item: Any) -> None:
+        queue = self._queue
+        if queue.full():
+            if self.policy == "block":
+                await queue.put(item)
+                self._observe()
+                return
+            queue.get_nowait()
+            queue.task_done()
+            if self.policy == "coalesce":
+                self.metrics.coalesced += 1
+            else:
+                self.metrics.dropped += 1
+        queue.put_nowait(item)
+        self._observe()
+
+    async def stop(self) -> None:
+        """Deliver everything already queued, then end the task."""
+        await self._queue.put(_STOP)
+        if self._task is not None:
+            await self._task
+
+    def _observe(self) -> None:
+        depth = self._queue.qsize()
+        self.metrics.depth = depth
+        if depth > self.metrics.max_depth:
+            self.metrics.max_depth = depth
+
+    def _emit_many(self, items: list[Any]) -> None:
+        for item in items:
+            self.sink.emit(item)
+
+    async def _run(self) -> None:
+        queue = self._queue
+        while True:
+            items = [await queue.get()]
+            while not queue.empty() and len(items) < 256:
+                items.append(queue.get_nowait())
+            stopping = items[-1] is _STOP
+            if stopping:
+                items.pop()
+            self.metrics.depth = queue.qsize()
+            try:
+                if self._blocking:
+                    await asyncio.to_thread(self._emit_many, items)
+                else:
+                    self._emit_many(items)
+                self.metrics.delivered += len(items)
+            except Exception as exc:  # one broken sink must not stop the others
+                self.metrics.failed += len(items)
+                get_logger(self.name).error("emit failed: %s", exc)
+            if stopping:
+                return
+
+
+class AsyncEngine:
+    """Fan each processed item out to every sink queue."""
+
+    def __init__(
+        self,
+        process: Callable[[list[Reading]], Iterable[Any]],
+        sinks: list[SinkQueue],
+        metrics_interval: float = 5.0,
+    ) -> None:
+        self.process = process
+        self.sinks = sinks
+        self.metrics_interval = metrics_interval
+        self._feed: asyncio.Task | None = None
+
+    def metrics(self) -> dict[str, QueueMetrics]:
+        return {sink.name: sink.metrics for sink in self.sinks}
+
+    def request_stop(self) -> None:
+        """Stop reading input; whatever is already queued is still delivered."""
+        if self._feed is not None:
+            self._feed.cancel()
+
+    def stop_on_signals(self) -> None:
+        """Drain and stop on SIGTERM/SIGHUP where the loop supports it."""
+        loop = asyncio.get_running_loop()
+        for name in ("SIGTERM", "SIGHUP"):
+            signum = getattr(signal, name, None)
+            if signum is None:
+                continue
+            try:
+                loop.add_signal_handler(signum, self.request_stop)
+            except (NotImplementedError, RuntimeError):
+                pass  # e.g. Windows; the process-level handler still applies
+
+    async def run(self, source: AsyncIterator[list[Reading]]) -> None:
+        for sink in self.sinks:
+            sink.start()
+        reporter = None
+        if self.metrics_interval > 0 and self.sinks:
+            reporter = asyncio.create_task(self._report())
+        self._feed = asyncio.create_task(self._consume(source))
+        try:
+            try:
+                await self._feed
+            except asyncio.CancelledError:
+                if not self._feed.cancelled():
+                    raise
+            for sink in self.sinks:
+                await sink.stop()
+        finally:
+            if reporter is not None:
+                reporter.cancel()
+            self.log_metrics()
+
+    async def _consume(self, source: AsyncIterator[list[Reading]]) -> None:
+        async for readings in source:
+            for item in self.process(readings):
+                for sink in self.sinks:
+                    await sink.put(item)
+
+    def log_metrics(self) -> None:
+        for name, m in self.metrics().items():
+            queues_log.info(
+                "%s depth=%d max=%d delivered=%d dropped=%d coalesced=%d failed=%d",
+                name, m.depth, m.max_depth, m.delivered, m.dropped, m.coalesced, m.failed,
+            )
+
+    async def _report(self) -> None:
+        while True:
+            await asyncio.sleep(self.metrics_interval)
+            self.log_metrics()
+
+
+async def iterate_in_thread(
+    factory: Callable[[], Iterator[Any]], maxsize: int = 64
+) -> AsyncIterator[Any]:
+    """Run a blocking iterator on a daemon thread and yield its items here.
+
+    The bounded hand-off queue makes the reader thread wait when the loop
+    falls behind, so backpressure reaches the upstream pipe.
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue(maxsize)
+    done = threading.Event()
+
+    def pump() -> None:
+        last: Any = _STOP
+        try:
+            for item in factory():
+                if done.is_set():
+                    return
+                asyncio.run_coroutine_threadsafe(queue.put(item), loop).result()
+        except BaseException as exc:  # surfaced on the loop side
+            last = exc
+        try:
+            if not done.is_set():
+                asyncio.run_coroutine_threadsafe(queue.put(last), loop).result()
+        except RuntimeError:
+            pass  # the loop has already shut down
+
+    threading.Thread(target=pump, name="stdin-reader", daemon=True).start()
+    try:
+        while True:
+            item = await queue.get()
+            if item is _STOP:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        done.set()
+
+
+async def stdin_readings(
+    stream: BinaryIO,
+    decoder: ReadingDecoder,
+    on_invalid: Callable[[int, str], None] | None = None,
+    on_empty: Callable[[int], None] | None = None,
+) -> AsyncIterator[list[Reading]]:
+    # The reader thread gets its own buffered reader on the same descriptor:
+    # if it is still blocked in read() at exit, it must not hold sys.stdin's
+    # lock while the interpreter finalizes the standard streams.
+    if hasattr(stream, "fileno"):
+        stream = io.open(stream.fileno(), "rb", closefd=False)
+    async for number, readings in iterate_in_thread(
+        lambda: read_batches(stream, decoder, on_invalid)
+    ):
+        if readings:
+            yield readings
+        elif on_empty is not None:
+            on_empty(number)
+
+
+async def _connection_readings(
+    reader: asyncio.StreamReader, decoder: ReadingDecoder
+) -> AsyncIterator[list[Reading]]:
+    try:
+        head = await reader.readexactly(len(MAGIC))
+    except asyncio.IncompleteReadError as exc:
+        head = exc.partial
+    if head == MAGIC:
+        while True:
+            try:
+                (count,) = FRAME_COUNT.unpack(await reader.readexactly(FRAME_COUNT.size))
+                body = await reader.readexactly(count * RECORD.size)
+            except asyncio.IncompleteReadError:
+                return
+            yield [decode_record(record) for record in RECORD.iter_unpack(body)]
+
+    pending = head
+    while True:
+        line = pending + await reader.readline()
+        pending = b""
+        if not line:
+            return
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            readings = decoder.decode(line)
+        except DecodeError:
+            continue
+        if readings:
+            yield readings
+
+
+async def socket_readings(
+    host: str, port: int, decoder: ReadingDecoder, maxsize: int = 64
+) -> AsyncIterator[list[Reading]]:
+    """Accept any number of TCP clients sending newline JSON or binary frames."""
+    queue: asyncio.Queue = asyncio.Queue(maxsize)
+    log = get_logger("listen")
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        peer = writer.get_extra_info("peername")
+        log.info("client connected: %s", peer)
+        try:
+            async for readings in _connection_readings(reader, decoder):
+                await queue.put(readings)
+        finally:
+            writer.close()
+            log.info("client disconnected: %s", peer)
+
+    server = await asyncio.start_server(handle, host, port)
+    log.info("listening for HR clients on %s:%d", host, port)
+    async with server:
+        while True:
+            yield await queue.get()
+
+
+def parse_listen(value: str) -> tuple[str, int]:
+    host, _, port = value.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+
+def parse_policies(values: list[str] | None) -> dict[str, str]:
+    """Parse repeated ``sink=policy`` options."""
+    policies: dict[str, str] = {}
+    for value in values or []:
+        name, sep, policy = value.partition("=")
+        if not sep or policy not in POLICIES:
+            raise ValueError(f"expected SINK=POLICY with POLICY in {POLICIES}, got {value!r}")
+        policies[name.strip()] = policy
+    return policies
+
+
+def add_engine_arguments(parser, default_policies: dict[str, str]) -> None:
+    defaults = " ".join(f"{name}={policy}" for name, policy in default_policies.items())
+    parser.add_argument(
+        "--engine", "-engine", choices=("async", "sync"), default="async",
+        help="async fans out to independent sink tasks; sync runs sinks in order (default: async)",
+    )
+    parser.add_argument(
+        "--listen", "-listen", metavar="HOST:PORT",
+        help="Accept HR streams from TCP clients instead of stdin (async engine only)",
+    )
+    parser.add_argument(
+        "--queue-size", "-queue-size", type=int, default=1024,
+        help="Per-sink queue bound (default: 1024)",
+    )
+    parser.add_argument(
+        "--sink-policy", "-sink-policy", action="append", metavar="SINK=POLICY",
+        help=f"Backpressure policy per sink, one of {', '.join(POLICIES)} (defaults: {defaults})",
+    )
+    parser.add_argument(
+        "--metrics-interval", "-metrics-interval", type=float, default=5.0,
+        help="Seconds between [queues] depth lines; 0 disables (default: 5)",
+    )
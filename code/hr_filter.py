@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""Per-device signal-quality filter between decoding and aggregation.
+
+Loose straps produce dropouts, spikes and the 0 / 255 values ANT uses for
+"no reading". ``ReadingFilter`` checks each reading against its device's
+recent history before it reaches the group, at constant cost per reading:
+
+    range   outside MIN_BPM-MAX_BPM (which includes the 0 / 255 artifacts)
+    spike   more than ``spike`` (a fraction) away from the median of the last
+            ``window`` accepted BPMs, kept in a small ring buffer
+    rate    changed faster than ``max_rate`` BPM per second since the last
+            accepted reading, going by the readings' own timestamps
+
+A real change of level (a strap re-seated, a participant standing up)
+would otherwise be rejected forever, so after ``window`` rejections in a
+row the device's history restarts from the current reading.
+
+Accepted readings can also be smoothed: ``ema`` (exponential moving
+average, weight ``alpha``) or ``kalman`` (a 1-D random-walk Kalman filter
+whose process noise grows with the time since the last reading). Counts
+per device and rejection reason are kept in ``stats``, and ``quality`` is
+a running 0-1 acceptance score.
+
+The prototype runs the filter only when asked (``--filter``, or
+``--smooth``), so its baseline output does not change.
+"""
+
+from __future__ import annotations
+
+import math
+from collections.abc import Iterable
+from dataclasses import dataclass
+
+from hr_readings import Reading
+from hr_wire import epoch_seconds
+
+MIN_BPM = 30.0
+MAX_BPM = 220.0
+WINDOW = 5
+SPIKE = 0.25
+MAX_RATE = 20.0  # BPM per second
+SMOOTHERS = ("none", "ema", "kalman")
+ALPHA = 0.3
+PROCESS_NOISE = 1.0  # BPM^2 per second
+MEASUREMENT_NOISE = 4.0  # BPM^2
+QUALITY_WEIGHT = 0.1
+
+
+@dataclass
+class FilterStats:
+    accepted: int = 0
+    range: int = 0
+    spike: int = 0
+    rate: int = 0
+
+    @property
+    def rejected(self) -> int:
+        return self.range + self.spike + self.rate
+
+
+class DeviceFilter:
+    """One device's ring buffer, last accepted reading and smoother state."""
+
+    def __init__(self, window: int) -> None:
+        self.ring: list[float] = []
+        self.index = 0
+        self.window = window
+        self.last_time: float | None = None
+        self.last_bpm = math.nan
+        self.streak = 0  # rejections in a row
+        self.estimate = math.nan
+        self.variance = MEASUREMENT_NOISE
+        self.quality = 1.0
+        self.stats = FilterStats()
+
+    def median(self) -> float:
+        ordered = sorted(self.ring)
+        middle = len(ordered) // 2
+        if len(ordered) % 2:
+            return ordered[middle]
+        return (ordered[middle - 1] + ordered[middle]) / 2.0
+
+    def remember(self, bpm: float, at: float) -> None:
+        if len(self.ring) < self.window:
+            self.ring.append(bpm)
+        else:
+            self.ring[self.index] = bpm
+            self.index = (self.index + 1) % self.window
+        self.last_time = at
+        self.last_bpm = bpm
+        self.streak = 0
+
+    def restart(self) -> None:
+        self.ring.clear()
+        self.index = 0
+        self.last_time = None
+        self.estimate = math.nan
+
+
+class ReadingFilter:
+    """Reject implausible readings per device and optionally smooth the rest."""
+
+    def __init__(
+        self,
+        window: int = WINDOW,
+        spike: float = SPIKE,
+        max_rate: float = MAX_RATE,
+        smoother: str = "none",
+        alpha: float = ALPHA,
+        process_noise: float = PROCESS_NOISE,
+        measurement_noise: float = MEASUREMENT_NOISE,
+    ) -> None:
+        if window < 1:
+            raise ValueError("window must be at least 1")
+        if smoother not in SMOOTHERS:
+            raise ValueError(f"unknown smoother {smoother!r}; expected one of {SMOOTHERS}")
+        if not 0.0 < alpha <= 1.0:
+            raise ValueError("alpha must be in (0, 1]")
+        self.window = window
+        self.spike = spike
+        self.max_rate = max_rate
+        self.smoother = smoother
+        self.alpha = alpha
+        self.process_noise = process_noise
+        self.measurement_noise = measurement_noise
+        self.devices: dict[str, DeviceFilter] = {}
+
+    def stats(self) -> dict[str, FilterStats]:
+        return {device_id: state.stats for device_id, state in self.devices.items()}
+
+    def quality(self, device_id: str) -> float:
+        state = self.devices.get(device_id)
+        return 1.0 if state is None else state.quality
+
+    def forget(self, device_id: str) -> None:
+        self.devices.pop(device_id, None)
+
+    def apply(self, readings: Iterable[Reading]) -> list[Reading]:
+        """The accepted readings, smoothed if configured, timed by their own timestamps."""
+        accepted = []
+        for reading in readings:
+            bpm = self.check(reading.device_id, reading.bpm, epoch_seconds(reading.timestamp))
+            if bpm is not None:
+                accepted.append(reading if bpm == reading.bpm else reading._replace(bpm=bpm))
+        return accepted
+
+    def check(self, device_id: str, bpm: float, at: float) -> float | None:
+        """The filtered BPM, or None if the reading (taken at ``at`` seconds) was rejected."""
+        state = self.devices.get(device_id)
+        if state is None:
+            state = self.devices[device_id] = DeviceFilter(self.window)
+        reason = self._reason(state, bpm, at)
+        accepted = reason is None
+        state.quality += QUALITY_WEIGHT * (accepted - state.quality)
+        if reason == "range":
+            state.stats.range += 1
+            return None
+        if reason is not None:
+            state.streak += 1
+            if state.streak < self.window:
+                setattr(state.stats, reason, getattr(state.stats, reason) + 1)
+                return None
+            state.restart()  # a sustained new level, not a spike
+        state.stats.accepted += 1
+        elapsed = 0.0 if state.last_time is None else at - state.last_time
+        state.remember(bpm, at)
+        return self._smooth(state, bpm, elapsed)
+
+    def _reason(self, state: DeviceFilter, bpm: float, at: float) -> str | None:
+        if not MIN_BPM <= bpm <= MAX_BPM:
+            return "range"
+        if self.spike > 0 and len(state.ring) >= min(3, self.window):
+            median = state.median()
+            if abs(bpm - median) > self.spike * median:
+                return "spike"
+        if self.max_rate > 0 and state.last_time is not None:
+            # at least a second's allowance, so strap jitter between close readings passes
+            elapsed = max(at - state.last_time, 1.0)
+            if abs(bpm - state.last_bpm) > self.max_rate * elapsed:
+                return "rate"
+        return None
+
+    def _smooth(self, state: DeviceFilter, bpm: float, elapsed: float) -> float:
+        if self.smoother == "none":
+            return bpm
+        if math.isnan(state.estimate):
+            state.estimate, state.variance = bpm, self.measurement_noise
+        elif self.smoother == "ema":
+            state.estimate += self.alpha * (bpm - state.estimate)
+        else:
+            state.variance += self.process_noise * max(elapsed, 1e-3)
+            gain = state.variance / (state.variance + self.measurement_noise)
+            state.estimate += gain * (bpm - state.estimate)
+            state.variance *= 1.0 - gain
+        return round(state.estimate, 2)
+
+
+def add_filter_arguments(parser) -> None:
+    parser.add_argument(
+        "--filter", action="store_true",
+        help="Drop implausible readings per device before the group sees them "
+        "(see hr_filter.py)",
+    )
+    parser.add_argument(
+        "--filter-window", type=int, default=WINDOW,
+        help=f"Readings in each device's spike-rejection median (default: {WINDOW})",
+    )
+    parser.add_argument(
+        "--filter-spike", type=float, default=SPIKE,
+        help=f"Reject readings this fraction away from the median; 0 disables (default: {SPIKE:g})",
+    )
+    parser.add_argument(
+        "--filter-max-rate", type=float, default=MAX_RATE,
+        help=f"Reject changes faster than this many BPM/s; 0 disables (default: {MAX_RATE:g})",
+    )
+    parser.add_argument(
+        "--smooth", choices=SMOOTHERS, default="none",
+        help="Smooth readings per device: EMA or 1-D Kalman; implies --filter (default: none)",
+    )
+    parser.add_argument(
+        "--smooth-alpha", type=float, default=ALPHA,
+        help=f"EMA weight of the newest reading (default: {ALPHA:g})",
+    )
+
+
+def filter_from_args(args) -> ReadingFilter | None:
+    if not args.filter and args.smooth == "none":
+        return None
+    return ReadingFilter(
+        args.filter_window, args.filter_spike, args.filter_max_rate, args.smooth, args.smooth_alpha
+    )
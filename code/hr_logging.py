@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""Structured, rate-limited logging for the HR pipeline scripts.
+
+Scripts log through ``hrp.<category>`` loggers instead of ``print(...,
+flush=True)``. Records are handed to a queue and written by a listener
+thread, so the hot path never waits on the console. Lines keep the familiar
+``[category] message`` shape (``[category-warning]`` for warnings and up).
+
+Per-reading chatter is logged at DEBUG. At the default INFO level the
+scripts emit one ``[summary]`` line per second with readings/s and devices
+seen instead. ``sample`` additionally limits each category to one record per
+that many seconds, noting how many were dropped.
+"""
+
+from __future__ import annotations
+
+import atexit
+import logging
+import sys
+import time
+from collections.abc import Collection
+from logging.handlers import QueueHandler, QueueListener
+from queue import SimpleQueue
+from typing import TextIO
+
+ROOT = "hrp"
+LEVELS = ("DEBUG", "INFO", "WARNING", "ERROR")
+
+
+def get_logger(category: str) -> logging.Logger:
+    return logging.getLogger(f"{ROOT}.{category}")
+
+
+class CategoryFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        category = record.name.rpartition(".")[2]
+        if record.levelno >= logging.WARNING:
+            category = f"{category}-{record.levelname.lower()}"
+        message = record.getMessage()
+        suppressed = getattr(record, "suppressed", 0)
+        if suppressed:
+            message = f"{message} (+{suppressed} suppressed)"
+        if record.exc_info:
+            message = f"{message}\n{self.formatException(record.exc_info)}"
+        return f"[{category}] {message}"
+
+
+class SampleFilter(logging.Filter):
+    """Pass at most one record per category every ``interval`` seconds.
+
+    Records at ``always`` level or above are never dropped.
+    """
+
+    def __init__(self, interval: float, always: int = logging.ERROR) -> None:
+        super().__init__()
+        self.interval = interval
+        self.always = always
+        self._last: dict[str, float] = {}
+        self._suppressed: dict[str, int] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= self.always:
+            return True
+        now = time.monotonic()
+        if now - self._last.get(record.name, float("-inf")) < self.interval:
+            self._suppressed[record.name] = self._suppressed.get(record.name, 0) + 1
+            return False
+        self._last[record.name] = now
+        record.suppressed = self._suppressed.pop(record.name, 0)
+        return True
+
+
+class _BelowLevel(logging.Filter):
+    def __init__(self, level: int) -> None:
+        super().__init__()
+        self.level = level
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno < self.level
+
+
+class _StreamHandler(logging.StreamHandler):
+    """Stream handler that stays quiet when the reader closes the pipe."""
+
+    def handleError(self, record: logging.LogRecord) -> None:
+        if isinstance(sys.exc_info()[1], BrokenPipeError):
+            return
+        super().handleError(record)
+
+
+class ThroughputSummary:
+    """Count readings on the hot path and log one summary line per interval."""
+
+    def __init__(self, logger: logging.Logger | None = None, interval: float = 1.0) -> None:
+        self.logger = logger or get_logger("summary")
+        self.interval = interval
+        self.total = 0
+        self._count = 0
+        self._devices: set[str] = set()
+        self._started = time.monotonic()
+
+    def record(self, device_id: str, count: int = 1) -> None:
+        self._count += count
+        self._devices.add(device_id)
+        now = time.monotonic()
+        if now - self._started >= self.interval:
+            self._emit(now)
+
+    def record_many(self, device_ids: Collection[str]) -> None:
+        self._count += len(device_ids)
+        self._devices.update(device_ids)
+        now = time.monotonic()
+        if now - self._started >= self.interval:
+            self._emit(now)
+
+    def flush(self) -> None:
+        if self._count:
+            self._emit(time.monotonic())
+
+    def _emit(self, now: float) -> None:
+        elapsed = max(now - self._started, 1e-9)
+        self.total += self._count
+        self.logger.info(
+            "readings/s=%.1f devices=%d total=%d",
+            self._count / elapsed, len(self._devices), self.total,
+        )
+        self._count = 0
+        self._devices.clear()
+        self._started = now
+
+
+def setup_logging(
+    level: str = "INFO",
+    stream: TextIO | None = None,
+    error_stream: TextIO | None = None,
+    sample: float = 0.0,
+) -> QueueListener:
+    """Route ``hrp.*`` loggers through a queue to ``stream``.
+
+    Errors go to ``error_stream`` when given. The returned listener is
+    stopped (and drained) at exit; call ``stop()`` earlier to flush sooner.
+    """
+    formatter = CategoryFormatter()
+    main_handler = _StreamHandler(stream or sys.stderr)
+    main_handler.setFormatter(formatter)
+    handlers: list[logging.Handler] = [main_handler]
+    if error_stream is not None:
+        main_handler.addFilter(_BelowLevel(logging.ERROR))
+        error_handler = _StreamHandler(error_stream)
+        error_handler.setLevel(logging.ERROR)
+        error_handler.setFormatter(formatter)
+        handlers.append(error_handler)
+
+    queue: SimpleQueue = SimpleQueue()
+    queue_handler = QueueHandler(queue)
+    if sample > 0:
+        # Filter before enqueueing so dropped records cost almost nothing.
+        queue_handler.addFilter(SampleFilter(sample))
+
+    root = logging.getLogger(ROOT)
+    root.handlers[:] = [queue_handler]
+    root.setLevel(level.upper())
+    root.propagate = False
+
+    listener = QueueListener(queue, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(_stop_quietly, listener)
+    return listener
+
+
+def _stop_quietly(listener: QueueListener) -> None:
+    if listener._thread is not None:
+        listener.stop()
+
+
+def add_logging_arguments(parser) -> None:
+    parser.add_argument(
+        "--log-level", "-log-level", choices=LEVELS, default="INFO",
+        help="DEBUG shows every reading; INFO prints a summary per second (default: INFO)",
+    )
+    parser.add_argument(
+        "--log-sample", "-log-sample", type=float, default=0.0,
+        help="Show at most one line per category every N seconds (default: off)",
+    )
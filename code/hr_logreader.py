@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""Stream readings out of recorded logs, whatever wrote them.
+
+One reader for every log shape in ``outputs/hr_logs``:
+
+- CSV from ant_to_csv.py or integrated_prototype --csv
+  (``timestamp,device_id,bpm,rr_ms[,...]``)
+- newline JSON captures of ant_hr_to_json.py, including the UTF-16 files
+  PowerShell's ``>`` writes (see ant_hr_record_session_draft.ps1)
+- hr_wire binary frames
+- any of these gzip-compressed (``.gz`` or not, sniffed by magic bytes)
+
+Files are read as streams: gzip is inflated and non-UTF-8 text transcoded
+(hr_wire.utf8_reader) chunk by chunk, so memory stays flat however large
+the archive. The shape is sniffed from the first bytes, not the suffix.
+
+Replay logs into any stdin tool as newline JSON (or --format binary):
+    python3 code/hr_logreader.py outputs/hr_logs/hr_stream_001.jsonl | python3 code/ant_to_csv.py
+    python3 code/hr_logreader.py outputs/hr_logs --count
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import gzip
+import io
+import sys
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, BinaryIO
+
+from hr_readings import Reading, ReadingDecoder
+from hr_wire import MAGIC, MessageWriter, add_format_argument, read_batches, sniff_encoding
+from hr_wire import utf8_reader
+
+GZIP_MAGIC = b"\x1f\x8b"
+PATTERNS = ("*.csv", "*.jsonl", "*.json", "*.hrb", "*.gz")
+CSV_COLUMNS = {
+    "timestamp": ("timestamp", "ts_iso", "ts"),
+    "device_id": ("device_id", "device", "id"),
+    "bpm": ("bpm", "heart_rate"),
+    "rr_ms": ("rr_ms",),
+}
+
+
+@dataclass
+class LogStats:
+    files: int = 0
+    readings: int = 0
+    invalid: int = 0  # rows or lines that held no reading
+
+
+def open_log(path: str | Path) -> BinaryIO:
+    """``path`` as a UTF-8 (or hr_wire binary) byte stream, gunzipped as needed."""
+    raw: Any = open(path, "rb")
+    try:
+        if raw.peek(2)[:2] == GZIP_MAGIC:
+            raw.close()
+            raw = gzip.open(path, "rb")
+        head = raw.peek(4)[:4]
+        encoding = None if head == MAGIC else sniff_encoding(head)
+        return raw if encoding is None else utf8_reader(raw, encoding, owns=True)
+    except BaseException:
+        raw.close()
+        raise
+
+
+def log_files(paths: Iterable[str | Path]) -> list[Path]:
+    """Files under ``paths``; directories expand to their logs, oldest name first."""
+    files = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            files += sorted({item for pattern in PATTERNS for item in path.glob(pattern)})
+        else:
+            files.append(path)
+    return files
+
+
+def _number(text: str) -> Any:
+    for kind in (int, float):
+        try:
+            return kind(text)
+        except ValueError:
+            pass
+    return text
+
+
+def _csv_readings(stream: BinaryIO, stats: LogStats) -> Iterator[Reading]:
+    text = io.TextIOWrapper(stream, encoding="utf-8", errors="replace", newline="")
+    rows = csv.reader(text)
+    header = [name.strip().lower() for name in next(rows, [])]
+    columns = {
+        field: next((header.index(alias) for alias in aliases if alias in header), None)
+        for field, aliases in CSV_COLUMNS.items()
+    }
+    ts, device, bpm, rr = columns.values()
+    if device is None or bpm is None:
+        raise ValueError(f"CSV header has no device_id/bpm columns: {header}")
+    for row in rows:
+        try:
+            value = float(row[bpm])
+        except (IndexError, ValueError):
+            if row:
+                stats.invalid += 1
+            continue
+        if not 0 < value < float("inf") or not row[device]:
+            stats.invalid += 1
+            continue
+        stats.readings += 1
+        yield Reading(
+            row[ts] if ts is not None and ts < len(row) else None,
+            row[device],
+            value,
+            _number(row[rr]) if rr is not None and rr < len(row) and row[rr] else None,
+        )
+
+
+def iter_readings(
+    path: str | Path, stats: LogStats | None = None, decoder: ReadingDecoder | None = None
+) -> Iterator[Reading]:
+    """Readings from one log, streamed; counts land in ``stats`` if given."""
+    stats = stats if stats is not None else LogStats()
+    with open_log(path) as stream:
+        stats.files += 1
+        head = stream.peek(64)[:64].lstrip()
+        if head == MAGIC or head.startswith((b"{", b"[")):
+
+            def on_invalid(number: int, error: str) -> None:
+                stats.invalid += 1
+
+            for _, readings in read_batches(stream, decoder, on_invalid):
+                stats.readings += len(readings)
+                yield from readings
+        else:
+            yield from _csv_readings(stream, stats)
+
+
+def iter_log_readings(
+    paths: str | Path | Iterable[str | Path], stats: LogStats | None = None
+) -> Iterator[Reading]:
+    """Readings from every log under ``paths`` (files or directories), in order."""
+    if isinstance(paths, (str, Path)):
+        paths = [paths]
+    decoder = ReadingDecoder()
+    for path in log_files(paths):
+        yield from iter_readings(path, stats, decoder)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Stream recorded HR logs as messages on stdout")
+    ap.add_argument("logs", nargs="+", help="Log files or directories (CSV, JSONL, binary, .gz)")
+    ap.add_argument("--count", action="store_true", help="Only count readings per file")
+    add_format_argument(ap)
+    args = ap.parse_args()
+
+    total = LogStats()
+    if args.count:
+        for path in log_files(args.logs):
+            stats = LogStats()
+            for _ in iter_readings(path, stats):
+                pass
+            print(f"{path}: {stats.readings} readings, {stats.invalid} invalid")
+            total.readings += stats.readings
+            total.invalid += stats.invalid
+        print(f"total: {total.readings} readings, {total.invalid} invalid")
+        return
+
+    out = MessageWriter(args.format)
+    try:
+        for reading in iter_log_readings(args.logs, total):
+            out.emit({
+                "type": "hr_single",
+                "reading": {
+                    "ts_iso": reading.timestamp,
+                    "device_id": reading.device_id,
+                    "bpm": reading.bpm,
+                    "rr_ms": reading.rr_ms,
+                },
+            })
+    except KeyboardInterrupt:
+        pass
+    print(
+        f"[logreader] {total.readings} readings from {total.files} file(s), "
+        f"{total.invalid} invalid",
+        file=sys.stderr,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""BPM -> light colour mappings, precompiled into lookup tables.
+
+A mapping is any function from BPM to ``HueState``: the built-in
+``dramatic`` and ``smooth`` mappings, or a gradient palette loaded from a
+JSON file::
+
+    {"name": "ocean", "stops": [
+        {"bpm": 60, "hue": 240, "bri": 90},
+        {"bpm": 90, "hue": 180, "sat": 200, "bri": 160},
+        {"bpm": 120, "hue": 0, "bri": 254}
+    ]}
+
+(``hue`` in degrees, ``sat``/``bri`` 1-254, ``sat`` defaulting to 254;
+colours are interpolated linearly between stops and held past the ends).
+
+``MappingTable`` evaluates a mapping once per ``step`` BPM over
+``low``-``high`` (0.1 BPM over 30-220 by default), so mapping a reading is
+an index into a list of shared, immutable states instead of float maths and
+a new object per Hue tick. ``map_array`` maps a whole NumPy array of BPMs
+at once (NumPy is optional and only needed there).
+"""
+
+from __future__ import annotations
+
+import json
+from collections.abc import Callable, Iterable
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Any
+
+LOW = 30.0
+HIGH = 220.0
+STEP = 0.1
+
+
+@dataclass(frozen=True)
+class HueState:
+    color: str
+    hue_degrees: float
+    hue_native: int
+    saturation: int
+    brightness: int
+
+
+MappingFn = Callable[[float], HueState]
+
+
+def clamp(value: float, low: float, high: float) -> float:
+    return max(low, min(high, value))
+
+
+def degrees_to_native(degrees: float) -> int:
+    return round((degrees % 360.0) / 360.0 * 65535)
+
+
+def dramatic_mapping(bpm: float) -> HueState:
+    """High-contrast debug mapping intended to be obvious across a room."""
+    if bpm < 80:
+        color, degrees, brightness = "blue", 240.0, 90
+    elif bpm < 95:
+        # Green at 80 BPM, shifting toward yellow by 94 BPM.
+        ratio = (bpm - 80.0) / 15.0
+        color = "green/yellow"
+        degrees = 120.0 - (60.0 * ratio)
+        brightness = round(155 + (45 * ratio))
+    else:
+        color, degrees, brightness = "red", 0.0, 254
+
+    return HueState(
+        color=color,
+        hue_degrees=degrees,
+        hue_native=degrees_to_native(degrees),
+        saturation=254,
+        brightness=int(clamp(brightness, 1, 254)),
+    )
+
+
+def smooth_mapping(bpm: float) -> HueState:
+    """Continuous blue-to-red mapping across 60-120 BPM."""
+    ratio = (clamp(bpm, 60.0, 120.0) - 60.0) / 60.0
+    degrees = 240.0 * (1.0 - ratio)
+    brightness = round(90 + (164 * ratio))
+    return HueState(
+        color="smooth blue-to-red",
+        hue_degrees=degrees,
+        hue_native=degrees_to_native(degrees),
+        saturation=254,
+        brightness=brightness,
+    )
+
+
+MAPPINGS: dict[str, MappingFn] = {"dramatic": dramatic_mapping, "smooth": smooth_mapping}
+
+
+def gradient_mapping(name: str, stops: Iterable[dict[str, Any]]) -> MappingFn:
+    """Interpolate hue/sat/bri linearly between ``stops`` sorted by BPM."""
+    points = sorted(
+        (
+            float(stop["bpm"]),
+            float(stop["hue"]),
+            float(stop.get("sat", 254)),
+            float(stop["bri"]),
+        )
+        for stop in stops
+    )
+    if not points:
+        raise ValueError(f"palette {name!r} has no stops")
+
+    def mapping(bpm: float) -> HueState:
+        upper = next((i for i, point in enumerate(points) if point[0] >= bpm), len(points) - 1)
+        hi = points[upper]
+        lo = points[max(0, upper - 1)]
+        ratio = 0.0 if hi[0] == lo[0] else clamp((bpm - lo[0]) / (hi[0] - lo[0]), 0.0, 1.0)
+        degrees, saturation, brightness = (
+            lo[i] + (hi[i] - lo[i]) * ratio for i in (1, 2, 3)
+        )
+        return HueState(
+            color=name,
+            hue_degrees=degrees,
+            hue_native=degrees_to_native(degrees),
+            saturation=round(clamp(saturation, 0, 254)),
+            brightness=round(clamp(brightness, 1, 254)),
+        )
+
+    return mapping
+
+
+def load_palette(path: str | Path) -> MappingFn:
+    """A gradient mapping from a JSON palette file (see the module docstring)."""
+    path = Path(path)
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+        return gradient_mapping(str(data.get("name", path.stem)), data["stops"])
+    except (KeyError, TypeError, ValueError) as exc:
+        raise ValueError(f"invalid palette {path}: {exc}") from exc
+
+
+class MappingTable:
+    """A mapping evaluated once per ``step`` BPM; lookups return shared states."""
+
+    def __init__(
+        self, mapping: MappingFn, low: float = LOW, high: float = HIGH, step: float = STEP
+    ) -> None:
+        self.low = low
+        self.high = high
+        self.step = step
+        self.size = round((high - low) / step) + 1
+        interned: dict[HueState, HueState] = {}
+        self.states: tuple[HueState, ...] = tuple(
+            interned.setdefault(state, state)
+            for state in (mapping(round(low + i * step, 6)) for i in range(self.size))
+        )
+        self._arrays: tuple[Any, Any, Any] | None = None
+
+    def index(self, bpm: float) -> int:
+        i = round((bpm - self.low) / self.step)
+        return 0 if i < 0 else self.size - 1 if i >= self.size else i
+
+    def __call__(self, bpm: float) -> HueState:
+        return self.states[self.index(bpm)]
+
+    def map_many(self, bpms: Iterable[float]) -> list[HueState]:
+        states, index = self.states, self.index
+        return [states[index(bpm)] for bpm in bpms]
+
+    def map_array(self, bpms: Any) -> tuple[Any, Any, Any]:
+        """Hue (0-65535), saturation and brightness arrays for an array of BPMs."""
+        np = _numpy()
+        if self._arrays is None:
+            self._arrays = (
+                np.array([s.hue_native for s in self.states], dtype=np.uint16),
+                np.array([s.saturation for s in self.states], dtype=np.uint8),
+                np.array([s.brightness for s in self.states], dtype=np.uint8),
+            )
+        scaled = np.rint((np.asarray(bpms, dtype=np.float64) - self.low) / self.step)
+        indices = np.clip(scaled, 0, self.size - 1).astype(np.intp)
+        hue, saturation, brightness = self._arrays
+        return hue[indices], saturation[indices], brightness[indices]
+
+
+def is_mapping(name: str) -> bool:
+    return name in MAPPINGS or Path(name).is_file()
+
+
+@lru_cache(maxsize=None)
+def mapping_table(name: str) -> MappingTable:
+    """The compiled table for a built-in mapping name or a palette file path."""
+    return MappingTable(MAPPINGS[name] if name in MAPPINGS else load_palette(name))
+
+
+def _numpy() -> Any:
+    try:
+        import numpy
+    except ImportError:
+        raise RuntimeError(
+            "Array mapping requires NumPy. Install it with: pip install numpy"
+        ) from None
+    return numpy
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""Heart-rate reading type and newline-JSON decoding.
+
+``extract_readings`` is the alias-tolerant parser used by the integrated
+prototype. ``ReadingDecoder`` wraps it with a fast path for the canonical
+``hr_single`` / ``hr_batch`` shapes emitted by our own scripts:
+
+    {"type":"hr_single","reading":{"ts_iso":...,"device_id":...,"bpm":...,"rr_ms":...}}
+    {"type":"hr_batch","readings":[{...}, ...]}
+
+The fast path uses msgspec typed structs or orjson when installed (both
+optional) and falls back to the stdlib ``json`` module. Anything the fast
+path does not recognise is handed to ``extract_readings`` unchanged, so
+aliases like ``heart_rate`` or ``device`` still work.
+
+``rr_seconds`` and ``rr_value`` read the ``rr_ms`` field, which may be
+None, a number, a list or a CSV cell.
+"""
+
+from __future__ import annotations
+
+import json
+import math
+from datetime import datetime, timezone
+from typing import Any, Callable, Iterable, NamedTuple
+
+BACKENDS = ("auto", "msgspec", "orjson", "json")
+MIN_PERIOD = 0.25  # 240 bpm
+MAX_PERIOD = 2.0  # 30 bpm
+
+
+class Reading(NamedTuple):
+    """One heart-rate sample; a tuple so the decode hot path allocates little."""
+
+    timestamp: Any
+    device_id: str
+    bpm: float
+    rr_ms: Any = None
+
+
+class DecodeError(ValueError):
+    """Raised when a line is not JSON at all."""
+
+
+def _reading_from_dict(value: Any) -> Reading | None:
+    if not isinstance(value, dict):
+        return None
+
+    # Accept the current project names plus a few common aliases.
+    device_id = value.get("device_id", value.get("device", value.get("id")))
+    bpm = value.get("bpm", value.get("heart_rate"))
+    if device_id is None or bpm is None:
+        return None
+
+    try:
+        bpm_value = float(bpm)
+    except (TypeError, ValueError):
+        return None
+    if not math.isfinite(bpm_value) or bpm_value <= 0:
+        return None
+
+    timestamp = value.get("ts_iso", value.get("timestamp", value.get("ts")))
+    if timestamp is None:
+        timestamp = datetime.now(timezone.utc).isoformat()
+
+    return Reading(
+        timestamp=timestamp,
+        device_id=str(device_id),
+        bpm=bpm_value,
+        rr_ms=value.get("rr_ms"),
+    )
+
+
+def extract_readings(message: Any) -> list[Reading]:
+    """Extract readings from hr_single, hr_batch, or a bare reading object."""
+    if not isinstance(message, dict):
+        return []
+
+    message_type = message.get("type")
+    candidates: Iterable[Any]
+
+    if message_type == "hr_single":
+        candidates = [message.get("reading", message.get("data", message))]
+    elif message_type == "hr_batch":
+        batch = message.get("readings", message.get("data", message.get("batch", [])))
+        if isinstance(batch, dict):
+            batch = batch.get("readings", [])
+        candidates = batch if isinstance(batch, list) else []
+    elif "readings" in message and isinstance(message["readings"], list):
+        candidates = message["readings"]
+    else:
+        candidates = [message]
+
+    return [reading for item in candidates if (reading := _reading_from_dict(item))]
+
+
+def rr_seconds(rr_ms: Any) -> list[float]:
+    """Plausible RR intervals in seconds from ``rr_ms`` (None, a number or a list)."""
+    if rr_ms is None:
+        return []
+    values = []
+    for item in rr_ms if isinstance(rr_ms, (list, tuple)) else (rr_ms,):
+        try:
+            seconds = float(item) / 1000.0
+        except (TypeError, ValueError):
+            continue
+        if MIN_PERIOD <= seconds <= MAX_PERIOD:
+            values.append(seconds)
+    return values
+
+
+def rr_value(rr_ms: Any) -> float:
+    """The latest RR interval in ms from a number, list or CSV cell; NaN if none."""
+    if isinstance(rr_ms, (list, tuple)):
+        rr_ms = rr_ms[-1] if rr_ms else None
+    elif isinstance(rr_ms, str):
+        rr_ms = rr_ms.strip("[] ").rpartition(",")[2].strip() or None
+    if rr_ms is None:
+        return math.nan
+    try:
+        return float(rr_ms)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+_NUMBER = (int, float)
+
+
+def _canonical_readings(message: Any) -> list[Reading] | None:
+    """Decode the canonical shapes without alias lookups, or return None."""
+    try:
+        message_type = message["type"]
+        if message_type == "hr_single":
+            items = (message["reading"],)
+        elif message_type == "hr_batch":
+            items = message["readings"]
+        else:
+            return None
+        readings = []
+        for item in items:
+            bpm = item["bpm"]
+            timestamp = item["ts_iso"]
+            device_id = item["device_id"]
+            if type(bpm) not in _NUMBER or not 0 < bpm < math.inf or timestamp is None:
+                return None
+            if device_id is None:
+                return None  # extract_readings drops these; let it decide
+            readings.append(Reading(timestamp, str(device_id), float(bpm), item.get("rr_ms")))
+        return readings
+    except (KeyError, TypeError):
+        return None
+
+
+def _msgspec_decoder() -> Callable[[bytes | str], list[Reading] | None] | None:
+    try:
+        import msgspec
+    except ImportError:
+        return None
+
+    class _RawReading(msgspec.Struct):
+        ts_iso: Any
+        device_id: Any
+        bpm: float
+        rr_ms: Any = None
+
+    class _Single(msgspec.Struct, tag="hr_single", tag_field="type"):
+        reading: _RawReading
+
+    class _Batch(msgspec.Struct, tag="hr_batch", tag_field="type"):
+        readings: list[_RawReading]
+
+    typed = msgspec.json.Decoder(_Single | _Batch)
+
+    def decode(line: bytes | str) -> list[Reading] | None:
+        try:
+            message = typed.decode(line)
+        except msgspec.ValidationError:
+            return None
+        items = (message.reading,) if type(message) is _Single else message.readings
+        readings = []
+        for item in items:
+            if not 0 < item.bpm < math.inf or item.ts_iso is None or item.device_id is None:
+                return None
+            readings.append(Reading(item.ts_iso, str(item.device_id), item.bpm, item.rr_ms))
+        return readings
+
+    return decode
+
+
+def _loads_for(backend: str) -> tuple[str, Callable[[bytes | str], Any], tuple[type[Exception], ...]]:
+    if backend in ("auto", "msgspec"):
+        try:
+            import msgspec
+
+            return "msgspec", msgspec.json.decode, (msgspec.DecodeError,)
+        except ImportError:
+            if backend == "msgspec":
+                raise RuntimeError("The msgspec decoder requires: pip install msgspec") from None
+    if backend in ("auto", "orjson"):
+        try:
+            import orjson
+
+            return "orjson", orjson.loads, (orjson.JSONDecodeError,)
+        except ImportError:
+            if backend == "orjson":
+                raise RuntimeError("The orjson decoder requires: pip install orjson") from None
+    return "json", json.loads, (json.JSONDecodeError, UnicodeDecodeError)
+
+
+class ReadingDecoder:
+    """Decode one newline-JSON line into readings using the fastest backend."""
+
+    def __init__(self, backend: str = "auto") -> None:
+        if backend not in BACKENDS:
+            raise ValueError(f"unknown decoder backend {backend!r}; expected one of {BACKENDS}")
+        self.backend, self._loads, self._errors = _loads_for(backend)
+        self._typed = _msgspec_decoder() if self.backend == "msgspec" else None
+        self.fast = 0
+        self.fallback = 0
+
+    def decode(self, line: bytes | str) -> list[Reading]:
+        if self._typed is not None:
+            try:
+                readings = self._typed(line)
+            except self._errors as exc:
+                raise DecodeError(str(exc)) from None
+            if readings is not None:
+                self.fast += 1
+                return readings
+        try:
+            message = self._loads(line)
+        except self._errors as exc:
+            raise DecodeError(getattr(exc, "msg", None) or str(exc)) from None
+
+        if self._typed is None:
+            readings = _canonical_readings(message)
+            if readings is not None:
+                self.fast += 1
+                return readings
+        self.fallback += 1
+        return extract_readings(message)
@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""Replay a recorded session into the pipeline.
+
+Reads a session written by session_store.py (memory-mapped, so start-up
+does not depend on its length) and emits it as the usual ``hr_single`` /
+``hr_batch`` messages, as newline JSON or hr_wire binary frames on stdout:
+
+    python3 code/hr_replay.py outputs/hr_logs/hr_session_20250101_120000.session \
+        | python3 -u code/integrated_prototype.py --group "Office" --dry-run
+
+Any log hr_logreader.py reads (CSV, JSONL, .gz) is converted to a session
+in a cache directory first (``~/.cache/hrp/sessions``, or ``--cache-dir``),
+never next to the log, and that copy is reused until the log changes.
+
+Readings whose timestamps fall within ``--batch-ms`` of the first one in a
+batch go out together as one ``hr_batch``. ``--speed`` scales playback:
+1 is realtime, 4 is four times as fast, and 0 (or ``max``) sends as fast as
+the reader takes it, which turns the replay into a throughput benchmark:
+
+    python3 code/hr_replay.py SESSION --speed max \
+        | python3 -u code/integrated_prototype.py --group x --dry-run --log-level WARNING
+
+``--start`` and ``--end`` seek by timestamp: an ISO-8601 time, epoch
+seconds, or ``+SECONDS`` from the start of the session. ``--retime``
+stamps readings with the replay clock instead of their recorded times.
+``SessionReplay.messages()`` yields the same messages in-process (see
+hr_session_runner.py --source replay).
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import math
+import os
+import sys
+import tempfile
+import time
+from collections.abc import Iterator
+from pathlib import Path
+from typing import Any
+
+from hr_wire import MAX_FRAME, MessageWriter, add_format_argument, iso_timestamp
+from session_store import SUFFIX, Session, convert_log, epoch_ns, load_session, read_manifest
+from session_store import remove_session, source_info
+
+BATCH_MS = 10.0
+CACHE_DIR = Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache") / "hrp" / "sessions"
+CHUNK = 65536  # rows read from the memory map at a time
+
+
+def parse_speed(value: str) -> float:
+    """``max`` or a non-negative factor; 0 means as fast as possible."""
+    if value.strip().lower() == "max":
+        return 0.0
+    speed = float(value)
+    if speed < 0:
+        raise argparse.ArgumentTypeError("speed must be 0 (max) or greater")
+    return speed
+
+
+def resolve_time(value: str | None, session: Session) -> int | None:
+    """Epoch ns for an ISO time, epoch seconds, or ``+SECONDS`` into ``session``."""
+    if value is None:
+        return None
+    if value.startswith("+"):
+        first = int(session.ts[0]) if len(session) else 0
+        return first + round(float(value[1:]) * 1e9)
+    return epoch_ns(value)
+
+
+def cached_session_path(log: str | Path, cache_dir: str | Path = CACHE_DIR) -> Path:
+    """Where the converted copy of ``log`` lives in ``cache_dir``."""
+    log = Path(log).resolve()
+    digest = hashlib.sha1(str(log).encode()).hexdigest()[:12]
+    return Path(cache_dir) / f"{log.stem}-{digest}{SUFFIX}"
+
+
+def open_session(path: str | Path, cache_dir: str | Path = CACHE_DIR) -> Session:
+    """Memory-map a session; any other log is converted into ``cache_dir`` once."""
+    path = Path(path)
+    if path.is_dir() or path.suffix == ".parquet":
+        return load_session(path)
+    target = cached_session_path(path, cache_dir)
+    try:
+        current = read_manifest(target).get("source") == source_info(path)
+    except FileNotFoundError:
+        current = False
+    if current:
+        return load_session(target)
+    if target.exists():
+        remove_session(target)  # only the files our own conversion wrote
+    target.parent.mkdir(parents=True, exist_ok=True)
+    partial = Path(tempfile.mkdtemp(prefix=f"{target.name}.", dir=target.parent))
+    try:
+        writer = convert_log(path, partial)
+        partial.rename(target)
+    except BaseException:
+        # conversion failed, or another replay got there first
+        try:
+            remove_session(partial)
+        except FileNotFoundError:
+            partial.rmdir()  # failed before the writer started
+        if not target.exists():
+            raise
+        return load_session(target)
+    print(f"[replay] converted {path} -> {target} ({writer.rows_written} readings)",
+          file=sys.stderr)
+    return load_session(target)
+
+
+class SessionReplay:
+    """Paced batches of a session's readings, from an optional seek position."""
+
+    def __init__(
+        self,
+        session: Session,
+        speed: float = 1.0,
+        start_ns: int | None = None,
+        end_ns: int | None = None,
+        batch_ms: float = BATCH_MS,
+        retime: bool = False,
+    ) -> None:
+        if speed < 0:
+            raise ValueError("speed must be 0 (max) or greater")
+        self.session = session
+        self.speed = speed
+        self.batch_ns = max(0, round(batch_ms * 1e6))
+        self.retime = retime
+        self.sent = 0
+        self.sent_batches = 0
+        self.elapsed = 0.0
+        self._order: Any = None
+        if not session.sorted:
+            # sessions recorded from several sources can interleave; replay in time order
+            self._order = session.ts.argsort(kind="stable")
+        self._stop = len(session) if end_ns is None else self._index(end_ns)
+        self._position = 0
+        self._seek_to: int | None = None
+        self._reanchor = False
+        if start_ns is not None:
+            self._position = self._index(start_ns)
+
+    def seek(self, ts_ns: int) -> None:
+        """Continue from the first reading at or after ``ts_ns`` (safe from another thread)."""
+        self._seek_to = self._index(ts_ns)
+
+    def _index(self, ts_ns: int) -> int:
+        ts = self.session.ts if self._order is None else self.session.ts[self._order]
+        return int(ts.searchsorted(ts_ns, side="left"))
+
+    def _rows(self, lo: int, hi: int) -> tuple[Any, Any, Any, Any]:
+        rows: Any = slice(lo, hi) if self._order is None else self._order[lo:hi]
+        session = self.session
+        return session.ts[rows], session.device[rows], session.bpm[rows], session.rr[rows]
+
+    def _groups(self) -> Iterator[tuple[int, list[tuple[int, int, float, float]]]]:
+        """(first ts, rows) per batch window, reading the map a chunk at a time."""
+        group: list[tuple[int, int, float, float]] = []
+        group_start = 0
+        while self._position < self._stop:
+            if self._seek_to is not None:
+                if group:
+                    yield group_start, group
+                    group = []
+                self._position, self._seek_to = self._seek_to, None
+                self._reanchor = True  # pace from the new position
+                continue
+            lo, hi = self._position, min(self._stop, self._position + CHUNK)
+            ts, device, bpm, rr = self._rows(lo, hi)
+            rows = zip(
+                ts.tolist(), device.tolist(), bpm.astype("f8").round(3).tolist(),
+                rr.astype("f8").tolist(),
+            )
+            for row in rows:
+                if group and (row[0] - group_start >= self.batch_ns or len(group) >= MAX_FRAME):
+                    yield group_start, group
+                    group = []
+                    if self._seek_to is not None:
+                        break
+                if not group:
+                    group_start = row[0]
+                group.append(row)
+                self._position += 1
+        if group:
+            yield group_start, group
+
+    def batches(self) -> Iterator[list[dict[str, Any]]]:
+        """Reading dicts per batch, each released at its (scaled) recorded time."""
+        begun = anchor = time.monotonic()
+        origin: int | None = None
+        for first_ns, group in self._groups():
+            if origin is None or self._reanchor:
+                origin, anchor, self._reanchor = first_ns, time.monotonic(), False
+            if self.speed > 0:
+                delay = anchor + (first_ns - origin) / 1e9 / self.speed - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+            # with --retime the batch's last reading is stamped now, keeping their spacing
+            shift = time.time() - group[-1][0] / 1e9 if self.retime else 0.0
+            yield [self._reading(row, shift) for row in group]
+            self.sent_batches += 1
+            self.sent += len(group)
+            self.elapsed = time.monotonic() - begun
+
+    @staticmethod
+    def _reading(row: tuple[int, int, float, float], shift: float) -> dict[str, Any]:
+        ts_ns, device, bpm, rr = row
+        return {
+            "ts_iso": iso_timestamp(ts_ns / 1e9 + shift),
+            "device_id": device,
+            "bpm": bpm,
+            "rr_ms": None if math.isnan(rr) else round(rr),
+        }
+
+    def messages(self) -> Iterator[dict[str, Any]]:
+        """``hr_single`` / ``hr_batch`` messages, as the live emitters produce them."""
+        for readings in self.batches():
+            if len(readings) == 1:
+                yield {"type": "hr_single", "reading": readings[0]}
+            else:
+                yield {"type": "hr_batch", "readings": readings}
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Replay a recorded HR session to stdout")
+    ap.add_argument("session", help="Session directory, .parquet file, or a log (CSV, JSONL, .gz)")
+    ap.add_argument(
+        "--speed", type=parse_speed, default=1.0,
+        help="Playback speed: 1 realtime, N times faster, or 0/max for no pacing (default: 1)",
+    )
+    ap.add_argument("--start", help="Seek: ISO time, epoch seconds, or +SECONDS into the session")
+    ap.add_argument("--end", help="Stop before this time (same forms as --start)")
+    ap.add_argument(
+        "--batch-ms", type=float, default=BATCH_MS,
+        help=f"Send readings within this many ms as one hr_batch (default: {BATCH_MS:g})",
+    )
+    ap.add_argument("--retime", action="store_true", help="Stamp readings with the replay time")
+    ap.add_argument("--loop", action="store_true", help="Start over at the end")
+    ap.add_argument(
+        "--cache-dir", default=str(CACHE_DIR),
+        help=f"Where converted logs are kept (default: {CACHE_DIR})",
+    )
+    add_format_argument(ap)
+    args = ap.parse_args()
+
+    session = open_session(args.session, args.cache_dir)
+    start_ns, end_ns = resolve_time(args.start, session), resolve_time(args.end, session)
+    out = MessageWriter(args.format)
+    print(
+        f"[replay] {args.session}: {len(session)} readings, {session.duration:.1f}s "
+        f"at {'max' if args.speed == 0 else f'{args.speed:g}x'}",
+        file=sys.stderr,
+    )
+    total = elapsed = 0
+    try:
+        while True:
+            replay = SessionReplay(
+                session, args.speed, start_ns, end_ns, args.batch_ms, args.retime
+            )
+            try:
+                for message in replay.messages():
+                    out.emit(message)
+            finally:
+                total += replay.sent
+                elapsed += replay.elapsed
+            if not args.loop or not replay.sent:
+                break
+    except KeyboardInterrupt:
+        print("\n[replay] stopped by user", file=sys.stderr)
+    except BrokenPipeError:
+        # the reader went away; keep the interpreter's final flush from failing too
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+    rate = total / elapsed if elapsed > 0 else 0.0
+    print(f"[replay] sent {total} readings in {elapsed:.2f}s ({rate:.0f}/s)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
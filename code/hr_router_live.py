@@ -3,58 +3,134 @@
 hr_router_live.py
 
 Reads HR JSON events from stdin (one JSON object per line).
-Optionally broadcasts BPM over OSC (for Ableton / VDMX / Max).
+Optionally broadcasts BPM over OSC (for Ableton / VDMX / Max): one bundle
+per --osc-tick-ms with each device's latest BPM at /hr/<device_id>/bpm and
+their mean at --osc-addr. With --device-timeout, devices silent that many
+seconds drop out of the mean.
 
 Expected input schema:
 {"type":"hr_single","reading":{"ts_iso":"...","device_id":51861,"bpm":89,"rr_ms":null}}
+
+hr_batch lines and hr_wire binary frames (detected automatically) are
+routed reading by reading as well.
+
+By default console and OSC run as separate hr_async sink tasks, so a slow
+terminal does not hold up OSC; --engine sync keeps the original loop.
 """
 
-import sys, json, argparse
+import sys, argparse, asyncio
+
+from device_registry import TIMEOUT
+from group_aggregator import GroupAggregator
+from hr_async import (
+    AsyncEngine, SinkQueue, add_engine_arguments, parse_listen, parse_policies,
+    socket_readings, stdin_readings,
+)
+from hr_logging import setup_logging
+from hr_readings import ReadingDecoder
+from hr_wire import read_batches
+from osc_sink import TICK, OscBundler
+
+DEFAULT_POLICIES = {"console": "block", "osc": "drop-oldest"}
+
+def open_osc(ip, port, addr, tick=TICK):
+    client = OscBundler(ip, port, tick).start()
+    print(f"[router] OSC enabled → {ip}:{port} addr={addr} + /hr/<device>/bpm", flush=True)
+    return client
+
+def route(readings, osc=None):
+    """Print each reading and optionally queue its BPM for the next OSC bundle."""
+    for r in readings:
+        print(f"[router] ts={r.timestamp} device={r.device_id} bpm={r.bpm} rr_ms={r.rr_ms}", flush=True)
+
+        if osc is not None:
+            osc.emit(r)
+
+class ConsoleOutput:
+    name = "console"
+    blocking = True
+
+    def emit(self, r):
+        print(f"[router] ts={r.timestamp} device={r.device_id} bpm={r.bpm} rr_ms={r.rr_ms}", flush=True)
+
+class OscOutput:
+    name = "osc"
+
+    def __init__(self, client, osc_addr, timeout=None):
+        self.client = client
+        self.osc_addr = osc_addr
+        self.group = GroupAggregator(1, timeout=timeout)  # latest BPM per active device
+        self.addresses = {}  # device_id -> pre-built /hr/<id>/bpm
+
+    def emit(self, r):
+        address = self.addresses.get(r.device_id)
+        if address is None:
+            address = self.addresses[r.device_id] = f"/hr/{r.device_id}/bpm"
+        bpm = float(r.bpm)
+        self.group.expire()
+        snapshot = self.group.update(r.device_id, bpm, r.rr_ms)
+        self.client.set(address, bpm)
+        self.client.set(self.osc_addr, snapshot.current)
+
+    def close(self):
+        self.client.close()
+
+async def run_async(args, osc):
+    policies = {**DEFAULT_POLICIES, **parse_policies(args.sink_policy)}
+    outputs = [ConsoleOutput()]
+    if osc is not None:
+        outputs.append(osc)
+    sinks = [SinkQueue(o.name, o, policies.get(o.name, "block"), args.queue_size) for o in outputs]
+    engine = AsyncEngine(lambda readings: readings, sinks, args.metrics_interval)
+    engine.stop_on_signals()
+    decoder = ReadingDecoder()
+    if args.listen:
+        source = socket_readings(*parse_listen(args.listen), decoder)
+    else:
+        source = stdin_readings(sys.stdin.buffer, decoder)
+    await engine.run(source)
 
 def main():
     ap = argparse.ArgumentParser(description="Route HR JSON stream to outputs (print / OSC)")
     ap.add_argument("--osc", action="store_true", help="Enable OSC broadcast")
     ap.add_argument("--osc-ip", default="127.0.0.1", help="OSC receiver IP (default: localhost)")
     ap.add_argument("--osc-port", type=int, default=9000, help="OSC receiver port")
-    ap.add_argument("--osc-addr", default="/bpm", help="OSC address for BPM messages")
+    ap.add_argument("--osc-addr", default="/bpm", help="OSC address for the mean BPM across devices")
+    ap.add_argument("--osc-tick-ms", type=float, default=TICK * 1000, help="Milliseconds between OSC bundles")
+    ap.add_argument(
+        "--device-timeout", type=float, default=0.0,
+        help=f"Drop devices silent this many seconds from the mean, e.g. {TIMEOUT:g} (default: 0, keep them)",
+    )
+    add_engine_arguments(ap, DEFAULT_POLICIES)
     args = ap.parse_args()
+    if args.listen and args.engine != "async":
+        ap.error("--listen requires --engine async")
+    try:
+        parse_policies(args.sink_policy)
+    except ValueError as exc:
+        ap.error(str(exc))
+    setup_logging()  # [queues] / [listen] lines from the async engine go to stderr
 
-    client = None
+    osc = None
     if args.osc:
-        from pythonosc.udp_client import SimpleUDPClient
-        client = SimpleUDPClient(args.osc_ip, args.osc_port)
-        print(f"[router] OSC enabled → {args.osc_ip}:{args.osc_port} addr={args.osc_addr}", flush=True)
+        client = open_osc(args.osc_ip, args.osc_port, args.osc_addr, args.osc_tick_ms / 1000.0)
+        osc = OscOutput(client, args.osc_addr, args.device_timeout or None)
 
-    print("[router] listening for HR JSON on stdin", flush=True)
+    if not args.listen:
+        print("[router] listening for HR JSON on stdin", flush=True)
 
     try:
-        for line in sys.stdin:
-            line = line.strip()
-            if not line:
-                continue
-
-            try:
-                msg = json.loads(line)
-            except json.JSONDecodeError:
-                continue
-
-            if msg.get("type") != "hr_single":
-                continue
-
-            r = msg.get("reading", {})
-            ts = r.get("ts_iso")
-            device_id = r.get("device_id")
-            bpm = r.get("bpm")
-            rr = r.get("rr_ms")
-
-            print(f"[router] ts={ts} device={device_id} bpm={bpm} rr_ms={rr}", flush=True)
-
-            if client is not None and isinstance(bpm, (int, float)):
-                client.send_message(args.osc_addr, float(bpm))
-                print(f"[router] → OSC {args.osc_addr} {float(bpm)}", flush=True)
+        if args.engine == "async":
+            asyncio.run(run_async(args, osc))
+        else:
+            for _, readings in read_batches(sys.stdin.buffer):
+                route(readings, osc)
 
     except KeyboardInterrupt:
         print("\n[router] stopped by user", flush=True)
+    finally:
+        if osc is not None:
+            osc.close()
 
 if __name__ == "__main__":
     main()
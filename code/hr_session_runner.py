@@ -11,16 +11,104 @@ Examples:
   python3 code/hr_session_runner.py --mode router
   python3 code/hr_session_runner.py --mode osc
   python3 code/hr_session_runner.py --mode hue
+
+By default every stage is its own Python process connected by pipes, which
+keeps stages isolated. --inproc wires the same stage functions together as
+generators in this one process instead, with no pipes and no re-serialising.
+Compare the two with --report (end-to-end latency and peak RSS):
+
+  python3 code/hr_session_runner.py --mode router --source multi --devices 50 --hz 4 --duration 10 --report
+  python3 code/hr_session_runner.py --mode router --source multi --devices 50 --hz 4 --duration 10 --report --inproc
+
+Replay a recorded session (see hr_replay.py); --speed 0 drives the stages
+as fast as they go:
+
+  python3 code/hr_session_runner.py --mode hue --source replay --replay outputs/hr_logs/hr_log_001.csv --speed 0 --inproc
 """
 
 import argparse
+import os
+import re
 import subprocess
 import sys
+import threading
+import time
 from pathlib import Path
 
 
 ROOT = Path(__file__).resolve().parents[1]
 PYTHON = sys.executable
+TS_RE = re.compile(r"\bts=(\S+)")
+HUE_STAGE = ("Office", 2.0)  # legacy hue simulator group and interval, in both modes
+
+
+def rss_bytes(pid):
+    """Resident set size of a process, or None where it cannot be read."""
+    try:
+        import psutil
+    except ImportError:
+        pass
+    else:
+        try:
+            return psutil.Process(pid).memory_info().rss
+        except Exception:
+            return None
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        return None
+    return None
+
+
+class SessionReport:
+    """Collects source-to-output latency and samples peak RSS of the session."""
+
+    def __init__(self):
+        self.latencies = []
+        self.readings = 0
+        self.peak_rss = None
+        self.pids = [os.getpid()]
+        self.started = time.perf_counter()
+        self._stop = threading.Event()
+        self._sampler = threading.Thread(target=self._sample, daemon=True)
+        self._sampler.start()
+
+    def add_timestamp(self, timestamp):
+        from hr_wire import epoch_seconds
+
+        self.readings += 1
+        self.latencies.append(time.time() - epoch_seconds(timestamp))
+
+    def _sample(self):
+        while True:
+            sizes = [rss_bytes(pid) for pid in list(self.pids)]
+            sizes = [size for size in sizes if size is not None]
+            if sizes:
+                self.peak_rss = max(self.peak_rss or 0, sum(sizes))
+            if self._stop.wait(0.25):
+                return
+
+    def print(self, mode):
+        self._stop.set()
+        self._sampler.join()
+        elapsed = time.perf_counter() - self.started
+        print(f"\n[report] mode={mode} elapsed={elapsed:.1f}s readings={self.readings}")
+        if self.latencies:
+            ordered = sorted(self.latencies)
+            pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000
+            print(
+                f"[report] latency ms: mean={sum(ordered) / len(ordered) * 1000:.2f} "
+                f"p50={pick(0.50):.2f} p95={pick(0.95):.2f} max={ordered[-1] * 1000:.2f}"
+            )
+        else:
+            print("[report] latency: no timestamped readings seen")
+        if self.peak_rss is None:
+            print("[report] peak RSS: unavailable (install psutil)")
+        else:
+            print(f"[report] peak RSS (all processes): {self.peak_rss / 2**20:.1f} MiB")
 
 
 def banner(mode: str):
@@ -31,14 +119,18 @@ def banner(mode: str):
     print("Press Ctrl+C to stop.\n")
 
 
-def run_pipeline(commands):
+def run_pipeline(commands, duration=None, report=None):
     """
     Run scripts connected through pipes.
 
     Example:
     hr_simulator.py stdout -> hr_router_live.py stdin
+
+    With a report, the last stage's stdout is read here so the ts= of each
+    routed reading can be turned into an end-to-end latency.
     """
     processes = []
+    timer = None
 
     try:
         previous_stdout = None
@@ -51,7 +143,7 @@ def run_pipeline(commands):
             p = subprocess.Popen(
                 cmd,
                 stdin=previous_stdout,
-                stdout=None if is_last else subprocess.PIPE,
+                stdout=subprocess.PIPE if not is_last or report else None,
                 stderr=None,
                 text=True,
                 bufsize=1,
@@ -62,13 +154,27 @@ def run_pipeline(commands):
 
             previous_stdout = p.stdout
             processes.append(p)
-
+            if report is not None:
+                report.pids.append(p.pid)
+
+        if duration is not None:
+            timer = threading.Timer(duration, lambda: [p.terminate() for p in processes])
+            timer.start()
+
+        if report is not None:
+            for line in processes[-1].stdout:
+                sys.stdout.write(line)
+                match = TS_RE.search(line)
+                if match:
+                    report.add_timestamp(_number_or_text(match.group(1)))
         processes[-1].wait()
 
     except KeyboardInterrupt:
         print("\n[runner] stopping all processes...")
 
     finally:
+        if timer is not None:
+            timer.cancel()
         for p in processes:
             if p.poll() is None:
                 p.terminate()
@@ -82,6 +188,91 @@ def run_pipeline(commands):
         print("[runner] stopped.")
 
 
+def _number_or_text(value):
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
+
+def source_command(args):
+    if args.source == "replay":
+        return [
+            PYTHON, "-u", str(ROOT / "code" / "hr_replay.py"), args.replay,
+            "--speed", str(args.speed), "--retime",
+        ]
+    if args.source == "multi":
+        return [
+            PYTHON, "-u", str(ROOT / "code" / "ant_test.py"), "--multi", "--simulate",
+            "--devices", str(args.devices), "--hz", str(args.hz),
+        ]
+    return [PYTHON, str(ROOT / "code" / "hr_simulator.py")]
+
+
+def source_messages(args):
+    if args.source == "replay":
+        from hr_replay import SessionReplay, open_session
+        # retimed, so --report measures pipeline latency rather than the recording's age
+        return SessionReplay(open_session(args.replay), args.speed, retime=True).messages()
+    if args.source == "multi":
+        from ant_test import iter_sim_multi
+        return iter_sim_multi(n=args.devices, hz=args.hz)
+    from hr_simulator import iter_messages
+    return iter_messages()
+
+
+def run_inproc(args, report=None):
+    """
+    Run the same workflow as generators in this process.
+
+    The source yields message dicts, readings are extracted without a JSON
+    round trip, and the stage function (router or legacy hue simulator)
+    consumes them directly.
+    """
+    from hr_readings import extract_readings
+
+    osc = None
+    if args.mode == "sim":
+        from hr_wire import MessageWriter
+        writer = MessageWriter("json")
+        stage = None
+    elif args.mode in ("router", "osc"):
+        from hr_router_live import OscOutput, open_osc, route
+        if args.mode == "osc":
+            osc = OscOutput(open_osc("127.0.0.1", 9000, "/bpm"), "/bpm")
+        stage = lambda readings: route(readings, osc)
+    else:
+        sys.path.insert(0, str(ROOT / "code" / "legacy"))
+        from hue_sim_from_hr import HueSimulator
+        hue = HueSimulator(*HUE_STAGE)
+
+        def stage(readings):
+            for reading in readings:
+                hue.push(reading.bpm, reading.timestamp)
+            hue.tick()
+
+    deadline = None if args.duration is None else time.monotonic() + args.duration
+    print(f"[runner] in-process: {args.source} source -> {args.mode}")
+    try:
+        for message in source_messages(args):
+            readings = extract_readings(message)
+            if stage is None:
+                writer.emit(message)
+            else:
+                stage(readings)
+            if report is not None:
+                for reading in readings:
+                    report.add_timestamp(reading.timestamp)
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+    except KeyboardInterrupt:
+        print("\n[runner] stopping...")
+    finally:
+        if osc is not None:
+            osc.close()
+        print("[runner] stopped.")
+
+
 def main():
     ap = argparse.ArgumentParser(description="Run HRP prototype workflows with one command.")
     ap.add_argument(
@@ -90,18 +281,53 @@ def main():
         required=True,
         help="Which workflow to launch.",
     )
+    ap.add_argument(
+        "--inproc",
+        action="store_true",
+        help="Run all stages in this process instead of piped subprocesses.",
+    )
+    ap.add_argument(
+        "--source",
+        choices=["simulator", "multi", "replay"],
+        default="simulator",
+        help="hr_simulator.py (default), the ant_test.py multi-device simulator, "
+        "or a recorded session (hr_replay.py).",
+    )
+    ap.add_argument("--replay", help="Session or log for --source replay.")
+    ap.add_argument(
+        "--speed", type=float, default=1.0,
+        help="Replay speed for --source replay; 0 sends as fast as possible.",
+    )
+    ap.add_argument("--devices", type=int, default=6, help="Devices for --source multi.")
+    ap.add_argument("--hz", type=float, default=1.0, help="Batches/sec for --source multi.")
+    ap.add_argument("--duration", type=float, help="Stop after this many seconds.")
+    ap.add_argument(
+        "--report",
+        action="store_true",
+        help="Print end-to-end latency and peak RSS when the session ends.",
+    )
 
     args = ap.parse_args()
-    banner(args.mode)
+    if args.source == "replay" and not args.replay:
+        ap.error("--source replay needs --replay SESSION")
+    banner(args.mode + (" (in-process)" if args.inproc else ""))
+    report = SessionReport() if args.report else None
 
-    sim = [PYTHON, str(ROOT / "code" / "hr_simulator.py")]
+    if args.inproc:
+        run_inproc(args, report)
+        if report is not None:
+            report.print("inproc")
+        return
+
+    sim = source_command(args)
+    run = lambda commands: run_pipeline(commands, args.duration, report)
 
     if args.mode == "sim":
-        run_pipeline([sim])
+        run([sim])
 
     elif args.mode == "router":
         router = [PYTHON, "-u", str(ROOT / "code" / "hr_router_live.py")]
-        run_pipeline([sim, router])
+        run([sim, router])
 
     elif args.mode == "osc":
         router_osc = [
@@ -110,19 +336,25 @@ def main():
             str(ROOT / "code" / "hr_router_live.py"),
             "--osc",
         ]
-        run_pipeline([sim, router_osc])
+        run([sim, router_osc])
 
     elif args.mode == "hue":
+        group, interval = HUE_STAGE
         hue_sim = [
             PYTHON,
             "-u",
             str(ROOT / "code" / "legacy" / "hue_sim_from_hr.py"),
             "--group",
-            "Office",
+            group,
             "--interval",
-            "2.0",
+            str(interval),
         ]
-        run_pipeline([sim, hue_sim])
+        if report is not None:
+            hue_sim.append("--echo")  # ts= lines for the latency report
+        run([sim, hue_sim])
+
+    if report is not None:
+        report.print("subprocess")
 
 
 if __name__ == "__main__":
@@ -1,41 +1,52 @@
 #!/usr/bin/env python3
-import time, json, math
+import argparse, sys, time
+
+from hr_wire import MessageWriter, add_format_argument
 
 BASELINE = 85          # starting BPM
 STEP = 2               # gradient step 
 INTERVAL = 1.0         # seconds between updates
 
-def main():
+def iter_messages(interval=INTERVAL):
+    """Yield one hr_single message every `interval` seconds, forever."""
     bpm = BASELINE
     direction = 1   
 
-    print("[sim] HR simulator running")
-
-    try:
-        while True:
-            bpm += STEP * direction
-
-            # bounce between limits
-            if bpm >= 100:
-                direction = -1
-            elif bpm <= 70:
-                direction = 1
-
-            msg = {
-                "type": "hr_single",
-                "reading": {
-                    "ts_iso": time.time(),
-                    "device_id": 99999,
-                    "bpm": bpm,
-                    "rr_ms": None
-                }
+    while True:
+        bpm += STEP * direction
+
+        # bounce between limits
+        if bpm >= 100:
+            direction = -1
+        elif bpm <= 70:
+            direction = 1
+
+        yield {
+            "type": "hr_single",
+            "reading": {
+                "ts_iso": time.time(),
+                "device_id": 99999,
+                "bpm": bpm,
+                "rr_ms": None
             }
+        }
+        time.sleep(interval)
 
-            print(json.dumps(msg), flush=True)
-            time.sleep(INTERVAL)
+def main():
+    ap = argparse.ArgumentParser(description="Emit a single simulated HR stream")
+    add_format_argument(ap)
+    args = ap.parse_args()
+    out = MessageWriter(args.format)
+
+    # status goes to stderr so binary output on stdout stays clean
+    print("[sim] HR simulator running", file=sys.stderr)
+
+    try:
+        for msg in iter_messages():
+            out.emit(msg)
 
     except KeyboardInterrupt:
-        print("\n[sim] stopped by user", flush=True)
+        print("\n[sim] stopped by user", file=sys.stderr, flush=True)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""Heart-rate synchrony between participants over a sliding window.
+
+Readings arrive irregularly and at a different pace per strap, so
+``SynchronyEngine`` first puts every device on one uniform time grid: it
+keeps each device's latest value (BPM, or RR in ms) and ``advance`` samples
+all of them into a ring buffer of ``window * rate`` columns per tick
+(sample-and-hold). A reading therefore costs one array store; the grid
+costs O(devices) per tick.
+
+``compute`` turns the grid into synchrony, at most every ``every``
+seconds rather than per reading:
+
+1. each device's row over the window is z-scored (samples from before it
+   joined count as zero) and transformed once with a real FFT
+2. for every pair, the cross-correlation at all lags is the inverse FFT of
+   one spectrum times the other's conjugate, computed for blocks of pairs
+   at once
+3. a pair's synchrony is its peak correlation within +-``max_lag``
+   seconds, so a participant trailing another by a breath still counts
+
+A device's value is its mean synchrony with everyone else and the group's
+is the mean over all pairs. The per-pair cost is one spectrum product and
+an inverse FFT of the short window, so 50 participants (1225 pairs) take
+a few milliseconds per evaluation.
+
+NumPy is required here only.
+
+    engine = SynchronyEngine(window=30.0)
+    engine.update("51861", 88.0)
+    engine.advance(time.monotonic())
+    result = engine.compute()        # SyncResult(group, devices, pairs)
+"""
+
+from __future__ import annotations
+
+import math
+from dataclasses import dataclass, field
+from typing import Any
+
+WINDOW = 30.0  # seconds
+RATE = 2.0  # grid samples per second
+MAX_LAG = 5.0  # seconds
+EVERY = 1.0  # seconds between evaluations
+MIN_FILL = 0.5  # share of the window a device needs before it takes part
+SIGNALS = ("bpm", "rr")
+PAIR_BLOCK = 4096  # pairs per inverse FFT, to bound memory with many devices
+CAPACITY = 64
+
+
+@dataclass(frozen=True)
+class SyncResult:
+    group: float  # mean peak correlation over all pairs; NaN below two devices
+    devices: dict[str, float] = field(default_factory=dict)
+    pairs: int = 0
+
+
+class SynchronyEngine:
+    """Latest value per device, a uniform sample grid, and periodic pair synchrony."""
+
+    def __init__(
+        self,
+        window: float = WINDOW,
+        rate: float = RATE,
+        max_lag: float = MAX_LAG,
+        every: float = EVERY,
+        capacity: int = CAPACITY,
+    ) -> None:
+        if window <= 0 or rate <= 0:
+            raise ValueError("window and rate must be positive")
+        if not 0 <= max_lag < window:
+            raise ValueError("max_lag must be at least 0 and below the window")
+        np = _numpy()
+        self.np = np
+        self.samples = max(4, round(window * rate))
+        self.period = 1.0 / rate
+        self.lags = round(max_lag * rate)
+        self.every = every
+        self.nfft = 1 << (2 * self.samples - 1).bit_length()  # no circular wrap-around
+        self.slots: dict[str, int] = {}
+        self._free = list(range(capacity - 1, -1, -1))
+        self.latest = np.full(capacity, np.nan)
+        self.filled = np.zeros(capacity, dtype=np.int64)
+        self.grid = np.full((capacity, self.samples), np.nan)
+        self.head = 0  # grid column the next tick writes
+        self._next_tick: float | None = None
+        self._next_compute = -math.inf
+        self.result = SyncResult(math.nan)
+
+    def __len__(self) -> int:
+        return len(self.slots)
+
+    def update(self, device_id: str, value: float) -> None:
+        slot = self.slots.get(device_id)
+        if slot is None:
+            slot = self.slots[device_id] = self._allocate()
+        self.latest[slot] = value
+
+    def remove(self, device_id: str) -> None:
+        slot = self.slots.pop(device_id, None)
+        if slot is None:
+            return
+        self.latest[slot] = math.nan
+        self.filled[slot] = 0
+        self.grid[slot] = math.nan
+        self._free.append(slot)
+
+    def advance(self, now: float) -> int:
+        """Sample the latest values for every grid tick up to ``now``; returns the ticks."""
+        if self._next_tick is None:
+            self._next_tick = now
+        ticks = 0
+        while self._next_tick <= now:
+            ticks += 1
+            self._next_tick += self.period
+        if ticks > self.samples:
+            # a long stall: everything older than the window is gone anyway
+            self._next_tick = now + self.period
+            ticks = self.samples
+        active = ~self.np.isnan(self.latest)
+        for _ in range(ticks):
+            self.grid[:, self.head] = self.latest
+            self.head = (self.head + 1) % self.samples
+        self.filled[active] = self.np.minimum(self.filled[active] + ticks, self.samples)
+        return ticks
+
+    def due(self, now: float) -> bool:
+        return now >= self._next_compute
+
+    def compute(self, now: float | None = None) -> SyncResult:
+        """Pairwise peak lagged correlation over the window (stored in ``result``)."""
+        np = self.np
+        if now is not None:
+            self._next_compute = now + self.every
+        ready = [
+            (device_id, slot) for device_id, slot in self.slots.items()
+            if self.filled[slot] >= MIN_FILL * self.samples
+        ]
+        if len(ready) < 2:
+            self.result = SyncResult(math.nan, {device_id: math.nan for device_id, _ in ready})
+            return self.result
+        rows = np.roll(self.grid[[slot for _, slot in ready]], -self.head, axis=1)  # oldest first
+        valid = ~np.isnan(rows)
+        counts = valid.sum(axis=1, keepdims=True)
+        rows = np.where(valid, rows, 0.0)
+        mean = rows.sum(axis=1, keepdims=True) / counts
+        centred = np.where(valid, rows - mean, 0.0)
+        scale = np.sqrt((centred * centred).sum(axis=1, keepdims=True))
+        centred = np.divide(centred, scale, out=np.zeros_like(centred), where=scale > 0)
+        spectra = np.fft.rfft(centred, n=self.nfft, axis=1)
+
+        n = len(ready)
+        left, right = np.triu_indices(n, k=1)
+        lags = np.r_[0 : self.lags + 1, self.nfft - self.lags : self.nfft]
+        peaks = np.empty(len(left))
+        for start in range(0, len(left), PAIR_BLOCK):
+            i, j = left[start : start + PAIR_BLOCK], right[start : start + PAIR_BLOCK]
+            correlation = np.fft.irfft(spectra[i] * spectra[j].conj(), n=self.nfft, axis=1)
+            peaks[start : start + PAIR_BLOCK] = correlation[:, lags].max(axis=1)
+
+        matrix = np.zeros((n, n))
+        matrix[left, right] = matrix[right, left] = peaks
+        per_device = matrix.sum(axis=1) / (n - 1)
+        self.result = SyncResult(
+            float(peaks.mean()),
+            {device_id: float(value) for (device_id, _), value in zip(ready, per_device)},
+            len(peaks),
+        )
+        return self.result
+
+    def _allocate(self) -> int:
+        if not self._free:
+            np = self.np
+            size = len(self.latest)
+            self.latest = np.concatenate([self.latest, np.full(size, np.nan)])
+            self.filled = np.concatenate([self.filled, np.zeros(size, dtype=np.int64)])
+            self.grid = np.vstack([self.grid, np.full((size, self.samples), np.nan)])
+            self._free = list(range(2 * size - 1, size - 1, -1))
+        return self._free.pop()
+
+
+def synchrony_as_bpm(value: float, low: float = 60.0, high: float = 120.0) -> float:
+    """Scale synchrony (0-1; negatives count as 0) onto the BPM span the mappings sweep."""
+    return low + min(max(value, 0.0), 1.0) * (high - low)
+
+
+def _numpy() -> Any:
+    try:
+        import numpy
+    except ImportError:
+        raise RuntimeError(
+            "Synchrony requires NumPy. Install it with: pip install numpy"
+        ) from None
+    return numpy
@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+"""Compact binary framing between pipeline stages.
+
+Newline JSON stays the default. With ``--format binary`` the emitters write
+a 4-byte stream header followed by fixed-width frames instead:
+
+    header  b"HRB1"
+    frame   uint16 count, then ``count`` records of
+    record  float64 ts (epoch seconds), uint32 device_id,
+            uint16 bpm * 10, uint16 rr_ms (0xFFFF = none)
+
+All integers are little-endian; a record is 16 bytes. One frame carries one
+``hr_single`` or ``hr_batch`` message, so batch boundaries survive the trip.
+Readings that do not fit a record (a non-numeric device id, say) or that
+JSON readers would drop (a BPM that is not a positive number) are left out
+with a warning instead of stopping the emitter.
+
+Readers sniff the first bytes of stdin: a stream that starts with the header
+is decoded as frames, anything else as newline JSON, so existing pipelines
+keep working unchanged. JSON captured as UTF-16 (PowerShell's ``>``), UTF-32
+or UTF-8 with a BOM is transcoded to UTF-8 as it is read.
+"""
+
+from __future__ import annotations
+
+import codecs
+import io
+import json
+import math
+import struct
+import sys
+from collections.abc import Callable, Iterable, Iterator, Mapping
+from datetime import datetime, timezone
+from typing import Any, BinaryIO
+
+from hr_logging import get_logger
+from hr_readings import DecodeError, Reading, ReadingDecoder, rr_value
+
+log = get_logger("wire")
+
+MAGIC = b"HRB1"
+FORMATS = ("json", "binary")
+
+FRAME_COUNT = struct.Struct("<H")
+RECORD = struct.Struct("<dIHH")
+_NO_RR = 0xFFFF
+MAX_FRAME = 0xFFFF
+TRANSCODE_CHUNK = 64 * 1024
+# UTF-32 first: its little-endian BOM starts with the UTF-16 one
+BOMS = (
+    (codecs.BOM_UTF32_LE, "utf-32"),
+    (codecs.BOM_UTF32_BE, "utf-32"),
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+)
+
+
+def epoch_seconds(timestamp: Any) -> float:
+    """Accept epoch numbers or ISO-8601 strings (with or without a trailing Z)."""
+    if isinstance(timestamp, (int, float)):
+        return float(timestamp)
+    if isinstance(timestamp, str):
+        text = timestamp[:-1] + "+00:00" if timestamp.endswith("Z") else timestamp
+        try:
+            parsed = datetime.fromisoformat(text)
+        except ValueError:
+            pass
+        else:
+            if parsed.tzinfo is None:
+                parsed = parsed.replace(tzinfo=timezone.utc)
+            return parsed.timestamp()
+    return datetime.now(timezone.utc).timestamp()
+
+
+def iso_timestamp(seconds: float) -> str:
+    return datetime.fromtimestamp(seconds, timezone.utc).isoformat()
+
+
+def _pack_record(timestamp: Any, device_id: Any, bpm: Any, rr_ms: Any) -> bytes | None:
+    """One record, or None if the reading cannot be encoded."""
+    try:
+        bpm_value = float(bpm)
+    except (TypeError, ValueError):
+        return None
+    # the same rule as extract_readings, so a frame never carries what JSON would drop
+    if not math.isfinite(bpm_value) or bpm_value <= 0:
+        return None
+    rr = rr_value(rr_ms)
+    try:
+        return RECORD.pack(
+            epoch_seconds(timestamp),
+            int(device_id),
+            min(_NO_RR, round(bpm_value * 10)),
+            _NO_RR if not math.isfinite(rr) else min(_NO_RR - 1, max(0, round(rr))),
+        )
+    except (TypeError, ValueError, OverflowError, struct.error):
+        return None
+
+
+def encode_frame(readings: Iterable[Reading], skipped: list[Reading] | None = None) -> bytes:
+    """One frame of the readings; those that cannot be encoded go to ``skipped``."""
+    records = []
+    for reading in readings:
+        record = _pack_record(*reading)
+        if record is not None:
+            records.append(record)
+        elif skipped is not None:
+            skipped.append(reading)
+    if len(records) > MAX_FRAME:
+        raise ValueError(f"a frame holds at most {MAX_FRAME} readings")
+    return FRAME_COUNT.pack(len(records)) + b"".join(records)
+
+
+def _message_items(message: Mapping[str, Any]) -> list[Mapping[str, Any]]:
+    if message.get("type") == "hr_batch":
+        return list(message.get("readings", []))
+    return [message.get("reading", message)]
+
+
+class MessageWriter:
+    """Write emitter messages as newline JSON or binary frames.
+
+    ``emit`` takes the same ``hr_single`` / ``hr_batch`` dicts the scripts
+    already build, and flushes after each one like ``print(..., flush=True)``.
+    """
+
+    def __init__(self, fmt: str = "json", stream: BinaryIO | None = None) -> None:
+        if fmt not in FORMATS:
+            raise ValueError(f"unknown format {fmt!r}; expected one of {FORMATS}")
+        self.format = fmt
+        self._stream = stream or sys.stdout.buffer
+        self._started = False
+        self.skipped = 0
+
+    def emit(self, message: Mapping[str, Any]) -> None:
+        if self.format == "json":
+            self._stream.write(json.dumps(message).encode() + b"\n")
+        else:
+            if not self._started:
+                self._stream.write(MAGIC)
+                self._started = True
+            skipped: list[Reading] = []
+            readings = (
+                Reading(item.get("ts_iso"), item.get("device_id"), item.get("bpm"),
+                        item.get("rr_ms"))
+                for item in _message_items(message)
+            )
+            frame = encode_frame(readings, skipped)
+            for reading in skipped:
+                log.warning("skipped reading binary frames cannot carry: %r", reading)
+            self.skipped += len(skipped)
+            self._stream.write(frame)
+        self._stream.flush()
+
+
+def _read_exact(stream: BinaryIO, size: int) -> bytes | None:
+    data = stream.read(size)
+    while data and len(data) < size:
+        more = stream.read(size - len(data))
+        if not more:
+            break
+        data += more
+    return data if len(data) == size else None
+
+
+def decode_record(record: tuple[float, int, int, int]) -> Reading:
+    timestamp, device_id, bpm, rr = record
+    return Reading(timestamp, str(device_id), bpm / 10.0, None if rr == _NO_RR else rr)
+
+
+def sniff_encoding(head: bytes) -> str | None:
+    """The text encoding of a stream starting with ``head``; None for plain UTF-8."""
+    for bom, encoding in BOMS:
+        if head.startswith(bom):
+            return encoding
+    # BOM-less UTF-16: ASCII text alternates with zero bytes
+    if len(head) >= 2 and head[0] and not head[1]:
+        return "utf-16-le"
+    if len(head) >= 2 and not head[0] and head[1]:
+        return "utf-16-be"
+    return None
+
+
+class _Transcoder(io.RawIOBase):
+    """Read a text stream in ``encoding`` as UTF-8 bytes, one chunk at a time."""
+
+    def __init__(
+        self, stream: BinaryIO, encoding: str, prefix: bytes = b"", owns: bool = False
+    ) -> None:
+        self._stream = stream
+        self._owns = owns
+        self._decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+        self._pending = self._decoder.decode(prefix).encode()
+        self._done = False
+
+    def readable(self) -> bool:
+        return True
+
+    def close(self) -> None:
+        if self._owns and not self.closed:
+            self._stream.close()
+        super().close()
+
+    def readinto(self, buffer: Any) -> int:
+        while not self._pending and not self._done:
+            chunk = self._stream.read(TRANSCODE_CHUNK)
+            self._done = not chunk
+            self._pending = self._decoder.decode(chunk, final=self._done).encode()
+        size = min(len(buffer), len(self._pending))
+        buffer[:size] = self._pending[:size]
+        self._pending = self._pending[size:]
+        return size
+
+
+def utf8_reader(
+    stream: BinaryIO, encoding: str, prefix: bytes = b"", owns: bool = False
+) -> BinaryIO:
+    """A buffered UTF-8 view of ``stream``; ``prefix`` is what was already read.
+
+    Closing it closes ``stream`` too only if the view ``owns`` it.
+    """
+    return io.BufferedReader(_Transcoder(stream, encoding, prefix, owns), TRANSCODE_CHUNK)
+
+
+class InputStream:
+    """Sniff a binary stdin-like stream as either frames or newline JSON."""
+
+    def __init__(self, stream: BinaryIO | None = None) -> None:
+        self._stream = stream or sys.stdin.buffer
+        self._prefix = _read_exact(self._stream, len(MAGIC)) or b""
+        self.binary = self._prefix == MAGIC
+        self.encoding = None if self.binary else sniff_encoding(self._prefix)
+        if self.binary:
+            self._prefix = b""
+        elif self.encoding is not None:
+            self._stream = utf8_reader(self._stream, self.encoding, self._prefix)
+            self._prefix = b""
+
+    def lines(self) -> Iterator[bytes]:
+        if self.binary:
+            raise ValueError("binary stream has no lines")
+        head = self._prefix
+        if head and not head.endswith(b"\n"):
+            head += self._stream.readline()
+        yield from head.splitlines(keepends=True)
+        yield from self._stream
+
+    def frames(self) -> Iterator[list[Reading]]:
+        if not self.binary:
+            raise ValueError("JSON stream has no frames")
+        while True:
+            header = _read_exact(self._stream, FRAME_COUNT.size)
+            if header is None:
+                return
+            (count,) = FRAME_COUNT.unpack(header)
+            body = _read_exact(self._stream, count * RECORD.size)
+            if body is None:
+                return
+            # bpm 0 is no reading at all; older writers clamped bad values to it
+            yield [
+                decode_record(record) for record in RECORD.iter_unpack(body) if record[2]
+            ]
+
+
+def read_batches(
+    stream: BinaryIO | None = None,
+    decoder: ReadingDecoder | None = None,
+    on_invalid: Callable[[int, str], None] | None = None,
+) -> Iterator[tuple[int, list[Reading]]]:
+    """Yield ``(line_or_frame_number, readings)`` from either wire format.
+
+    JSON lines that fail to decode are reported to ``on_invalid`` and
+    skipped; blank lines are ignored.
+    """
+    source = InputStream(stream)
+    if source.binary:
+        yield from enumerate(source.frames(), start=1)
+        return
+
+    decoder = decoder or ReadingDecoder()
+    for number, line in enumerate(source.lines(), start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            readings = decoder.decode(line)
+        except DecodeError as exc:
+            if on_invalid is not None:
+                on_invalid(number, str(exc))
+            continue
+        yield number, readings
+
+
+def add_format_argument(parser) -> None:
+    parser.add_argument(
+        "--format", choices=FORMATS, default="json",
+        help="Output wire format: newline JSON or compact binary frames (default: json)",
+    )
+
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""Streaming heart-rate variability (RMSSD, SDNN, pNN50) from RR intervals.
+
+``rr_ms`` rides along every reading but was never analysed. ``HrvEngine``
+keeps each device's RR intervals from the last ``window`` seconds of beats
+in a deque. Next to the deque it keeps running sums:
+
+    total, squares    sum and sum of squares of the intervals  -> SDNN
+    deltas            sum of squared successive differences    -> RMSSD
+    nn50              successive differences above 50 ms        -> pNN50
+
+A new beat adds one interval and one difference, and each interval that
+falls out of the window takes its own off again. Updates are therefore
+O(1) amortised however long the window is. The sums are rebuilt from the
+deque every RESUM_EVERY beats so float error cannot build up.
+
+The group value of each metric is the mean over the devices with at least
+``min_beats`` intervals. It is kept as running sums too, so it also costs
+O(1) per beat.
+
+Like beat_scheduler.py, a reading that carries RR is taken to be a new
+beat (a list carries several); implausible intervals are skipped. Some
+sources repeat the last RR between beats (ANT+ broadcasts, the
+simulators), which would add zero differences and pull RMSSD towards 0.
+So, going by the readings' own timestamps, a reading within half an
+interval of the last beat is a repeat, and so is the same interval again
+before the next beat is due.
+
+    engine = HrvEngine(window=60.0)
+    engine.add("51861", 812, at=time.time())
+    engine.device("51861"), engine.group()
+"""
+
+from __future__ import annotations
+
+import math
+from collections import deque
+from collections.abc import Iterator
+from dataclasses import dataclass
+from typing import Any
+
+from hr_readings import rr_seconds
+
+WINDOW = 60.0  # seconds of beats per device
+MIN_BEATS = 10
+NN50_MS = 50.0
+RESUM_EVERY = 4096
+METRICS = ("rmssd", "sdnn", "pnn50")
+# Span of each metric that the light mappings sweep (see metric_as_bpm).
+METRIC_RANGES = {"rmssd": (0.0, 100.0), "sdnn": (0.0, 100.0), "pnn50": (0.0, 50.0)}
+
+
+@dataclass(frozen=True)
+class HrvMetrics:
+    rmssd: float  # ms
+    sdnn: float  # ms
+    pnn50: float  # percent
+    beats: int  # intervals behind the values (devices, for the group)
+
+    def value(self, metric: str) -> float:
+        return getattr(self, metric)
+
+
+class RRWindow:
+    """One device's RR intervals over the last ``window_ms``, with running sums."""
+
+    def __init__(self, window_ms: float) -> None:
+        self.window_ms = window_ms
+        self.rr: deque[float] = deque()
+        self.total = 0.0
+        self.squares = 0.0
+        self.deltas = 0.0
+        self.nn50 = 0
+        self.marked = -math.inf  # when the last beat was taken, in seconds
+        self._adds = 0
+
+    def __len__(self) -> int:
+        return len(self.rr)
+
+    def repeats(self, rr: float, at: float) -> bool:
+        """Whether ``rr`` arriving at ``at`` seconds is the last beat reported again."""
+        if not self.rr:
+            return False
+        elapsed = (at - self.marked) * 1000.0
+        last = self.rr[-1]
+        return elapsed < last / 2 or (rr == last and elapsed < last * 1.5)
+
+    def add(self, rr: float) -> None:
+        intervals = self.rr
+        if intervals:
+            delta = rr - intervals[-1]
+            self.deltas += delta * delta
+            self.nn50 += abs(delta) > NN50_MS
+        intervals.append(rr)
+        self.total += rr
+        self.squares += rr * rr
+        while self.total > self.window_ms and len(intervals) > 2:
+            old = intervals.popleft()
+            self.total -= old
+            self.squares -= old * old
+            delta = intervals[0] - old
+            self.deltas -= delta * delta
+            self.nn50 -= abs(delta) > NN50_MS
+        self._adds += 1
+        if self._adds % RESUM_EVERY == 0:
+            self._resum()
+
+    def metrics(self) -> HrvMetrics:
+        n = len(self.rr)
+        if n < 2:
+            return HrvMetrics(math.nan, math.nan, math.nan, n)
+        variance = (self.squares - self.total * self.total / n) / (n - 1)
+        return HrvMetrics(
+            rmssd=math.sqrt(max(self.deltas, 0.0) / (n - 1)),
+            sdnn=math.sqrt(max(variance, 0.0)),
+            pnn50=100.0 * self.nn50 / (n - 1),
+            beats=n,
+        )
+
+    def _resum(self) -> None:
+        intervals = list(self.rr)
+        self.total = math.fsum(intervals)
+        self.squares = math.fsum(rr * rr for rr in intervals)
+        pairs = list(zip(intervals, intervals[1:]))
+        self.deltas = math.fsum((b - a) ** 2 for a, b in pairs)
+        self.nn50 = sum(abs(b - a) > NN50_MS for a, b in pairs)
+
+
+class HrvEngine:
+    """RMSSD / SDNN / pNN50 per device and averaged across the group."""
+
+    def __init__(self, window: float = WINDOW, min_beats: int = MIN_BEATS) -> None:
+        if window <= 0:
+            raise ValueError("window must be positive")
+        if min_beats < 2:
+            raise ValueError("min_beats must be at least 2")
+        self.window_ms = window * 1000.0
+        self.min_beats = min_beats
+        self.windows: dict[str, RRWindow] = {}
+        self._latest: dict[str, HrvMetrics] = {}  # devices with min_beats, for the group
+        self._sums = [0.0, 0.0, 0.0]
+
+    def __contains__(self, device_id: object) -> bool:
+        return device_id in self._latest
+
+    def add(self, device_id: str, rr_ms: Any, at: float) -> bool:
+        """Fold in the beat(s) ``rr_ms`` carries, read at ``at`` seconds.
+
+        Returns whether there were any, that is, whether the reading was not
+        a repeat of the last beat.
+        """
+        intervals = rr_seconds(rr_ms)
+        if not intervals:
+            return False
+        window = self.windows.get(device_id)
+        if window is None:
+            window = self.windows[device_id] = RRWindow(self.window_ms)
+        if window.repeats(intervals[-1] * 1000.0, at):
+            return False
+        window.marked = at
+        for seconds in intervals:
+            window.add(seconds * 1000.0)
+        if len(window) >= self.min_beats:
+            self._set(device_id, window.metrics())
+        return True
+
+    def remove(self, device_id: str) -> None:
+        self.windows.pop(device_id, None)
+        self._set(device_id, None)
+
+    def device(self, device_id: str) -> HrvMetrics | None:
+        """The device's metrics once it has ``min_beats`` intervals, else None."""
+        return self._latest.get(device_id)
+
+    def devices(self) -> Iterator[tuple[str, HrvMetrics]]:
+        return iter(self._latest.items())
+
+    def group(self) -> HrvMetrics | None:
+        """Each metric averaged over the devices that have one, or None if none do."""
+        count = len(self._latest)
+        if not count:
+            return None
+        rmssd, sdnn, pnn50 = (total / count for total in self._sums)
+        return HrvMetrics(rmssd, sdnn, pnn50, count)
+
+    def _set(self, device_id: str, metrics: HrvMetrics | None) -> None:
+        sums = self._sums
+        previous = self._latest.pop(device_id, None)
+        if previous is not None:
+            sums[0] -= previous.rmssd
+            sums[1] -= previous.sdnn
+            sums[2] -= previous.pnn50
+        if metrics is not None:
+            self._latest[device_id] = metrics
+            sums[0] += metrics.rmssd
+            sums[1] += metrics.sdnn
+            sums[2] += metrics.pnn50
+        if not self._latest:
+            self._sums = [0.0, 0.0, 0.0]  # drop accumulated float error when the room empties
+
+
+def metric_as_bpm(metric: str, value: float, low: float = 60.0, high: float = 120.0) -> float:
+    """Scale ``value`` from METRIC_RANGES[metric] onto the BPM span the mappings sweep."""
+    lo, hi = METRIC_RANGES[metric]
+    ratio = (min(max(value, lo), hi) - lo) / (hi - lo)
+    return low + ratio * (high - low)
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""Cached Hue bridge client.
+
+The scripts used to open a fresh ``phue.Bridge``, refetch every group and
+then send ``on``, ``bri``, ``sat`` and ``hue`` as four separate PUTs for
+each colour change. ``HueClient`` keeps one bridge connection and the group
+name -> id map (refreshed after ``group_ttl`` seconds, or when the bridge
+says a group is gone), sends each state change as a single group action,
+and skips a send entirely when the state equals the last one sent to that
+group. That is one request per real change instead of five or more, which
+keeps us under the bridge's ~1 group command/s budget.
+
+Bridge error responses (phue only logs them) are raised as ``HueError``.
+"""
+
+from __future__ import annotations
+
+import json
+import time
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Any
+
+GROUP_TTL = 300.0
+
+# Bridge error types that mean our cached ids are stale.
+_RESOURCE_NOT_AVAILABLE = 3
+
+
+class HueError(RuntimeError):
+    """An error response from the bridge."""
+
+    def __init__(self, kind: int, address: str, description: str) -> None:
+        super().__init__(f"{description} (type {kind} at {address})")
+        self.kind = kind
+        self.address = address
+
+
+def _raise_for_errors(response: Any) -> None:
+    items = response if isinstance(response, list) else [response]
+    for item in items:
+        if isinstance(item, list):
+            _raise_for_errors(item)
+        elif isinstance(item, dict) and "error" in item:
+            error = item["error"]
+            raise HueError(
+                error.get("type", 0), error.get("address", ""), error.get("description", "")
+            )
+
+
+class HueClient:
+    """One bridge connection, a cached group map, and deduplicated group actions."""
+
+    def __init__(self, ip: str | None = None, group_ttl: float = GROUP_TTL) -> None:
+        self.ip = ip
+        self.group_ttl = group_ttl
+        self.sent = 0
+        self.skipped = 0
+        self._bridge: Any = None
+        self._groups: dict[str, int] = {}
+        self._names: list[str] = []
+        self._fetched = float("-inf")
+        self._last: dict[int, dict[str, Any]] = {}
+
+    @property
+    def bridge(self) -> Any:
+        if self._bridge is None:
+            try:
+                from phue import Bridge
+            except ImportError as exc:
+                raise RuntimeError(
+                    "Hue support requires phue. Install it with: pip install phue"
+                ) from exc
+            bridge = Bridge(self.ip) if self.ip else Bridge()
+            bridge.connect()
+            self._bridge = bridge
+        return self._bridge
+
+    def invalidate(self, connection: bool = False) -> None:
+        """Forget cached groups and last-sent states (and the connection if asked)."""
+        self._groups.clear()
+        self._names.clear()
+        self._fetched = float("-inf")
+        self._last.clear()
+        if connection:
+            self._bridge = None
+
+    def groups(self, refresh: bool = False) -> dict[str, int]:
+        """Group name (casefolded) -> id, cached for ``group_ttl`` seconds."""
+        if refresh or time.monotonic() - self._fetched > self.group_ttl:
+            response = self._call(self.bridge.get_group)
+            _raise_for_errors(response)
+            names = {int(gid): str(details.get("name", gid)) for gid, details in response.items()}
+            self._names = sorted(names.values())
+            self._groups = {name.casefold(): gid for gid, name in names.items()}
+            self._fetched = time.monotonic()
+        return self._groups
+
+    def group_id(self, name: str) -> int:
+        key = name.casefold()
+        group_id = self.groups().get(key)
+        if group_id is None:
+            group_id = self.groups(refresh=True).get(key)
+        if group_id is None:
+            raise LookupError(
+                f'Hue group "{name}" was not found. '
+                f'Available groups: {", ".join(self._names) or "none"}'
+            )
+        return group_id
+
+    def set_group(self, group: int | str, state: Mapping[str, Any]) -> bool:
+        """Send ``state`` as one action; return False if it was already sent.
+
+        ``transitiontime`` is sent but ignored when comparing states.
+        """
+        group_id = group if isinstance(group, int) else self.group_id(group)
+        target = {key: value for key, value in state.items() if key != "transitiontime"}
+        if self._last.get(group_id) == target:
+            self.skipped += 1
+            return False
+        try:
+            _raise_for_errors(self._call(self.bridge.set_group, group_id, dict(state)))
+        except HueError as exc:
+            self._last.pop(group_id, None)
+            if exc.kind == _RESOURCE_NOT_AVAILABLE:
+                self.invalidate()
+            raise
+        self._last[group_id] = target
+        self.sent += 1
+        return True
+
+    def group_lights(self, group_id: int) -> list[int]:
+        response = self._call(self.bridge.get_group, group_id)
+        _raise_for_errors(response)
+        return [int(light) for light in response.get("lights", [])]
+
+    def set_streaming(self, group_id: int, active: bool) -> None:
+        """Switch Entertainment API streaming on or off for a group."""
+        bridge = self.bridge
+        address = f"/api/{bridge.username}/groups/{group_id}"
+        body = {"stream": {"active": active}}
+        _raise_for_errors(self._call(bridge.request, "PUT", address, body))
+
+    def clientkey(self) -> str | None:
+        """The streaming client key saved by ``hue_entertainment.py --pair``, if any."""
+        bridge = self.bridge
+        try:
+            config = json.loads(Path(bridge.config_file_path).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        return config.get(bridge.ip, {}).get("clientkey")
+
+    def _call(self, method: Any, *args: Any) -> Any:
+        try:
+            return method(*args)
+        except OSError:
+            # Reconnect on the next call; the bridge may have restarted or moved.
+            self.invalidate(connection=True)
+            raise
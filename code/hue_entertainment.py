@@ -0,0 +1,389 @@
+#!/usr/bin/env python3
+"""Hue Entertainment API streaming output.
+
+REST group actions are paced by the bridge at about one per second, which
+is far too slow to pulse lights with heartbeats. An entertainment group
+instead takes a continuous stream of HueStream v1 messages over DTLS (UDP
+port 2100), 25-50 per second, each carrying an RGB colour per light, and
+applies them within a frame or two.
+
+``EntertainmentStream`` runs a sender thread that emits one message every
+``1 / rate`` seconds from the latest per-light colours, easing towards new
+targets over ``fade`` seconds so once-a-second BPM updates still look
+smooth. Colours come from ``set_hsb`` (a HueState's hue/sat/bri, same for
+every light) or ``set_lights`` (RGB per light). ``pulse`` flashes lights to
+full and lets them decay to ``pulse_floor`` of their colour, for per-beat
+effects (see beat_scheduler.py).
+
+Transports:
+- ``DtlsTransport``: a real bridge. Needs python-mbedtls and the client key
+  returned when this app was registered with ``--pair``.
+- ``UdpTransport``: plain UDP, for fake_hue_bridge.py's stream receiver.
+
+Streaming has to be switched on for the group over REST first
+(``HueClient.set_streaming``); the bridge ends it after 10 s of silence.
+
+    python3 code/hue_entertainment.py --pair --ip 192.168.88.118
+    python3 code/hue_entertainment.py --ip 192.168.88.118 --group Stage --bpm 72
+"""
+
+from __future__ import annotations
+
+import argparse
+import colorsys
+import json
+import math
+import os
+import socket
+import struct
+import sys
+import threading
+import time
+import urllib.request
+from collections.abc import Callable, Iterable, Mapping
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Protocol
+
+from hr_logging import get_logger
+from hue_client import HueClient
+
+log = get_logger("hue-stream")
+
+PORT = 2100
+RATE = 25.0
+FADE = 0.2
+PULSE_FLOOR = 0.35
+PULSE_DECAY = 0.25
+PROTOCOL = b"HueStream"
+VERSION = (1, 0)
+RGB = 0x00
+XY = 0x01
+MAX_LIGHTS = 10  # per message in API v1
+CIPHER = "TLS-PSK-WITH-AES-128-GCM-SHA256"
+
+_HEADER = struct.Struct(">9sBBBHBB")
+_LIGHT = struct.Struct(">BHHHH")
+
+Color = tuple[int, int, int]  # 16-bit R, G, B
+
+
+def encode_message(sequence: int, colors: Mapping[int, Color], color_space: int = RGB) -> bytes:
+    """One HueStream v1 message: a 16-byte header and 9 bytes per light."""
+    if len(colors) > MAX_LIGHTS:
+        raise ValueError(f"a HueStream v1 message carries at most {MAX_LIGHTS} lights")
+    parts = [_HEADER.pack(PROTOCOL, *VERSION, sequence & 0xFF, 0, color_space, 0)]
+    parts.extend(_LIGHT.pack(0, light, *color) for light, color in colors.items())
+    return b"".join(parts)
+
+
+def decode_message(data: bytes) -> tuple[int, int, dict[int, Color]]:
+    """Return (sequence, colour space, colours by light id) or raise ValueError."""
+    if len(data) < _HEADER.size or (len(data) - _HEADER.size) % _LIGHT.size:
+        raise ValueError(f"bad HueStream message length {len(data)}")
+    protocol, major, _minor, sequence, _, color_space, _ = _HEADER.unpack_from(data)
+    if protocol != PROTOCOL or major != VERSION[0]:
+        raise ValueError("not a HueStream v1 message")
+    colors: dict[int, Color] = {}
+    for offset in range(_HEADER.size, len(data), _LIGHT.size):
+        kind, light, *color = _LIGHT.unpack_from(data, offset)
+        if kind != 0:
+            raise ValueError(f"unknown device type {kind}")
+        colors[light] = (color[0], color[1], color[2])
+    return sequence, color_space, colors
+
+
+def hsb_to_rgb(hue: int, saturation: int, brightness: int) -> Color:
+    """Hue REST hue (0-65535) / sat / bri (0-254) as 16-bit RGB."""
+    r, g, b = colorsys.hsv_to_rgb(hue / 65535, saturation / 254, brightness / 254)
+    return round(r * 65535), round(g * 65535), round(b * 65535)
+
+
+class Transport(Protocol):
+    def send(self, data: bytes) -> None: ...
+
+    def close(self) -> None: ...
+
+
+class UdpTransport:
+    """Unencrypted datagrams, for a local stand-in receiver."""
+
+    def __init__(self, host: str, port: int = PORT) -> None:
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._sock.connect((host, port))
+
+    def send(self, data: bytes) -> None:
+        self._sock.send(data)
+
+    def close(self) -> None:
+        self._sock.close()
+
+
+class DtlsTransport:
+    """DTLS 1.2 PSK session with a bridge (identity = username, key = client key)."""
+
+    def __init__(
+        self, host: str, username: str, clientkey: str, port: int = PORT, timeout: float = 5.0
+    ) -> None:
+        try:
+            from mbedtls import tls
+        except ImportError as exc:
+            raise RuntimeError(
+                "Hue streaming requires python-mbedtls. "
+                "Install it with: pip install python-mbedtls"
+            ) from exc
+
+        config = tls.DTLSConfiguration(
+            pre_shared_key=(username, bytes.fromhex(clientkey)),
+            ciphers=(CIPHER,),
+            lowest_supported_version=tls.DTLSVersion.DTLSv1_2,
+            highest_supported_version=tls.DTLSVersion.DTLSv1_2,
+            validate_certificates=False,
+        )
+        sock = tls.ClientContext(config).wrap_socket(
+            socket.socket(socket.AF_INET, socket.SOCK_DGRAM), server_hostname=None
+        )
+        sock.settimeout(timeout)
+        sock.connect((host, port))
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                sock.do_handshake()
+                break
+            except (tls.WantReadError, tls.WantWriteError):
+                if time.monotonic() > deadline:
+                    sock.close()
+                    raise TimeoutError(f"DTLS handshake with {host}:{port} timed out") from None
+        self._sock = sock
+
+    def send(self, data: bytes) -> None:
+        self._sock.send(data)
+
+    def close(self) -> None:
+        self._sock.close()
+
+
+@dataclass
+class StreamStats:
+    frames: int = 0
+    errors: int = 0
+    late: int = 0  # frames sent more than one period behind schedule
+
+
+class EntertainmentStream:
+    """Send the latest per-light colours at a fixed rate on a worker thread."""
+
+    def __init__(
+        self,
+        transport: Transport,
+        lights: Iterable[int],
+        rate: float = RATE,
+        fade: float = FADE,
+        on_close: Callable[[], None] | None = None,
+    ) -> None:
+        self.lights = list(lights)
+        if len(self.lights) > MAX_LIGHTS:
+            log.warning(
+                "a HueStream v1 message carries at most %d lights; not streaming to lights %s",
+                MAX_LIGHTS, ", ".join(map(str, self.lights[MAX_LIGHTS:])),
+            )
+            del self.lights[MAX_LIGHTS:]
+        if not self.lights:
+            raise ValueError("the entertainment group has no lights")
+        self.transport = transport
+        self.period = 1.0 / rate
+        self.fade = max(0.0, fade)
+        self.pulse_floor = 1.0  # no dimming until pulses are used
+        self.pulse_decay = PULSE_DECAY
+        self.stats = StreamStats()
+        self._on_close = on_close
+        self._target: dict[int, Color] = {light: (0, 0, 0) for light in self.lights}
+        self._current: dict[int, list[float]] = {light: [0.0, 0.0, 0.0] for light in self.lights}
+        self._pulsed: dict[int, float] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="hue-stream", daemon=True)
+
+    def start(self) -> EntertainmentStream:
+        self._thread.start()
+        return self
+
+    def close(self) -> None:
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join(2.0)
+        self.transport.close()
+        if self._on_close is not None:
+            self._on_close()
+
+    def set_hsb(self, hue: int, saturation: int, brightness: int) -> None:
+        """Give every light the same REST-style colour."""
+        color = hsb_to_rgb(hue, saturation, brightness)
+        self.set_lights({light: color for light in self.lights})
+
+    def set_lights(self, colors: Mapping[int, Color]) -> None:
+        with self._lock:
+            for light, color in colors.items():
+                if light in self._target:
+                    self._target[light] = color
+
+    def pulse(self, lights: Iterable[int] | None = None) -> None:
+        """Flash ``lights`` (default: all) now; they decay back to ``pulse_floor``."""
+        now = time.perf_counter()
+        with self._lock:
+            for light in self.lights if lights is None else lights:
+                self._pulsed[light] = now
+
+    def _frame(self, now: float, dt: float) -> dict[int, Color]:
+        step = 1.0 if self.fade == 0 else min(1.0, dt / self.fade)
+        floor = self.pulse_floor
+        frame: dict[int, Color] = {}
+        with self._lock:
+            for light, target in self._target.items():
+                current = self._current[light]
+                for i in range(3):
+                    current[i] += (target[i] - current[i]) * step
+                level = 1.0
+                if floor < 1.0:
+                    age = now - self._pulsed.get(light, -math.inf)
+                    level = floor + (1.0 - floor) * math.exp(-age / self.pulse_decay)
+                frame[light] = (
+                    round(current[0] * level), round(current[1] * level), round(current[2] * level)
+                )
+        return frame
+
+    def _run(self) -> None:
+        sequence = 0
+        due = last = time.perf_counter()
+        while not self._stop.is_set():
+            now = time.perf_counter()
+            if now < due:
+                self._stop.wait(due - now)
+                continue
+            if now - due > self.period:
+                self.stats.late += 1
+                due = now
+            try:
+                self.transport.send(encode_message(sequence, self._frame(now, now - last)))
+                self.stats.frames += 1
+            except OSError as exc:
+                self.stats.errors += 1
+                if self.stats.errors == 1:
+                    log.warning("stream send failed: %s", exc)
+            sequence = (sequence + 1) & 0xFF
+            last = now
+            due += self.period
+
+
+def open_transport(
+    host: str, username: str, clientkey: str | None, plain: bool, port: int = PORT
+) -> Transport:
+    """DTLS to a bridge, or plain UDP to a stand-in with ``plain``."""
+    if plain:
+        return UdpTransport(host, port)
+    if not clientkey:
+        raise RuntimeError(
+            "Hue streaming needs a client key. Pair with: python3 code/hue_entertainment.py --pair"
+        )
+    return DtlsTransport(host, username, clientkey, port)
+
+
+def start_group_stream(
+    client: HueClient,
+    group_id: int,
+    clientkey: str | None = None,
+    plain: bool = False,
+    port: int = PORT,
+    rate: float = RATE,
+    fade: float = FADE,
+) -> EntertainmentStream:
+    """Switch streaming on for a group and start sending; ``close()`` switches it off."""
+    lights = client.group_lights(group_id)
+    # The bridge only accepts the DTLS handshake once streaming is active.
+    client.set_streaming(group_id, True)
+    try:
+        bridge = client.bridge
+        host = str(bridge.ip).rsplit(":", 1)[0]
+        transport = open_transport(
+            host, bridge.username, clientkey or client.clientkey(), plain, port
+        )
+        stream = EntertainmentStream(
+            transport, lights, rate, fade, on_close=lambda: client.set_streaming(group_id, False)
+        )
+    except BaseException:
+        client.set_streaming(group_id, False)
+        raise
+    return stream.start()
+
+
+def pair(ip: str, devicetype: str = "hrp#stream") -> dict[str, str]:
+    """Register with ``generateclientkey`` and save username + key where phue looks."""
+    request = urllib.request.Request(
+        f"http://{ip}/api",
+        data=json.dumps({"devicetype": devicetype, "generateclientkey": True}).encode(),
+        method="POST",
+    )
+    with urllib.request.urlopen(request, timeout=10) as response:
+        result = json.loads(response.read())[0]
+    if "error" in result:
+        raise RuntimeError(result["error"].get("description", "registration failed"))
+    success = result["success"]
+    path = Path(os.path.expanduser("~")) / ".python_hue"
+    try:
+        config = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        config = {}
+    config[ip] = success
+    path.write_text(json.dumps(config), encoding="utf-8")
+    return success
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(
+        description="Stream a heartbeat pulse to a Hue entertainment group"
+    )
+    ap.add_argument("--ip", help="Bridge IP (otherwise phue discovery is used)")
+    ap.add_argument("--pair", action="store_true", help="Register and save a streaming client key")
+    ap.add_argument("--group", default="Office", help="Entertainment group name")
+    ap.add_argument("--bpm", type=float, default=60.0, help="Pulse rate (default: 60)")
+    ap.add_argument("--seconds", type=float, default=10.0, help="How long to stream (default: 10)")
+    ap.add_argument(
+        "--rate", type=float, default=RATE, help=f"Messages per second (default: {RATE:g})"
+    )
+    ap.add_argument("--clientkey", help="Client key (default: the one saved by --pair)")
+    ap.add_argument("--port", type=int, default=PORT)
+    ap.add_argument(
+        "--plain", action="store_true", help="Send unencrypted UDP (fake_hue_bridge.py)"
+    )
+    args = ap.parse_args()
+
+    try:
+        if args.pair:
+            if not args.ip:
+                ap.error("--pair needs --ip")
+            print(f"[hue-stream] paired: {pair(args.ip)}")
+            return
+        client = HueClient(args.ip)
+        stream = start_group_stream(
+            client, client.group_id(args.group), args.clientkey, args.plain, args.port,
+            args.rate, fade=0.0,
+        )
+        try:
+            start = time.monotonic()
+            while time.monotonic() - start < args.seconds:
+                phase = ((time.monotonic() - start) * args.bpm / 60.0) % 1.0
+                stream.set_hsb(0, 254, round(40 + 214 * math.exp(-6.0 * phase)))
+                time.sleep(stream.period / 2)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            stream.close()
+        stats = stream.stats
+        print(f"[hue-stream] frames={stats.frames} late={stats.late} errors={stats.errors}")
+    except (RuntimeError, LookupError, OSError) as exc:
+        print(f"[hue-stream] {exc}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""Non-blocking Hue output.
+
+``HueSink`` runs bridge sends on its own thread so a slow HTTP round trip
+never stalls stdin ingest, CSV, or OSC. Only the newest state per group is
+kept: submitting again before the worker sends simply replaces the pending
+state (counted as coalesced). Each group is sent at most once per
+``interval`` seconds and there is never more than one request in flight.
+``close`` still sends each group's pending state, regardless of the
+interval, so the bridge ends on the final value; it waits at most
+``timeout`` seconds for that.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable
+
+SendFn = Callable[[str, Any], None]
+
+
+@dataclass(frozen=True)
+class HueSend:
+    group_id: str
+    state: Any
+    latency: float
+    coalesced: int
+
+
+@dataclass
+class HueSinkStats:
+    submitted: int = 0
+    sent: int = 0
+    coalesced: int = 0
+    failed: int = 0
+    total_latency: float = 0.0
+    max_latency: float = 0.0
+
+    @property
+    def mean_latency(self) -> float:
+        return self.total_latency / self.sent if self.sent else 0.0
+
+
+class HueSink:
+    def __init__(
+        self,
+        send: SendFn,
+        interval: float,
+        on_sent: Callable[[HueSend], None] | None = None,
+        on_error: Callable[[str, Exception], None] | None = None,
+    ) -> None:
+        self.interval = max(0.0, interval)
+        self.stats = HueSinkStats()
+        self._send = send
+        self._on_sent = on_sent
+        self._on_error = on_error
+        self._pending: dict[str, Any] = {}
+        self._coalesced: dict[str, int] = {}
+        self._last_sent: dict[str, float] = {}
+        self._cond = threading.Condition()
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="hue-sink", daemon=True)
+
+    def start(self) -> "HueSink":
+        self._thread.start()
+        return self
+
+    def submit(self, group_id: str, state: Any) -> None:
+        """Queue ``state`` for ``group_id``, replacing any unsent state."""
+        with self._cond:
+            self.stats.submitted += 1
+            if group_id in self._pending:
+                self.stats.coalesced += 1
+                self._coalesced[group_id] = self._coalesced.get(group_id, 0) + 1
+            self._pending[group_id] = state
+            self._cond.notify()
+
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._pending)
+
+    def close(self, timeout: float = 2.0) -> None:
+        """Flush the pending states, then stop the worker (waiting at most ``timeout``)."""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        if self._thread.is_alive():
+            self._thread.join(timeout)
+
+    def _next_due(self, now: float) -> tuple[str | None, float]:
+        """Return the group that may be sent soonest and how long to wait."""
+        best_group, best_wait = None, float("inf")
+        for group_id in self._pending:
+            wait = self._last_sent.get(group_id, float("-inf")) + self.interval - now
+            if wait < best_wait:
+                best_group, best_wait = group_id, wait
+        return best_group, max(0.0, best_wait)
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while True:
+                    if self._stopping:
+                        if not self._pending:
+                            return
+                        group_id = next(iter(self._pending))  # flush, interval or not
+                        break
+                    group_id, wait = self._next_due(time.monotonic())
+                    if group_id is not None and wait == 0.0:
+                        break
+                    self._cond.wait(None if group_id is None else wait)
+                state = self._pending.pop(group_id)
+                coalesced = self._coalesced.pop(group_id, 0)
+                self._last_sent[group_id] = time.monotonic()
+
+            started = time.perf_counter()
+            try:
+                self._send(group_id, state)
+            except Exception as exc:  # keep the worker alive on bridge errors
+                with self._cond:
+                    self.stats.failed += 1
+                if self._on_error is not None:
+                    self._on_error(group_id, exc)
+                continue
+            latency = time.perf_counter() - started
+
+            with self._cond:
+                self.stats.sent += 1
+                self.stats.total_latency += latency
+                self.stats.max_latency = max(self.stats.max_latency, latency)
+            if self._on_sent is not None:
+                self._on_sent(HueSend(group_id, state, latency, coalesced))
@@ -10,6 +10,8 @@ except Exception as e:
     print(f"[hue] Import error: {e}. Did you run 'pip install phue'?", file=sys.stderr)
     sys.exit(1)
 
+from hue_client import HueClient
+
 # ---------- JD's bridge IP helper ----------
 
 def discover_bridge_ip(fallback_ip: str = "192.168.88.118") -> str:
@@ -67,40 +69,40 @@ def cmd_list_groups(ip: Optional[str]) -> None:
     except Exception as e:
         print(f"[hue] Could not list groups: {e}", file=sys.stderr)
 
-def cmd_set_group_hue(ip: Optional[str], name: str, hue_value: int, use_degrees: bool) -> None:
+def hue_client(ip: Optional[str] = None) -> HueClient:
+    """One cached connection + group map, reused across commands."""
+    if ip is None:
+        ip = discover_bridge_ip()
+    else:
+        print(f"[hue] Using provided IP: {ip}")
+    return HueClient(ip)
+
+def cmd_set_group_hue(ip: Optional[str], name: str, hue_value: int, use_degrees: bool,
+                      client: Optional[HueClient] = None) -> None:
     """Set a group's color using Hue 'hue' attribute."""
     try:
-        b = connect_bridge(ip); b.connect()
-        groups = b.get_group()
-        target_id = None
-        for gid, meta in groups.items():
-            if meta.get('name') == name:
-                target_id = int(gid)
-                break
-        if target_id is None:
-            print(f"[hue] Group '{name}' not found. Use --list-groups to see valid names.", file=sys.stderr)
-            return
-
+        client = client or hue_client(ip)
         hue_native = int(round(hue_value * 65535/360)) if use_degrees else hue_value
         hue_native = max(0, min(65535, hue_native))
 
-        # Turn on + set hue and moderate brightness/saturation
-        b.set_group(target_id, 'on', True)
-        b.set_group(target_id, 'bri', 200)
-        b.set_group(target_id, 'sat', 200)
-        b.set_group(target_id, 'hue', hue_native)
-        print(f"[hue] Set group '{name}' hue={hue_value}{'°' if use_degrees else ''} (native {hue_native}).")
+        # Turn on + set hue and moderate brightness/saturation in one action
+        sent = client.set_group(name, {'on': True, 'bri': 200, 'sat': 200, 'hue': hue_native})
+        note = "" if sent else " (unchanged, not resent)"
+        print(f"[hue] Set group '{name}' hue={hue_value}{'°' if use_degrees else ''} (native {hue_native}){note}.")
+    except LookupError as e:
+        print(f"[hue] {e}. Use --list-groups to see valid names.", file=sys.stderr)
     except Exception as e:
         print(f"[hue] Failed to set group '{name}': {e}", file=sys.stderr)
 
 def cmd_demo(ip: Optional[str], name: str) -> None:
     """Quick loop that cycles a few hues (blue→cyan→green→yellow→red)."""
     palette_deg = [210, 180, 120, 60, 0]
+    client = hue_client(ip)
     try:
         for h in palette_deg:
-            cmd_set_group_hue(ip, name, h, use_degrees=True)
+            cmd_set_group_hue(ip, name, h, use_degrees=True, client=client)
             time.sleep(0.7)  # ~1.4 Hz update cadence (safe)
-        print("[hue] Demo complete.")
+        print(f"[hue] Demo complete ({client.sent} requests).")
     except KeyboardInterrupt:
         print("\n[hue] Demo interrupted by user.")
 
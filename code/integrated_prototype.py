@@ -1,8 +1,9 @@
 #!/usr/bin/env python3
 """Integrated Human Resonance Project prototype.
 
-Reads newline-delimited heart-rate JSON from stdin, maintains a group BPM,
-and optionally previews/controls Philips Hue, writes CSV, and sends OSC.
+Reads newline-delimited heart-rate JSON (or hr_wire binary frames) from
+stdin, maintains a group BPM, and optionally previews/controls Philips Hue,
+writes CSV, and sends OSC.
 
 Examples
 --------
@@ -14,42 +15,107 @@ Real ANT+ input, Hue, and CSV:
     python3 -u code/ant_hr_to_json.py | python3 -u code/integrated_prototype.py \
         --group "Office" --ip 192.168.88.118 --hue --csv
 
+Also record a columnar session next to the CSV (see session_store.py):
+    ... --csv --session
+
 Add OSC:
     ... --osc --osc-ip 127.0.0.1 --osc-port 9000 --osc-addr /bpm
+OSC goes out as one bundle per --osc-tick-ms: the output BPM at --osc-addr
+plus each participant's BPM at /hr/<device_id>/bpm (see osc_sink.py).
+
+Per-beat light response through an entertainment group (see hue_entertainment.py):
+    ... --hue --hue-mode stream --group "Stage" --ip 192.168.88.118
+
+Beat-synchronous OSC /beat and light pulses predicted from RR (see beat_scheduler.py):
+    ... --beats --osc --hue --hue-mode stream
+
+An hr_batch is processed as one tick: the window moves once and every
+output gets one update carrying all of its readings (CSV still writes a
+row per reading). --per-reading restores one update per reading.
+
+With --filter, readings pass a per-device quality filter before the
+group sees them (see hr_filter.py): out-of-range values and the 0/255 ANT
+artifacts, spikes against the median of recent readings and implausibly
+fast changes are dropped, and --smooth ema|kalman smooths what is left.
+Rejected readings reach no output, the CSV included.
+
+Heart-rate variability from rr_ms (see hrv.py), sent over OSC at
+/hrv/<device>/rmssd|sdnn|pnn50 and /hrv/group/...; --light-input rmssd
+makes the lights follow it instead of the BPM (the BPM until it is known):
+    ... --hrv --osc --light-input rmssd --mapping smooth
+
+Heart-rate synchrony between participants (see hr_synchrony.py, needs
+NumPy), sent over OSC at /sync/<device> and /sync/group; --light-input
+synchrony maps 0-1 onto the lights the same way:
+    ... --sync --osc --light-input synchrony --mapping smooth
+
+Outputs run as independent asyncio sink tasks by default (see hr_async.py);
+--engine sync restores the original one-after-another loop.
 """
 
 from __future__ import annotations
 
 import argparse
-import csv
-import json
+import asyncio
+import logging
 import math
 import signal
 import sys
 import time
-from collections import deque
 from dataclasses import dataclass
-from datetime import datetime, timezone
+from datetime import datetime
 from pathlib import Path
-from statistics import fmean
-from typing import Any, Iterable, TextIO
-
-
-@dataclass(frozen=True)
-class Reading:
-    timestamp: Any
-    device_id: str
-    bpm: float
-    rr_ms: Any = None
-
-
-@dataclass(frozen=True)
-class HueState:
-    color: str
-    hue_degrees: float
-    hue_native: int
-    saturation: int
-    brightness: int
+from typing import Any
+
+from beat_scheduler import (
+    BEAT_LATENCY_MS, BeatScheduler, LightPulseSink, LogBeatSink, OscBeatSink, parse_latencies,
+)
+from csv_sink import DURABILITY, CSVSink, FlushPolicy, exit_on_signals
+from device_registry import TIMEOUT as DEVICE_TIMEOUT
+from group_aggregator import STATISTICS, GroupAggregator, GroupSnapshot
+from hr_async import (
+    AsyncEngine, SinkQueue, add_engine_arguments, parse_listen, parse_policies,
+    socket_readings, stdin_readings,
+)
+from hr_filter import add_filter_arguments, filter_from_args
+from hr_logging import ThroughputSummary, add_logging_arguments, get_logger, setup_logging
+# HueState and the mappings moved to hr_mapping; re-exported for callers.
+from hr_mapping import (
+    MAPPINGS, HueState, clamp, degrees_to_native, dramatic_mapping, is_mapping, mapping_table,
+    smooth_mapping,
+)
+# Reading and extract_readings moved to hr_readings; re-exported for callers.
+from hr_readings import BACKENDS, Reading, ReadingDecoder, extract_readings, rr_value
+from hr_synchrony import EVERY as SYNC_EVERY
+from hr_synchrony import MAX_LAG as SYNC_MAX_LAG
+from hr_synchrony import SIGNALS as SYNC_SIGNALS
+from hr_synchrony import WINDOW as SYNC_WINDOW
+from hr_synchrony import SynchronyEngine, SyncResult, synchrony_as_bpm
+from hr_wire import epoch_seconds, iso_timestamp, read_batches
+from hrv import METRICS as HRV_METRICS
+from hrv import WINDOW as HRV_WINDOW
+from hrv import HrvEngine, HrvMetrics, metric_as_bpm
+from hue_client import HueClient, HueError
+from hue_entertainment import FADE as STREAM_FADE
+from hue_entertainment import PULSE_FLOOR
+from hue_entertainment import PORT as STREAM_PORT
+from hue_entertainment import RATE as STREAM_RATE
+from hue_entertainment import EntertainmentStream, start_group_stream
+from hue_sink import HueSend, HueSink
+from osc_sink import TICK as OSC_TICK
+from osc_sink import OscBundler
+from session_store import SUFFIX as SESSION_SUFFIX
+from session_store import SessionWriter
+
+log = get_logger("prototype")
+input_log = get_logger("input")
+group_log = get_logger("group")
+
+
+# Backpressure per output when its queue is full (--sink-policy overrides).
+DEFAULT_POLICIES = {
+    "csv": "block", "session": "block", "osc": "drop-oldest", "hue": "coalesce",
+}
 
 
 def build_parser() -> argparse.ArgumentParser:
@@ -66,28 +132,164 @@ def build_parser() -> argparse.ArgumentParser:
         "--window", "-window", type=int, default=10,
         help="Group-average moving window size (default: 10)",
     )
+    parser.add_argument(
+        "--statistic", "-statistic", choices=STATISTICS, default="mean",
+        help="Group statistic across devices and the window (default: mean)",
+    )
+    parser.add_argument(
+        "--trim", "-trim", type=float, default=0.1,
+        help="Fraction cut from each end for --statistic trimmed (default: 0.1)",
+    )
+    parser.add_argument(
+        "--device-timeout", type=float, default=0.0,
+        help="Drop a device from the group after this many silent seconds, e.g. "
+        f"{DEVICE_TIMEOUT:g} (default: 0, every device stays for the whole run)",
+    )
+    add_filter_arguments(parser)
+    parser.add_argument(
+        "--per-reading", action="store_true",
+        help="Treat each reading of an hr_batch as its own tick (one output and window "
+        "step per reading) instead of one per batch",
+    )
     parser.add_argument(
         "--device", "-device",
         help="Drive outputs from one device instead of the group average",
     )
     parser.add_argument("--hue", "-hue", action="store_true", help="Enable real Hue updates")
+    parser.add_argument(
+        "--hue-mode", choices=("rest", "stream"), default="rest",
+        help="'rest' sends group actions (~1/s); 'stream' uses the Entertainment API "
+        "(--group must be an entertainment group)",
+    )
+    parser.add_argument(
+        "--stream-rate", type=float, default=STREAM_RATE,
+        help=f"Entertainment messages per second (default: {STREAM_RATE:g})",
+    )
+    parser.add_argument(
+        "--stream-fade", type=float, default=STREAM_FADE,
+        help=f"Seconds to ease streamed lights to a new colour (default: {STREAM_FADE:g})",
+    )
+    parser.add_argument(
+        "--hue-clientkey", help="Streaming client key (default: saved by hue_entertainment --pair)"
+    )
+    parser.add_argument("--stream-port", type=int, default=STREAM_PORT)
+    parser.add_argument(
+        "--stream-plain", action="store_true",
+        help="Stream unencrypted UDP, for fake_hue_bridge.py --stream-port",
+    )
     parser.add_argument("--csv", "-csv", action="store_true", help="Enable CSV logging")
     parser.add_argument(
         "--csv-dir", default=None,
         help="CSV directory (default: outputs/hr_logs under the current directory)",
     )
+    parser.add_argument(
+        "--csv-flush-rows", type=int, default=256,
+        help="Write buffered CSV rows after this many rows (default: 256)",
+    )
+    parser.add_argument(
+        "--csv-flush-ms", type=float, default=250.0,
+        help="Write buffered CSV rows at least this often in ms (default: 250)",
+    )
+    parser.add_argument(
+        "--csv-durability", choices=DURABILITY, default="os",
+        help="'os' hands each batch to the OS; 'fsync' also syncs it to disk",
+    )
+    parser.add_argument(
+        "--session", action="store_true",
+        help="Also record a columnar session (see session_store.py) in --csv-dir",
+    )
     parser.add_argument("--osc", "-osc", action="store_true", help="Enable OSC output")
     parser.add_argument("--osc-ip", "-osc-ip", default="127.0.0.1")
     parser.add_argument("--osc-port", "-osc-port", type=int, default=9000)
-    parser.add_argument("--osc-addr", "-osc-addr", default="/bpm")
+    parser.add_argument(
+        "--osc-addr", "-osc-addr", default="/bpm", help="OSC address for the output BPM"
+    )
+    parser.add_argument(
+        "--osc-device-addr", default="/hr/{device}/bpm",
+        help="Per-participant OSC address; empty disables (default: /hr/{device}/bpm)",
+    )
+    parser.add_argument(
+        "--osc-tick-ms", type=float, default=OSC_TICK * 1000,
+        help=f"Milliseconds between OSC bundles (default: {OSC_TICK * 1000:g})",
+    )
+    parser.add_argument(
+        "--beats", action="store_true",
+        help="Predict each participant's beats from RR intervals and fire OSC beat "
+        "events and streamed light pulses ahead of them",
+    )
+    parser.add_argument(
+        "--beat-addr", default="/hr/{device}/beat",
+        help="OSC address for beats; without {device} the device id is the first argument",
+    )
+    parser.add_argument(
+        "--beat-latency", action="append", metavar="SINK=MS",
+        help="Lead time per beat sink, osc or lights (defaults: "
+        + " ".join(f"{name}={ms:g}" for name, ms in BEAT_LATENCY_MS.items()) + ")",
+    )
+    parser.add_argument(
+        "--pulse-floor", type=float, default=PULSE_FLOOR,
+        help=f"Streamed light level between beats, 0-1 (default: {PULSE_FLOOR:g})",
+    )
     parser.add_argument(
         "--dry-run", "-dry-run", action="store_true",
         help="Preview network/hardware outputs without sending them",
     )
     parser.add_argument(
-        "--mapping", "-mapping", choices=("dramatic", "smooth"),
-        default="dramatic", help="BPM-to-light mapping (default: dramatic)",
+        "--mapping", "-mapping", default="dramatic",
+        help=f"BPM-to-light mapping: {' or '.join(MAPPINGS)}, or a JSON gradient palette "
+        "file (see hr_mapping.py) (default: dramatic)",
+    )
+    parser.add_argument(
+        "--light-input", choices=("bpm", *HRV_METRICS, "synchrony"), default="bpm",
+        help="What the light mapping follows: the output BPM, or an HRV metric or synchrony "
+        "scaled onto 60-120 (implies --hrv or --sync) (default: bpm)",
+    )
+    parser.add_argument(
+        "--hrv", action="store_true",
+        help="Track RMSSD, SDNN and pNN50 from rr_ms per device and for the group",
+    )
+    parser.add_argument(
+        "--hrv-window", type=float, default=HRV_WINDOW,
+        help=f"Seconds of beats behind each device's HRV (default: {HRV_WINDOW:g})",
+    )
+    parser.add_argument(
+        "--osc-hrv-addr", default="/hrv/{device}/{metric}",
+        help="OSC address for HRV metrics with --hrv; {device} is 'group' for the group "
+        "(default: /hrv/{device}/{metric})",
+    )
+    parser.add_argument(
+        "--sync", action="store_true",
+        help="Measure heart-rate synchrony between participants (see hr_synchrony.py; "
+        "needs NumPy)",
+    )
+    parser.add_argument(
+        "--sync-signal", choices=SYNC_SIGNALS, default="bpm",
+        help="Series compared for --sync: each device's BPM or RR interval (default: bpm)",
+    )
+    parser.add_argument(
+        "--sync-window", type=float, default=SYNC_WINDOW,
+        help=f"Seconds of history compared for --sync (default: {SYNC_WINDOW:g})",
     )
+    parser.add_argument(
+        "--sync-lag", type=float, default=SYNC_MAX_LAG,
+        help=f"Largest lead or lag, in seconds, still counted as in sync (default: "
+        f"{SYNC_MAX_LAG:g})",
+    )
+    parser.add_argument(
+        "--sync-every", type=float, default=SYNC_EVERY,
+        help=f"Seconds between synchrony evaluations (default: {SYNC_EVERY:g})",
+    )
+    parser.add_argument(
+        "--osc-sync-addr", default="/sync/{device}",
+        help="OSC address for synchrony with --sync; {device} is 'group' for the group "
+        "(default: /sync/{device})",
+    )
+    parser.add_argument(
+        "--decoder", "-decoder", choices=BACKENDS, default="auto",
+        help="JSON backend: auto picks msgspec, then orjson, then json (default: auto)",
+    )
+    add_engine_arguments(parser, DEFAULT_POLICIES)
+    add_logging_arguments(parser)
     return parser
 
 
@@ -96,164 +298,106 @@ def validate_args(parser: argparse.ArgumentParser, args: argparse.Namespace) ->
         parser.error("--interval must be zero or greater")
     if args.window < 1:
         parser.error("--window must be at least 1")
+    if args.device_timeout < 0:
+        parser.error("--device-timeout must be zero or greater")
+    if args.filter_window < 1:
+        parser.error("--filter-window must be at least 1")
+    if args.filter_spike < 0 or args.filter_max_rate < 0:
+        parser.error("--filter-spike and --filter-max-rate must be zero or greater")
+    if not 0 < args.smooth_alpha <= 1:
+        parser.error("--smooth-alpha must be above 0 and at most 1")
+    if args.stream_rate <= 0:
+        parser.error("--stream-rate must be greater than zero")
+    if not 0 <= args.pulse_floor <= 1:
+        parser.error("--pulse-floor must be between 0 and 1")
+    if args.csv_flush_rows < 1:
+        parser.error("--csv-flush-rows must be at least 1")
+    if args.csv_flush_ms < 0:
+        parser.error("--csv-flush-ms must be zero or greater")
+    if not 0 <= args.trim < 0.5:
+        parser.error("--trim must be at least 0 and below 0.5")
     if not 1 <= args.osc_port <= 65535:
         parser.error("--osc-port must be between 1 and 65535")
-
-
-def _reading_from_dict(value: Any) -> Reading | None:
-    if not isinstance(value, dict):
-        return None
-
-    # Accept the current project names plus a few common aliases.
-    device_id = value.get("device_id", value.get("device", value.get("id")))
-    bpm = value.get("bpm", value.get("heart_rate"))
-    if device_id is None or bpm is None:
-        return None
-
+    if args.osc_tick_ms <= 0:
+        parser.error("--osc-tick-ms must be greater than zero")
+    if args.hrv_window <= 0:
+        parser.error("--hrv-window must be greater than zero")
+    if args.light_input in HRV_METRICS:
+        args.hrv = True
+    if args.sync_window <= 0 or args.sync_every < 0:
+        parser.error("--sync-window must be greater than zero and --sync-every not negative")
+    if not 0 <= args.sync_lag < args.sync_window:
+        parser.error("--sync-lag must be at least 0 and below --sync-window")
+    if args.light_input == "synchrony":
+        args.sync = True
+    if args.log_sample < 0:
+        parser.error("--log-sample must be zero or greater")
+    if args.queue_size < 1:
+        parser.error("--queue-size must be at least 1")
+    if args.listen and args.engine != "async":
+        parser.error("--listen requires --engine async")
     try:
-        bpm_value = float(bpm)
-    except (TypeError, ValueError):
-        return None
-    if not math.isfinite(bpm_value) or bpm_value <= 0:
-        return None
-
-    timestamp = value.get("ts_iso", value.get("timestamp", value.get("ts")))
-    if timestamp is None:
-        timestamp = datetime.now(timezone.utc).isoformat()
-
-    return Reading(
-        timestamp=timestamp,
-        device_id=str(device_id),
-        bpm=bpm_value,
-        rr_ms=value.get("rr_ms"),
-    )
-
-
-def extract_readings(message: Any) -> list[Reading]:
-    """Extract readings from hr_single, hr_batch, or a bare reading object."""
-    if not isinstance(message, dict):
-        return []
-
-    message_type = message.get("type")
-    candidates: Iterable[Any]
-
-    if message_type == "hr_single":
-        candidates = [message.get("reading", message.get("data", message))]
-    elif message_type == "hr_batch":
-        batch = message.get("readings", message.get("data", message.get("batch", [])))
-        if isinstance(batch, dict):
-            batch = batch.get("readings", [])
-        candidates = batch if isinstance(batch, list) else []
-    elif "readings" in message and isinstance(message["readings"], list):
-        candidates = message["readings"]
-    else:
-        candidates = [message]
-
-    return [reading for item in candidates if (reading := _reading_from_dict(item))]
-
+        if args.listen:
+            parse_listen(args.listen)
+        parse_policies(args.sink_policy)
+        parse_latencies(args.beat_latency)
+        if not is_mapping(args.mapping):
+            raise ValueError(f"--mapping: no mapping or palette file {args.mapping!r}")
+        mapping_table(args.mapping)
+    except ValueError as exc:
+        parser.error(str(exc))
 
-def clamp(value: float, low: float, high: float) -> float:
-    return max(low, min(high, value))
 
-
-def degrees_to_native(degrees: float) -> int:
-    return round((degrees % 360.0) / 360.0 * 65535)
-
-
-def dramatic_mapping(bpm: float) -> HueState:
-    """High-contrast debug mapping intended to be obvious across a room."""
-    if bpm < 80:
-        color, degrees, brightness = "blue", 240.0, 90
-    elif bpm < 95:
-        # Green at 80 BPM, shifting toward yellow by 94 BPM.
-        ratio = (bpm - 80.0) / 15.0
-        color = "green/yellow"
-        degrees = 120.0 - (60.0 * ratio)
-        brightness = round(155 + (45 * ratio))
-    else:
-        color, degrees, brightness = "red", 0.0, 254
-
-    return HueState(
-        color=color,
-        hue_degrees=degrees,
-        hue_native=degrees_to_native(degrees),
-        saturation=254,
-        brightness=int(clamp(brightness, 1, 254)),
-    )
-
-
-def smooth_mapping(bpm: float) -> HueState:
-    """Continuous blue-to-red mapping across 60-120 BPM."""
-    ratio = (clamp(bpm, 60.0, 120.0) - 60.0) / 60.0
-    degrees = 240.0 * (1.0 - ratio)
-    brightness = round(90 + (164 * ratio))
-    return HueState(
-        color="smooth blue-to-red",
-        hue_degrees=degrees,
-        hue_native=degrees_to_native(degrees),
-        saturation=254,
-        brightness=brightness,
-    )
+def map_bpm(bpm: float, mapping: str) -> HueState:
+    return mapping_table(mapping)(bpm)
 
 
-def map_bpm(bpm: float, mapping: str) -> HueState:
-    return dramatic_mapping(bpm) if mapping == "dramatic" else smooth_mapping(bpm)
+CSV_FIELDS = [
+    "timestamp", "device_id", "bpm", "rr_ms",
+    "group_average_bpm", "output_bpm",
+]
 
 
-def create_csv_writer(csv_dir: str | None) -> tuple[TextIO, csv.DictWriter, Path]:
+def log_path(csv_dir: str | None, prefix: str, suffix: str) -> Path:
     directory = Path(csv_dir) if csv_dir else Path.cwd() / "outputs" / "hr_logs"
     directory.mkdir(parents=True, exist_ok=True)
     stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    path = directory / f"hr_log_{stamp}.csv"
+    path = directory / f"{prefix}_{stamp}{suffix}"
     counter = 2
     while path.exists():
-        path = directory / f"hr_log_{stamp}_{counter}.csv"
+        path = directory / f"{prefix}_{stamp}_{counter}{suffix}"
         counter += 1
+    return path
+
+
+def csv_timestamp(timestamp: Any) -> Any:
+    """ISO-8601 for the epoch seconds binary frames carry, as ant_to_csv writes them."""
+    if isinstance(timestamp, (int, float)):
+        return iso_timestamp(timestamp)
+    return timestamp
 
-    handle = path.open("w", newline="", encoding="utf-8")
-    fieldnames = [
-        "timestamp", "device_id", "bpm", "rr_ms",
-        "group_average_bpm", "output_bpm",
-    ]
-    writer = csv.DictWriter(handle, fieldnames=fieldnames)
-    writer.writeheader()
-    handle.flush()
-    return handle, writer, path
 
+def create_csv_writer(
+    csv_dir: str | None, policy: FlushPolicy | None = None
+) -> tuple[CSVSink, Path]:
+    path = log_path(csv_dir, "hr_log", ".csv")
+    return CSVSink(path, CSV_FIELDS, policy), path
 
-def connect_hue(ip: str | None, group_name: str):
+
+def connect_hue(ip: str | None, group_name: str) -> tuple[HueClient, int]:
+    client = HueClient(ip)
     try:
-        from phue import Bridge
-    except ImportError as exc:
-        raise RuntimeError(
-            "Hue support requires phue. Install it with: pip install phue"
-        ) from exc
-
-    bridge = Bridge(ip) if ip else Bridge()
-    bridge.connect()
-    groups = bridge.get_group()
-    group_id = next(
-        (
-            str(group_id)
-            for group_id, details in groups.items()
-            if str(details.get("name", "")).casefold() == group_name.casefold()
-        ),
-        None,
-    )
-    if group_id is None:
-        available = ", ".join(
-            sorted(str(details.get("name", group_id)) for group_id, details in groups.items())
-        )
-        raise RuntimeError(
-            f'Hue group "{group_name}" was not found. Available groups: {available or "none"}'
-        )
-    return bridge, group_id
+        group_id = client.group_id(group_name)
+    except LookupError as exc:
+        raise RuntimeError(str(exc)) from exc
+    return client, group_id
 
 
-def apply_hue(bridge: Any, group_id: str, state: HueState, interval: float) -> None:
+def apply_hue(client: HueClient, group_id: int, state: HueState, interval: float) -> bool:
+    """Send the state as one group action; False if it matched the last one sent."""
     # Hue transitiontime uses tenths of a second.
     transition = max(0, round(interval * 10))
-    bridge.set_group(
+    return client.set_group(
         group_id,
         {
             "on": True,
@@ -269,171 +413,575 @@ def format_bpm(value: float) -> str:
     return f"{value:.1f}"
 
 
-def main() -> int:
-    parser = build_parser()
-    args = parser.parse_args()
-    validate_args(parser, args)
+def describe_hue(group_name: str, bpm: float, state: HueState) -> str:
+    return (
+        f"group={group_name!r} bpm={format_bpm(bpm)} "
+        f"color={state.color} hue={state.hue_degrees:.1f}deg/"
+        f"{state.hue_native} bri={state.brightness} sat={state.saturation}"
+    )
 
-    latest_bpm: dict[str, float] = {}
-    group_history: deque[float] = deque(maxlen=args.window)
-    last_hue_update = float("-inf")
-    csv_handle: TextIO | None = None
-    csv_writer: csv.DictWriter | None = None
-    bridge = group_id = osc_client = None
 
-    print("=" * 46, flush=True)
-    print(" Integrated HR-Hue Prototype", flush=True)
-    print("=" * 46, flush=True)
-    print(
-        f"[config] group={args.group!r} mapping={args.mapping} "
-        f"window={args.window} interval={args.interval:.1f}s dry_run={args.dry_run}",
-        flush=True,
+def start_hue_sink(args: argparse.Namespace, client: HueClient | None) -> HueSink:
+    """Run Hue sends (or dry-run previews) on a coalescing worker thread."""
+    hue_log = get_logger("hue-dry-run" if args.dry_run else "hue")
+    changed: dict[Any, bool] = {}
+
+    def send(group_id: Any, update: tuple[float, HueState]) -> None:
+        if not args.dry_run:
+            changed[group_id] = apply_hue(client, group_id, update[1], args.interval)
+
+    def on_sent(sent: HueSend) -> None:
+        bpm, state = sent.state
+        if args.dry_run:
+            verb = "would set"
+        else:
+            verb = "updated" if changed.get(sent.group_id, True) else "unchanged"
+        hue_log.info(
+            "%s %s latency=%.1fms coalesced=%d",
+            verb, describe_hue(args.group, bpm, state), sent.latency * 1000, sent.coalesced,
+        )
+
+    def on_error(group_id: str, exc: Exception) -> None:
+        hue_log.error("group id=%s send failed: %s", group_id, exc)
+
+    return HueSink(send, args.interval, on_sent=on_sent, on_error=on_error).start()
+
+
+@dataclass(frozen=True)
+class GroupUpdate:
+    """One processed batch (or single reading), as handed to every output."""
+
+    readings: list[Reading]
+    snapshot: GroupSnapshot
+    output_bpm: float
+    output_source: str
+    light_bpm: float  # what the light mappings show; output_bpm unless --light-input
+    hrv: HrvMetrics | None = None  # the group's, or the --device's
+    device_hrv: dict[str, HrvMetrics] | None = None  # devices with new beats this tick
+    sync: SyncResult | None = None  # set on the ticks that evaluated synchrony
+
+    @property
+    def reading(self) -> Reading:
+        return self.readings[-1]
+
+
+class CsvOutput:
+    name = "csv"
+    blocking = True
+
+    def __init__(self, sink: CSVSink) -> None:
+        self.sink = sink
+
+    def emit(self, update: GroupUpdate) -> None:
+        group_bpm = round(update.snapshot.moving, 3)
+        output_bpm = round(update.output_bpm, 3)
+        self.sink.write_rows(
+            (csv_timestamp(reading.timestamp), *reading[1:], group_bpm, output_bpm)
+            for reading in update.readings
+        )
+
+    def close(self) -> None:
+        self.sink.close()
+        get_logger("csv").info(
+            "wrote %d rows in %d flushes", self.sink.rows_written, self.sink.flushes
+        )
+
+
+class SessionOutput:
+    """Readings appended to a columnar session, one segment per chunk."""
+
+    name = "session"
+    blocking = True
+
+    def __init__(self, writer: SessionWriter) -> None:
+        self.writer = writer
+
+    def emit(self, update: GroupUpdate) -> None:
+        self.writer.write_readings(update.readings)
+
+    def close(self) -> None:
+        self.writer.close()
+        get_logger("session").info(
+            "recorded %d readings (%d skipped) to %s",
+            self.writer.rows_written, self.writer.skipped, self.writer.path,
+        )
+
+
+class OscOutput:
+    """Output and per-participant BPMs, coalesced into one bundle per tick."""
+
+    name = "osc"
+
+    def __init__(self, args: argparse.Namespace, client: OscBundler | None) -> None:
+        self.client = client
+        self.address = args.osc_addr
+        self.device_address = args.osc_device_addr
+        self.hrv_address = args.osc_hrv_addr if args.hrv else ""
+        self.sync_address = args.osc_sync_addr if args.sync else ""
+        self.target = f"{args.osc_ip}:{args.osc_port}"
+        self.log = get_logger("osc" if client is not None else "osc-dry-run")
+        self._addresses: dict[str, str] = {}
+        self._hrv_addresses: dict[str, tuple[str, ...]] = {}
+        self._sync_addresses: dict[str, str] = {}
+
+    def emit(self, update: GroupUpdate) -> None:
+        if self.device_address:
+            for reading in update.readings:
+                device_address = self._addresses.get(reading.device_id)
+                if device_address is None:
+                    device_address = self.device_address.format(device=reading.device_id)
+                    self._addresses[reading.device_id] = device_address
+                if self.client is not None:
+                    self.client.set(device_address, float(reading.bpm))
+        if self.client is not None:
+            self.client.set(self.address, float(update.output_bpm))
+            if self.hrv_address:
+                for device_id, metrics in (update.device_hrv or {}).items():
+                    self._send_hrv(device_id, metrics)
+                if update.hrv is not None:
+                    self._send_hrv("group", update.hrv)
+            if self.sync_address and update.sync is not None:
+                self._send_sync(update.sync)
+        self.log.debug(
+            "%s %d device BPM(s), %s %.1f -> %s",
+            "queued" if self.client is not None else "would send",
+            len(update.readings) if self.device_address else 0,
+            self.address, update.output_bpm, self.target,
+        )
+
+    def _send_hrv(self, device_id: str, metrics: HrvMetrics) -> None:
+        addresses = self._hrv_addresses.get(device_id)
+        if addresses is None:
+            addresses = self._hrv_addresses[device_id] = tuple(
+                self.hrv_address.format(device=device_id, metric=metric)
+                for metric in HRV_METRICS
+            )
+        for address, metric in zip(addresses, HRV_METRICS):
+            self.client.set(address, float(metrics.value(metric)))
+
+    def _send_sync(self, result: SyncResult) -> None:
+        addresses = self._sync_addresses
+        for device_id, value in (("group", result.group), *result.devices.items()):
+            address = addresses.get(device_id)
+            if address is None:
+                address = addresses[device_id] = self.sync_address.format(device=device_id)
+            if not math.isnan(value):
+                self.client.set(address, float(value))
+
+    def close(self) -> None:
+        if self.client is None:
+            return
+        self.client.close()
+        stats = self.client.stats
+        self.log.info(
+            "messages=%d datagrams=%d coalesced=%d errors=%d",
+            stats.messages, stats.datagrams, stats.coalesced, stats.errors,
+        )
+
+
+class HueOutput:
+    name = "hue"
+
+    def __init__(
+        self,
+        args: argparse.Namespace,
+        sink: HueSink,
+        group_key: Any,
+        client: HueClient | None = None,
+    ) -> None:
+        self.sink = sink
+        self.group_key = group_key
+        self.client = client
+        self.mapping = mapping_table(args.mapping)
+
+    def emit(self, update: GroupUpdate) -> None:
+        state = self.mapping(update.light_bpm)
+        self.sink.submit(self.group_key, (update.light_bpm, state))
+
+    def close(self) -> None:
+        self.sink.close()
+        stats = self.sink.stats
+        get_logger("hue").info(
+            "sent=%d coalesced=%d failed=%d mean_latency=%.1fms max_latency=%.1fms",
+            stats.sent, stats.coalesced, stats.failed,
+            stats.mean_latency * 1000, stats.max_latency * 1000,
+        )
+        if self.client is not None:
+            get_logger("hue").info(
+                "bridge requests=%d unchanged_skipped=%d", self.client.sent, self.client.skipped
+            )
+
+
+class HueStreamOutput:
+    """Hue through the Entertainment API: each update shows within a frame."""
+
+    name = "hue"
+
+    def __init__(self, args: argparse.Namespace, stream: EntertainmentStream) -> None:
+        self.stream = stream
+        self.mapping = mapping_table(args.mapping)
+
+    def emit(self, update: GroupUpdate) -> None:
+        state = self.mapping(update.light_bpm)
+        self.stream.set_hsb(state.hue_native, state.saturation, state.brightness)
+
+    def close(self) -> None:
+        hue_log = get_logger("hue")
+        try:
+            self.stream.close()
+        except (HueError, OSError) as exc:
+            hue_log.warning("could not switch streaming off: %s", exc)
+        stats = self.stream.stats
+        hue_log.info(
+            "streamed frames=%d late=%d errors=%d", stats.frames, stats.late, stats.errors
+        )
+
+
+class BeatOutput:
+    """Feed readings to the beat scheduler, whose thread fires the beat sinks."""
+
+    name = "beats"
+
+    def __init__(self, scheduler: BeatScheduler) -> None:
+        self.scheduler = scheduler
+
+    def emit(self, update: GroupUpdate) -> None:
+        observe = self.scheduler.observe
+        for reading in update.readings:
+            observe(reading.device_id, reading.rr_ms, reading.bpm)
+
+    def close(self) -> None:
+        self.scheduler.close()
+        stats = self.scheduler.stats
+        get_logger("beats").info(
+            "fired=%d late=%d errors=%d max_lateness=%.1fms",
+            stats.fired, stats.late, stats.errors, stats.max_lateness * 1000,
+        )
+
+
+def fold_hrv(engine: HrvEngine, readings: list[Reading]) -> dict[str, HrvMetrics]:
+    """Add the readings' RR to ``engine``; metrics of the devices that had beats."""
+    updated = {}
+    for reading in readings:
+        if reading.rr_ms is None:
+            continue
+        if engine.add(reading.device_id, reading.rr_ms, epoch_seconds(reading.timestamp)):
+            metrics = engine.device(reading.device_id)
+            if metrics is not None:
+                updated[reading.device_id] = metrics
+    return updated
+
+
+def fold_sync(
+    engine: SynchronyEngine, readings: list[Reading], signal: str, now: float
+) -> SyncResult | None:
+    """Feed the readings to ``engine``; a fresh result when an evaluation was due."""
+    for reading in readings:
+        value = reading.bpm if signal == "bpm" else rr_value(reading.rr_ms)
+        if not math.isnan(value):
+            engine.update(reading.device_id, value)
+    engine.advance(now)
+    return engine.compute(now) if engine.due(now) else None
+
+
+class Prototype:
+    """The prototype's processing core, independent of where readings come from.
+
+    ``main`` feeds it from stdin; hr_session_runner's in-process mode feeds
+    it straight from a generator.
+    """
+
+    def __init__(self, args: argparse.Namespace, outputs: list[Any]) -> None:
+        self.args = args
+        self.outputs = outputs
+        self.group = GroupAggregator(
+            args.window, args.statistic, args.trim, args.device_timeout or None
+        )
+        self.filter = filter_from_args(args)
+        self.hrv = HrvEngine(args.hrv_window) if args.hrv else None
+        self.sync = None
+        if args.sync:
+            self.sync = SynchronyEngine(
+                args.sync_window, max_lag=args.sync_lag, every=args.sync_every
+            )
+        self.summary = ThroughputSummary()
+
+    def process(self, readings: list[Reading]) -> GroupUpdate | None:
+        """Fold readings into the group as one tick and decide the output BPM."""
+        args = self.args
+        now = time.monotonic()
+        for device_id in self.group.expire(now):
+            group_log.info(
+                "device=%s silent for %gs, left the group", device_id, args.device_timeout
+            )
+            if self.filter is not None:
+                self.filter.forget(device_id)
+            if self.hrv is not None:
+                self.hrv.remove(device_id)
+            if self.sync is not None:
+                self.sync.remove(device_id)
+        quality = None
+        if self.filter is not None:
+            readings = self.filter.apply(readings)
+            if not readings:
+                return None
+            quality = self.filter.quality
+        if len(readings) == 1:
+            reading = readings[0]
+            snapshot = self.group.update(
+                reading.device_id, reading.bpm, reading.rr_ms, now,
+                1.0 if quality is None else quality(reading.device_id),
+            )
+            self.summary.record(reading.device_id)
+        else:
+            snapshot = self.group.update_many(
+                ((r.device_id, r.bpm, r.rr_ms) for r in readings), now, quality
+            )
+            self.summary.record_many([r.device_id for r in readings])
+        device_hrv = fold_hrv(self.hrv, readings) if self.hrv is not None else None
+        sync = None
+        if self.sync is not None:
+            sync = fold_sync(self.sync, readings, args.sync_signal, now)
+
+        if args.device is not None:
+            if args.device not in self.group:
+                input_log.debug(
+                    "readings=%d | waiting for selected device=%s", len(readings), args.device
+                )
+                return None
+            output_bpm = self.group.get(args.device)
+            output_source = f"device {args.device}"
+        else:
+            output_bpm = snapshot.moving
+            output_source = "group moving average"
+
+        if input_log.isEnabledFor(logging.DEBUG):
+            for reading in readings:
+                input_log.debug(
+                    "device=%s bpm=%.1f rr_ms=%s", reading.device_id, reading.bpm, reading.rr_ms
+                )
+        group_log.debug(
+            "readings=%d devices=%d current=%.1f moving=%.1f output=%.1f source=%s",
+            len(readings), snapshot.devices, snapshot.current, snapshot.moving,
+            output_bpm, output_source,
+        )
+        hrv = None
+        light_bpm = output_bpm
+        if self.hrv is not None:
+            hrv = self.hrv.group() if args.device is None else self.hrv.device(args.device)
+            if hrv is not None and args.light_input in HRV_METRICS:
+                light_bpm = metric_as_bpm(args.light_input, hrv.value(args.light_input))
+        if self.sync is not None and args.light_input == "synchrony":
+            result = self.sync.result
+            value = result.group if args.device is None else result.devices.get(args.device)
+            if value is not None and not math.isnan(value):
+                light_bpm = synchrony_as_bpm(value)
+        return GroupUpdate(
+            readings, snapshot, output_bpm, output_source, light_bpm, hrv, device_hrv, sync
+        )
+
+    def emit(self, update: GroupUpdate) -> None:
+        for output in self.outputs:
+            output.emit(update)
+
+    def updates(self, readings: list[Reading]) -> list[GroupUpdate]:
+        """One update per batch, or per reading with --per-reading."""
+        if self.args.per_reading:
+            batches: Any = ([reading] for reading in readings)
+        else:
+            batches = (readings,)
+        return [update for batch in batches if (update := self.process(batch))]
+
+    def handle(self, readings: list[Reading]) -> None:
+        for update in self.updates(readings):
+            self.emit(update)
+
+    def close(self) -> None:
+        self.summary.flush()
+        if self.filter is not None:
+            for device_id, stats in self.filter.stats().items():
+                if stats.rejected:
+                    input_log.info(
+                        "device=%s filtered: accepted=%d rejected range=%d spike=%d rate=%d",
+                        device_id, stats.accepted, stats.range, stats.spike, stats.rate,
+                    )
+        for output in self.outputs:
+            output.close()
+
+
+def open_beat_scheduler(
+    args: argparse.Namespace, osc_client: Any, stream: EntertainmentStream | None
+) -> BeatScheduler:
+    latency = parse_latencies(args.beat_latency)
+    beat_log = get_logger("beats")
+    sinks: list[Any] = []
+    if args.osc:
+        if osc_client is None:
+            sinks.append(LogBeatSink("osc", latency["osc"]))
+        else:
+            sinks.append(OscBeatSink(osc_client, args.beat_addr, latency["osc"]))
+    if stream is not None:
+        stream.pulse_floor = args.pulse_floor
+        sinks.append(LightPulseSink(stream, latency["lights"], args.device))
+    elif args.dry_run:
+        sinks.append(LogBeatSink("lights", latency["lights"]))
+    elif args.hue:
+        beat_log.warning("light pulses need --hue-mode stream; REST updates stay at --interval")
+    beat_log.info(
+        "beat sinks: %s",
+        ", ".join(f"{sink.name} (-{sink.latency * 1000:g}ms)" for sink in sinks) or "none",
     )
+    return BeatScheduler(sinks).start()
+
 
+def open_prototype(args: argparse.Namespace) -> Prototype:
+    """Connect the outputs selected in ``args``; the caller must close() it."""
+    outputs: list[Any] = []
     try:
         if args.csv:
-            csv_handle, csv_writer, csv_path = create_csv_writer(args.csv_dir)
-            print(f"[csv] logging to {csv_path}", flush=True)
+            policy = FlushPolicy(
+                max_rows=args.csv_flush_rows,
+                max_delay=args.csv_flush_ms / 1000.0,
+                durability=args.csv_durability,
+            )
+            csv_sink, csv_path = create_csv_writer(args.csv_dir, policy)
+            outputs.append(CsvOutput(csv_sink))
+            get_logger("csv").info("logging to %s", csv_path)
+        if args.session:
+            writer = SessionWriter(log_path(args.csv_dir, "hr_session", SESSION_SUFFIX))
+            outputs.append(SessionOutput(writer))
+            get_logger("session").info("recording to %s", writer.path)
+
+        osc_client = stream = None
+        if args.osc:
+            if args.dry_run:
+                get_logger("osc-dry-run").info(
+                    "previewing %s -> %s:%d", args.osc_addr, args.osc_ip, args.osc_port
+                )
+            else:
+                osc_client = OscBundler(
+                    args.osc_ip, args.osc_port, args.osc_tick_ms / 1000.0
+                ).start()
+                get_logger("osc").info(
+                    "enabled -> %s:%d addr=%s devices=%s", args.osc_ip, args.osc_port,
+                    args.osc_addr, args.osc_device_addr or "off",
+                )
+            outputs.append(OscOutput(args, osc_client))
 
+        client = group_id = None
         if args.hue and not args.dry_run:
-            print(f"[hue] connecting to bridge at {args.ip or 'auto-discovery'}...", flush=True)
-            bridge, group_id = connect_hue(args.ip, args.group)
-            print(f"[hue] connected; group={args.group!r} id={group_id}", flush=True)
+            hue_log = get_logger("hue")
+            hue_log.info("connecting to bridge at %s...", args.ip or "auto-discovery")
+            client, group_id = connect_hue(args.ip, args.group)
+            hue_log.info("connected; group=%r id=%s", args.group, group_id)
         elif args.dry_run:
-            print("[hue-dry-run] hardware updates will only be previewed", flush=True)
-
-        if args.osc and not args.dry_run:
-            try:
-                from pythonosc.udp_client import SimpleUDPClient
-            except ImportError as exc:
-                raise RuntimeError(
-                    "OSC support requires python-osc. Install it with: pip install python-osc"
-                ) from exc
-            osc_client = SimpleUDPClient(args.osc_ip, args.osc_port)
-            print(
-                f"[osc] enabled -> {args.osc_ip}:{args.osc_port} addr={args.osc_addr}",
-                flush=True,
+            get_logger("hue-dry-run").info("hardware updates will only be previewed")
+        if client is not None and args.hue_mode == "stream":
+            stream = start_group_stream(
+                client, group_id, args.hue_clientkey, args.stream_plain, args.stream_port,
+                args.stream_rate, args.stream_fade,
             )
-        elif args.osc and args.dry_run:
-            print(
-                f"[osc-dry-run] previewing {args.osc_addr} -> "
-                f"{args.osc_ip}:{args.osc_port}",
-                flush=True,
+            get_logger("hue").info(
+                "streaming to %d light(s) at %g Hz", len(stream.lights), args.stream_rate
             )
+            outputs.append(HueStreamOutput(args, stream))
+        elif args.hue or args.dry_run:
+            group_key = args.group if client is None else group_id
+            outputs.append(HueOutput(args, start_hue_sink(args, client), group_key, client))
+
+        if args.beats:
+            # first, so it is closed (and stops firing) before the sinks it fires into
+            outputs.insert(0, BeatOutput(open_beat_scheduler(args, osc_client, stream)))
+        return Prototype(args, outputs)
+    except BaseException:
+        for output in outputs:
+            output.close()
+        raise
+
+
+async def run_async(
+    args: argparse.Namespace, prototype: Prototype, decoder: ReadingDecoder, skipped, empty
+) -> None:
+    """Feed the prototype from stdin or TCP and fan updates out to sink tasks."""
+    policies = {**DEFAULT_POLICIES, **parse_policies(args.sink_policy)}
+    sinks = [
+        SinkQueue(output.name, output, policies.get(output.name, "block"), args.queue_size)
+        for output in prototype.outputs
+    ]
+    engine = AsyncEngine(prototype.updates, sinks, args.metrics_interval)
+    engine.stop_on_signals()
+    if args.listen:
+        host, port = parse_listen(args.listen)
+        source = socket_readings(host, port, decoder)
+    else:
+        source = stdin_readings(sys.stdin.buffer, decoder, skipped, empty)
+    await engine.run(source)
 
-        print("[input] listening for newline-delimited HR JSON on stdin", flush=True)
 
-        for line_number, line in enumerate(sys.stdin, start=1):
-            line = line.strip()
-            if not line:
-                continue
-            try:
-                message = json.loads(line)
-            except json.JSONDecodeError as exc:
-                # Upstream scripts may print human-readable startup messages.
-                print(f"[input-warning] line={line_number} skipped non-JSON input: {exc.msg}", flush=True)
-                continue
+def main() -> int:
+    parser = build_parser()
+    args = parser.parse_args()
+    validate_args(parser, args)
+    listener = setup_logging(
+        args.log_level, stream=sys.stdout, error_stream=sys.stderr, sample=args.log_sample
+    )
+    prototype: Prototype | None = None
 
-            readings = extract_readings(message)
-            if not readings:
-                print(f"[input-warning] line={line_number} contains no valid HR readings", flush=True)
-                continue
+    print("=" * 46, flush=True)
+    print(" Integrated HR-Hue Prototype", flush=True)
+    print("=" * 46, flush=True)
+    get_logger("config").info(
+        "group=%r mapping=%s statistic=%s window=%d interval=%.1fs dry_run=%s",
+        args.group, args.mapping, args.statistic, args.window, args.interval, args.dry_run,
+    )
 
-            for reading in readings:
-                latest_bpm[reading.device_id] = reading.bpm
-                raw_group_average = fmean(latest_bpm.values())
-                group_history.append(raw_group_average)
-                moving_group_average = fmean(group_history)
-
-                if args.device is not None:
-                    if args.device not in latest_bpm:
-                        print(
-                            f"[input] device={reading.device_id} bpm={format_bpm(reading.bpm)} | "
-                            f"waiting for selected device={args.device}",
-                            flush=True,
-                        )
-                        continue
-                    output_bpm = latest_bpm[args.device]
-                    output_source = f"device {args.device}"
-                else:
-                    output_bpm = moving_group_average
-                    output_source = "group moving average"
-
-                print(
-                    f"[input] device={reading.device_id} bpm={format_bpm(reading.bpm)} "
-                    f"rr_ms={reading.rr_ms}",
-                    flush=True,
-                )
-                print(
-                    f"[group] devices={len(latest_bpm)} current={format_bpm(raw_group_average)} "
-                    f"moving={format_bpm(moving_group_average)} output={format_bpm(output_bpm)} "
-                    f"source={output_source}",
-                    flush=True,
-                )
+    try:
+        prototype = open_prototype(args)
+        decoder = ReadingDecoder(args.decoder)
 
-                if csv_writer is not None and csv_handle is not None:
-                    csv_writer.writerow(
-                        {
-                            "timestamp": reading.timestamp,
-                            "device_id": reading.device_id,
-                            "bpm": reading.bpm,
-                            "rr_ms": reading.rr_ms,
-                            "group_average_bpm": round(moving_group_average, 3),
-                            "output_bpm": round(output_bpm, 3),
-                        }
-                    )
-                    csv_handle.flush()
-                    print("[csv] wrote 1 row", flush=True)
-
-                if args.osc:
-                    if args.dry_run:
-                        print(
-                            f"[osc-dry-run] would send {args.osc_addr} "
-                            f"{format_bpm(output_bpm)} -> {args.osc_ip}:{args.osc_port}",
-                            flush=True,
-                        )
-                    else:
-                        osc_client.send_message(args.osc_addr, float(output_bpm))
-                        print(
-                            f"[osc] sent {args.osc_addr} {format_bpm(output_bpm)} -> "
-                            f"{args.osc_ip}:{args.osc_port}",
-                            flush=True,
-                        )
-
-                now = time.monotonic()
-                should_update_hue = (args.hue or args.dry_run) and (
-                    now - last_hue_update >= args.interval
+        def skipped(line_number: int, reason: str) -> None:
+            # Upstream scripts may print human-readable startup messages.
+            input_log.warning("line=%d skipped non-JSON input: %s", line_number, reason)
+
+        def empty(line_number: int) -> None:
+            input_log.warning("line=%d contains no valid HR readings", line_number)
+
+        if args.engine == "async":
+            if not args.listen:
+                input_log.info(
+                    "listening for HR JSON or binary frames on stdin (decoder=%s, engine=async)",
+                    decoder.backend,
                 )
-                if should_update_hue:
-                    state = map_bpm(output_bpm, args.mapping)
-                    detail = (
-                        f"group={args.group!r} bpm={format_bpm(output_bpm)} "
-                        f"color={state.color} hue={state.hue_degrees:.1f}deg/"
-                        f"{state.hue_native} bri={state.brightness} sat={state.saturation}"
-                    )
-                    if args.dry_run:
-                        print(f"[hue-dry-run] would set {detail}", flush=True)
-                    else:
-                        apply_hue(bridge, group_id, state, args.interval)
-                        print(f"[hue] updated {detail}", flush=True)
-                    last_hue_update = now
+            asyncio.run(run_async(args, prototype, decoder, skipped, empty))
+        else:
+            input_log.info(
+                "listening for HR JSON or binary frames on stdin (decoder=%s, engine=sync)",
+                decoder.backend,
+            )
+            for line_number, readings in read_batches(sys.stdin.buffer, decoder, skipped):
+                if not readings:
+                    empty(line_number)
+                    continue
+                prototype.handle(readings)
 
     except KeyboardInterrupt:
-        print("\n[prototype] stopped by user", flush=True)
+        log.info("stopped by user")
     except BrokenPipeError:
         return 0
     except RuntimeError as exc:
-        print(f"[error] {exc}", file=sys.stderr, flush=True)
+        log.error("%s", exc)
         return 1
     finally:
-        if csv_handle is not None:
-            csv_handle.close()
+        if prototype is not None:
+            prototype.close()
+        log.info("stopped.")
+        listener.stop()
 
-    print("[prototype] stopped.", flush=True)
     return 0
 
 
 if __name__ == "__main__":
     # Let Ctrl+C reach the normal KeyboardInterrupt handler on all platforms.
     signal.signal(signal.SIGINT, signal.default_int_handler)
-    raise SystemExit(main())
\ No newline at end of file
+    exit_on_signals()
+    raise SystemExit(main())
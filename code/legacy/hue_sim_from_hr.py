@@ -18,7 +18,11 @@ Every --interval seconds, this script:
 """
 
 import argparse, sys, json, time
-from collections import deque
+from pathlib import Path
+
+# Share the incremental aggregator that lives one directory up in code/.
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from group_aggregator import MovingStatistic
 
 def map_bpm_to_hue_deg(bpm: float, lo: float = 60.0, hi: float = 120.0) -> float:
     """
@@ -34,16 +38,48 @@ def map_bpm_to_hue_deg(bpm: float, lo: float = 60.0, hi: float = 120.0) -> float
     t = (bpm - lo) / (hi - lo)
     return 210.0 * (1.0 - t)
 
+class HueSimulator:
+    """
+    The colour logic on its own, so hr_session_runner --inproc can feed it
+    readings directly. With echo=True each reading is also printed as a
+    ts= line for hr_session_runner --report.
+    """
+
+    def __init__(self, group="Gallery", interval=2.0, window=50, echo=False):
+        self.group = group
+        self.interval = interval
+        self.window = MovingStatistic(window)  # running average over recent BPM readings
+        self.echo = echo
+        self.last_update = time.time()
+
+    def push(self, bpm, ts=None):
+        self.window.push(float(bpm))
+        if self.echo:
+            print(f"[sim-hue] ts={ts} bpm={bpm}")
+
+    def tick(self, now=None):
+        """Print the group colour if --interval has passed since the last one."""
+        now = time.time() if now is None else now
+        if now - self.last_update >= self.interval and len(self.window):
+            avg_bpm = self.window.value()
+            hue_deg = map_bpm_to_hue_deg(avg_bpm)
+            hue_native = int(round(hue_deg * 65535/360))
+
+            print(
+                f"[sim-hue] group='{self.group}' "
+                f"avg_bpm={avg_bpm:.1f} → hue_deg={hue_deg:.1f}°, native={hue_native}"
+            )
+            self.last_update = now
+
 def main():
     ap = argparse.ArgumentParser(description="Simulate Hue group color from HR JSON (no bridge)")
     ap.add_argument("--group", default="Gallery", help="virtual group name")
     ap.add_argument("--interval", type=float, default=2.0, help="seconds between color updates")
     ap.add_argument("--window", type=int, default=50, help="how many recent readings to average")
+    ap.add_argument("--echo", action="store_true", help="also print each reading as a ts= line")
     args = ap.parse_args()
 
-    # store recent BPM readings
-    window = deque(maxlen=args.window)
-    last_update = time.time()
+    sim = HueSimulator(args.group, args.interval, args.window, args.echo)
 
     print(f"[sim-hue] listening for HR JSON on stdin; group='{args.group}'", file=sys.stderr)
     print(f"[sim-hue] update interval={args.interval}s, window={args.window} readings", file=sys.stderr)
@@ -61,27 +97,17 @@ def main():
 
             # accept both hr_single and hr_batch from ant_test.py
             if msg.get("type") == "hr_single":
-                reading = msg.get("reading", {})
-                bpm = reading.get("bpm")
-                if isinstance(bpm, (int, float)):
-                    window.append(float(bpm))
+                readings = [msg.get("reading", {})]
             elif msg.get("type") == "hr_batch":
-                for r in msg.get("readings", []):
-                    bpm = r.get("bpm")
-                    if isinstance(bpm, (int, float)):
-                        window.append(float(bpm))
-
-            now = time.time()
-            if now - last_update >= args.interval and window:
-                avg_bpm = sum(window) / len(window)
-                hue_deg = map_bpm_to_hue_deg(avg_bpm)
-                hue_native = int(round(hue_deg * 65535/360))
-
-                print(
-                    f"[sim-hue] group='{args.group}' "
-                    f"avg_bpm={avg_bpm:.1f} → hue_deg={hue_deg:.1f}°, native={hue_native}"
-                )
-                last_update = now
+                readings = msg.get("readings", [])
+            else:
+                readings = []
+            for r in readings:
+                bpm = r.get("bpm")
+                if isinstance(bpm, (int, float)):
+                    sim.push(bpm, r.get("ts_iso"))
+
+            sim.tick()
 
     except KeyboardInterrupt:
         print("\n[sim-hue] stopped by user", file=sys.stderr)
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""Batched OSC output over one UDP socket.
+
+``SimpleUDPClient.send_message`` costs one datagram per message, so the
+packet rate grew with every reading and participant. ``OscBundler`` instead
+collects messages and sends them as timestamped OSC bundles, one per
+``tick``:
+
+- ``set(address, *args)`` keeps only the newest value per address until the
+  next tick. BPMs work this way, since a receiver only needs the latest.
+- ``send(address, *args)`` queues an event that is always delivered. Its
+  timing matters (beats), so it is flushed within ``event_delay`` rather
+  than at the next tick; events that close together share a datagram.
+
+Messages are encoded here rather than through python-osc. Each address
+pattern and type-tag prefix is encoded once and cached, and a bundle larger
+than ``max_datagram`` is split so nothing is fragmented.
+"""
+
+from __future__ import annotations
+
+import socket
+import struct
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any
+
+from hr_logging import get_logger
+
+log = get_logger("osc")
+
+TICK = 0.02
+EVENT_DELAY = 0.002
+MAX_DATAGRAM = 1400  # stays inside one Ethernet frame
+NTP_EPOCH = 2208988800  # seconds from 1900 (OSC time tags) to 1970
+BUNDLE = b"#bundle\x00"
+
+
+def _pad(data: bytes) -> bytes:
+    return data + b"\x00" * (4 - len(data) % 4)
+
+
+def _encode_arg(value: Any) -> tuple[bytes, bytes]:
+    if isinstance(value, bool):
+        return (b"T" if value else b"F"), b""
+    if isinstance(value, int):
+        return b"i", struct.pack(">i", value)
+    if isinstance(value, float):
+        return b"f", struct.pack(">f", value)
+    if isinstance(value, str):
+        return b"s", _pad(value.encode())
+    raise TypeError(f"cannot send {type(value).__name__} over OSC")
+
+
+def encode_message(address: str, args: tuple[Any, ...], cache: dict | None = None) -> bytes:
+    """One OSC message; ``cache`` keeps the encoded address/type-tag prefixes."""
+    tags, data = [], []
+    for value in args:
+        tag, payload = _encode_arg(value)
+        tags.append(tag)
+        data.append(payload)
+    key = (address, b"".join(tags))
+    prefix = None if cache is None else cache.get(key)
+    if prefix is None:
+        prefix = _pad(address.encode()) + _pad(b"," + key[1])
+        if cache is not None:
+            cache[key] = prefix
+    return prefix + b"".join(data)
+
+
+def time_tag(now: float | None = None) -> bytes:
+    """An OSC (NTP) time tag for wall-clock time ``now``."""
+    now = time.time() if now is None else now
+    seconds = int(now) + NTP_EPOCH
+    return struct.pack(">II", seconds & 0xFFFFFFFF, int((now % 1.0) * (1 << 32)))
+
+
+def encode_bundles(
+    messages: list[bytes], tag: bytes, max_datagram: int = MAX_DATAGRAM
+) -> list[bytes]:
+    """Pack messages into as few bundles as fit in ``max_datagram`` bytes each."""
+    bundles, parts, size = [], [BUNDLE, tag], len(BUNDLE) + len(tag)
+    for message in messages:
+        element = struct.pack(">i", len(message)) + message
+        if len(parts) > 2 and size + len(element) > max_datagram:
+            bundles.append(b"".join(parts))
+            parts, size = [BUNDLE, tag], len(BUNDLE) + len(tag)
+        parts.append(element)
+        size += len(element)
+    if len(parts) > 2:
+        bundles.append(b"".join(parts))
+    return bundles
+
+
+@dataclass
+class BundlerStats:
+    messages: int = 0
+    coalesced: int = 0  # set() values replaced before they were sent
+    datagrams: int = 0
+    errors: int = 0
+
+
+class OscBundler:
+    """Latest values and events, flushed as bundles every ``tick`` seconds."""
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        tick: float = TICK,
+        event_delay: float = EVENT_DELAY,
+        max_datagram: int = MAX_DATAGRAM,
+    ) -> None:
+        self.target = (host, port)
+        self.tick = tick
+        self.event_delay = event_delay
+        self.max_datagram = max_datagram
+        self.stats = BundlerStats()
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._cache: dict[tuple[str, bytes], bytes] = {}
+        self._values: dict[str, tuple[Any, ...]] = {}
+        self._events: list[tuple[str, tuple[Any, ...]]] = []
+        self._event_due = float("inf")
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="osc-bundler", daemon=True)
+
+    def start(self) -> OscBundler:
+        self._thread.start()
+        return self
+
+    def close(self) -> None:
+        """Send whatever is pending and stop; later calls are ignored."""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify()
+        if self._thread.is_alive():
+            self._thread.join(2.0)
+        self._flush()
+        self._sock.close()
+
+    def set(self, address: str, *args: Any) -> None:
+        with self._cond:
+            if self._closed:
+                return
+            if address in self._values:
+                self.stats.coalesced += 1
+            self._values[address] = args
+
+    def send(self, address: str, *args: Any) -> None:
+        with self._cond:
+            if self._closed:
+                return
+            if not self._events:
+                self._event_due = time.monotonic() + self.event_delay
+                self._cond.notify()
+            self._events.append((address, args))
+
+    def _run(self) -> None:
+        due = time.monotonic() + self.tick
+        while True:
+            with self._cond:
+                while not self._closed:
+                    wait = min(due, self._event_due) - time.monotonic()
+                    if wait <= 0:
+                        break
+                    self._cond.wait(wait)
+                if self._closed:
+                    return
+            self._flush()
+            now = time.monotonic()
+            if now >= due:
+                due = max(due + self.tick, now)
+
+    def _flush(self) -> None:
+        with self._cond:
+            values, self._values = self._values, {}
+            events, self._events = self._events, []
+            self._event_due = float("inf")
+        if not values and not events:
+            return
+        messages = [encode_message(a, args, self._cache) for a, args in values.items()]
+        messages += [encode_message(a, args, self._cache) for a, args in events]
+        for bundle in encode_bundles(messages, time_tag(), self.max_datagram):
+            try:
+                self._sock.sendto(bundle, self.target)
+                self.stats.datagrams += 1
+            except OSError as exc:
+                self.stats.errors += 1
+                if self.stats.errors == 1:
+                    log.warning("send to %s:%d failed: %s", *self.target, exc)
+        self.stats.messages += len(messages)
@@ -0,0 +1,489 @@
+#!/usr/bin/env python3
+"""Columnar session storage for recorded readings.
+
+CSV logs keep one text row per reading with an ISO timestamp, so every
+analysis pass parses the whole file again. A session store keeps the same
+readings as four typed columns instead:
+
+    ts      int64    epoch nanoseconds
+    device  uint32   device id (the same numeric ids hr_wire.py carries)
+    bpm     float32
+    rr      float32  latest RR interval in ms, NaN when absent
+
+A session is a directory of ``.npy`` segments plus a ``session.json``
+manifest. ``SessionWriter`` buffers readings in ``array`` columns and
+appends one segment per ``chunk_rows`` readings (or ``max_age`` seconds),
+so recording needs only the standard library. The manifest is replaced
+atomically after each segment, so a crash loses at most the open chunk.
+On close the segments are joined into one file per column.
+
+``load_session`` memory-maps the columns with NumPy, so opening an
+hours-long session reads only the manifest. A path ending in ``.parquet``
+is written and read through pyarrow instead (one row group per chunk).
+Both are optional and only imported where they are needed.
+
+Convert existing logs (anything hr_logreader.py reads: CSV, JSONL, .gz):
+    python3 code/session_store.py outputs/hr_logs/hr_log_001.csv
+    python3 code/session_store.py --info outputs/hr_logs/hr_log_001.session
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import os
+import struct
+import sys
+import time
+from array import array
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any
+
+from hr_logreader import iter_log_readings
+from hr_readings import Reading, rr_value
+
+MANIFEST = "session.json"
+VERSION = 1
+CHUNK_ROWS = 65536
+MAX_AGE = 60.0
+SUFFIX = ".session"
+
+# column -> (NumPy dtype, array typecode)
+COLUMNS = {
+    "ts": ("<i8", "q"),
+    "device": ("<u4", next(code for code in "IL" if array(code).itemsize == 4)),
+    "bpm": ("<f4", "f"),
+    "rr": ("<f4", "f"),
+}
+NPY_MAGIC = b"\x93NUMPY\x01\x00"
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def epoch_ns(timestamp: Any) -> int:
+    """Epoch nanoseconds from epoch seconds or an ISO-8601 string."""
+    if isinstance(timestamp, (int, float)) and not isinstance(timestamp, bool):
+        return round(timestamp * 1_000_000_000)
+    if isinstance(timestamp, datetime):
+        parsed = timestamp
+    elif isinstance(timestamp, str):
+        text = timestamp.strip()
+        try:
+            return round(float(text) * 1_000_000_000)
+        except ValueError:
+            pass
+        parsed = datetime.fromisoformat(text[:-1] + "+00:00" if text.endswith("Z") else text)
+    else:
+        raise ValueError(f"unsupported timestamp {timestamp!r}")
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return (parsed - EPOCH) // timedelta(microseconds=1) * 1000
+
+
+def _npy_header(descr: str, rows: int) -> bytes:
+    header = f"{{'descr': '{descr}', 'fortran_order': False, 'shape': ({rows},), }}"
+    # NumPy pads the header so the data starts on a 64-byte boundary
+    header += " " * (-(len(NPY_MAGIC) + 2 + len(header) + 1) % 64) + "\n"
+    return NPY_MAGIC + struct.pack("<H", len(header)) + header.encode("latin1")
+
+
+def _npy_data_offset(handle: Any) -> int:
+    prefix = handle.read(len(NPY_MAGIC) + 2)
+    if prefix[:6] != NPY_MAGIC[:6] or prefix[6:8] != NPY_MAGIC[6:8]:
+        raise ValueError(f"{handle.name} is not a version 1 .npy file")
+    return len(prefix) + struct.unpack("<H", prefix[-2:])[0]
+
+
+def _write_atomic(path: Path, chunks: Iterable[bytes]) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    with tmp.open("wb") as handle:
+        for chunk in chunks:
+            handle.write(chunk)
+    os.replace(tmp, path)
+
+
+class SessionWriter:
+    """Append readings column-wise to a session directory or Parquet file."""
+
+    def __init__(
+        self,
+        path: str | Path,
+        chunk_rows: int = CHUNK_ROWS,
+        max_age: float | None = MAX_AGE,
+        compact: bool = True,
+        source: dict[str, Any] | None = None,
+    ) -> None:
+        if chunk_rows < 1:
+            raise ValueError("chunk_rows must be at least 1")
+        self.path = Path(path)
+        self.parquet = self.path.suffix == ".parquet"
+        self.chunk_rows = chunk_rows
+        self.max_age = max_age
+        self.compact = compact
+        self.source = source  # what a converted session was made from, kept in the manifest
+        self.rows_written = 0
+        self.skipped = 0
+        self.segments: list[dict[str, Any]] = []
+        self._sorted = True
+        self._last_ts = -(2**63)
+        self._columns = {name: array(code) for name, (_, code) in COLUMNS.items()}
+        self._oldest: float | None = None
+        self._closed = False
+        self._parquet_writer: Any = None
+        if not self.parquet:
+            self.path.mkdir(parents=True, exist_ok=True)
+            if (self.path / MANIFEST).exists():
+                raise FileExistsError(f"{self.path} already holds a session")
+            self._write_manifest()
+
+    def __enter__(self) -> SessionWriter:
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return self.rows_written + len(self._columns["ts"])
+
+    def append(self, timestamp: Any, device_id: Any, bpm: Any, rr_ms: Any = None) -> bool:
+        """Buffer one reading; returns False (and counts it) if it cannot be stored."""
+        if self._closed:
+            raise ValueError("write to a closed session")
+        try:
+            ts = epoch_ns(timestamp)
+            device = int(device_id)
+            value = float(bpm)
+            if not (0 <= device <= 0xFFFFFFFF and 0 < value < math.inf and -(2**63) <= ts < 2**63):
+                raise ValueError(device, value)
+        except (TypeError, ValueError, OverflowError):
+            self.skipped += 1
+            return False
+        columns = self._columns
+        columns["ts"].append(ts)
+        columns["device"].append(device)
+        columns["bpm"].append(value)
+        columns["rr"].append(rr_value(rr_ms))
+        if ts < self._last_ts:
+            self._sorted = False
+        self._last_ts = ts
+        if self._oldest is None:
+            self._oldest = time.monotonic()
+        if len(columns["ts"]) >= self.chunk_rows or (
+            self.max_age is not None and time.monotonic() - self._oldest >= self.max_age
+        ):
+            self.flush()
+        return True
+
+    def write_readings(self, readings: Iterable[Reading]) -> None:
+        for reading in readings:
+            self.append(*reading)
+
+    def flush(self) -> None:
+        """Write the buffered readings as one segment (or Parquet row group)."""
+        rows = len(self._columns["ts"])
+        if not rows:
+            return
+        if self.parquet:
+            self._write_row_group()
+        else:
+            self._write_segment(rows)
+        self.rows_written += rows
+        self._columns = {name: array(code) for name, (_, code) in COLUMNS.items()}
+        self._oldest = None
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self.flush()
+        self._closed = True
+        if self.parquet:
+            if self._parquet_writer is None:
+                self._write_row_group(empty=True)  # still leave a readable file
+            self._parquet_writer.close()
+        elif self.compact and len(self.segments) > 1:
+            self._compact()
+
+    def _write_segment(self, rows: int) -> None:
+        name = f"{len(self.segments):06d}"
+        for column, (descr, _) in COLUMNS.items():
+            data = self._columns[column]
+            if sys.byteorder != "little":
+                data = array(data.typecode, data)
+                data.byteswap()
+            _write_atomic(
+                self.path / f"{name}.{column}.npy", (_npy_header(descr, rows), data.tobytes())
+            )
+        ts = self._columns["ts"]
+        self.segments.append({"name": name, "rows": rows, "first_ns": ts[0], "last_ns": ts[-1]})
+        self._write_manifest()
+
+    def _compact(self) -> None:
+        """Join all segments into one file per column, then drop the old ones."""
+        rows = sum(segment["rows"] for segment in self.segments)
+        name = "all"
+        for column, (descr, _) in COLUMNS.items():
+            _write_atomic(
+                self.path / f"{name}.{column}.npy",
+                [_npy_header(descr, rows)]
+                + [self._segment_bytes(segment["name"], column) for segment in self.segments],
+            )
+        old, self.segments = self.segments, [{
+            "name": name,
+            "rows": rows,
+            "first_ns": min(segment["first_ns"] for segment in self.segments),
+            "last_ns": self.segments[-1]["last_ns"],
+        }]
+        self._write_manifest()
+        for segment in old:
+            for column in COLUMNS:
+                (self.path / f"{segment['name']}.{column}.npy").unlink(missing_ok=True)
+
+    def _segment_bytes(self, name: str, column: str) -> bytes:
+        with (self.path / f"{name}.{column}.npy").open("rb") as handle:
+            handle.seek(_npy_data_offset(handle))
+            return handle.read()
+
+    def _write_manifest(self) -> None:
+        manifest = {
+            "version": VERSION,
+            "columns": {name: descr for name, (descr, _) in COLUMNS.items()},
+            "rows": sum(segment["rows"] for segment in self.segments),
+            "sorted": self._sorted,
+            "segments": self.segments,
+        }
+        if self.source is not None:
+            manifest["source"] = self.source
+        _write_atomic(self.path / MANIFEST, [json.dumps(manifest, indent=1).encode()])
+
+    def _write_row_group(self, empty: bool = False) -> None:
+        pa, pq = _pyarrow()
+        if self._parquet_writer is None:
+            self._parquet_writer = pq.ParquetWriter(self.path, _arrow_schema(pa))
+        types = {name: pa.from_numpy_dtype(descr) for name, (descr, _) in COLUMNS.items()}
+        table = pa.table({
+            name: pa.array([] if empty else self._columns[name], type=types[name])
+            for name in COLUMNS
+        })
+        self._parquet_writer.write_table(table)
+
+
+@dataclass
+class Session:
+    """The columns of one recorded session (NumPy arrays, memory-mapped if possible)."""
+
+    path: Path
+    ts: Any
+    device: Any
+    bpm: Any
+    rr: Any
+    sorted: bool = True
+
+    def __len__(self) -> int:
+        return len(self.ts)
+
+    @property
+    def duration(self) -> float:
+        return float(self.ts[-1] - self.ts[0]) / 1e9 if len(self.ts) else 0.0
+
+    def devices(self) -> Any:
+        return _numpy().unique(self.device)
+
+    def index_at(self, ts_ns: int) -> int:
+        """The first row at or after ``ts_ns`` (the session must be sorted)."""
+        if not self.sorted:
+            raise ValueError(f"{self.path} is not in timestamp order")
+        return int(_numpy().searchsorted(self.ts, ts_ns, side="left"))
+
+    def select(
+        self,
+        device: int | None = None,
+        start_ns: int | None = None,
+        end_ns: int | None = None,
+    ) -> Session:
+        """Rows of one device and/or a ``[start_ns, end_ns)`` time range."""
+        if self.sorted:
+            lo = 0 if start_ns is None else self.index_at(start_ns)
+            hi = len(self) if end_ns is None else self.index_at(end_ns)
+            rows: Any = slice(lo, hi)
+        else:
+            rows = _numpy().ones(len(self), dtype=bool)
+            if start_ns is not None:
+                rows &= self.ts >= start_ns
+            if end_ns is not None:
+                rows &= self.ts < end_ns
+        part = Session(
+            self.path, self.ts[rows], self.device[rows], self.bpm[rows], self.rr[rows],
+            self.sorted,
+        )
+        if device is None:
+            return part
+        mask = part.device == device
+        return Session(
+            self.path, part.ts[mask], part.device[mask], part.bpm[mask], part.rr[mask],
+            self.sorted,
+        )
+
+    def readings(self, start: int = 0, stop: int | None = None) -> Iterator[Reading]:
+        """Rows as ``Reading`` tuples (epoch-second timestamps, string device ids)."""
+        stop = len(self) if stop is None else stop
+        for lo in range(start, stop, CHUNK_ROWS):
+            hi = min(stop, lo + CHUNK_ROWS)
+            ts = (self.ts[lo:hi] / 1e9).tolist()
+            devices = self.device[lo:hi].tolist()
+            bpms = self.bpm[lo:hi].astype("f8").round(3).tolist()
+            rrs = self.rr[lo:hi].astype("f8").tolist()
+            for timestamp, device, bpm, rr in zip(ts, devices, bpms, rrs):
+                yield Reading(timestamp, str(device), bpm, None if math.isnan(rr) else rr)
+
+
+def read_manifest(path: str | Path) -> dict[str, Any]:
+    """A session directory's manifest; FileNotFoundError if ``path`` is not a session."""
+    path = Path(path)
+    try:
+        manifest = json.loads((path / MANIFEST).read_text(encoding="utf-8"))
+    except (FileNotFoundError, NotADirectoryError):
+        raise FileNotFoundError(f"{path} is not a session (no {MANIFEST})") from None
+    if manifest.get("version") != VERSION:
+        raise ValueError(f"{path}: unsupported session version {manifest.get('version')!r}")
+    return manifest
+
+
+def remove_session(path: str | Path) -> None:
+    """Delete a session directory, touching only the files its manifest names."""
+    path = Path(path)
+    manifest = read_manifest(path)
+    for segment in manifest["segments"]:
+        for column in COLUMNS:
+            (path / f"{segment['name']}.{column}.npy").unlink(missing_ok=True)
+    (path / MANIFEST).unlink()
+    try:
+        path.rmdir()
+    except OSError:
+        pass  # something else lives there too; leave it
+
+
+def source_info(path: str | Path) -> dict[str, Any]:
+    """Identity of a log file, to tell whether a session converted from it is current."""
+    path = Path(path).resolve()
+    stat = path.stat()
+    return {"path": str(path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def load_session(path: str | Path, mmap: bool = True) -> Session:
+    """Open a session directory (memory-mapped unless ``mmap`` is False) or Parquet file."""
+    np = _numpy()
+    path = Path(path)
+    if path.suffix == ".parquet":
+        _, pq = _pyarrow()
+        table = pq.read_table(path, columns=list(COLUMNS))
+        columns = {
+            name: table.column(name).to_numpy().astype(descr, copy=False)
+            for name, (descr, _) in COLUMNS.items()
+        }
+        ts = columns["ts"]
+        return Session(path, **columns, sorted=bool(np.all(ts[1:] >= ts[:-1])))
+
+    manifest = read_manifest(path)
+    columns = {}
+    for name, (descr, _) in COLUMNS.items():
+        parts = [
+            np.load(path / f"{segment['name']}.{name}.npy", mmap_mode="r" if mmap else None)
+            for segment in manifest["segments"]
+        ]
+        if len(parts) == 1:
+            columns[name] = parts[0]
+        else:
+            columns[name] = np.concatenate(parts) if parts else np.empty(0, dtype=descr)
+    return Session(path, **columns, sorted=manifest.get("sorted", True))
+
+
+def convert_log(
+    source: str | Path, target: str | Path | None = None, chunk_rows: int = CHUNK_ROWS
+) -> SessionWriter:
+    """Write any log hr_logreader reads as a session; returns the closed writer."""
+    source = Path(source)
+    target = Path(target) if target else source.with_suffix(SUFFIX)
+    with SessionWriter(
+        target, chunk_rows=chunk_rows, max_age=None, source=source_info(source)
+    ) as writer:
+        writer.write_readings(iter_log_readings(source))
+    return writer
+
+
+def disk_usage(path: str | Path) -> int:
+    path = Path(path)
+    if path.is_file():
+        return path.stat().st_size
+    return sum(item.stat().st_size for item in path.iterdir() if item.is_file())
+
+
+def _arrow_schema(pa: Any) -> Any:
+    return pa.schema([(name, pa.from_numpy_dtype(descr)) for name, (descr, _) in COLUMNS.items()])
+
+
+def _numpy() -> Any:
+    try:
+        import numpy
+    except ImportError:
+        raise RuntimeError(
+            "Loading sessions requires NumPy. Install it with: pip install numpy"
+        ) from None
+    return numpy
+
+
+def _pyarrow() -> tuple[Any, Any]:
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise RuntimeError(
+            "Parquet sessions require pyarrow. Install it with: pip install pyarrow"
+        ) from None
+    return pyarrow, pyarrow.parquet
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Convert HR logs to columnar sessions")
+    ap.add_argument("logs", nargs="*", help="CSV or JSONL logs to convert")
+    ap.add_argument(
+        "--out", help=f"Output session (default: the log name with {SUFFIX}; .parquet for Parquet)"
+    )
+    ap.add_argument(
+        "--chunk-rows", type=int, default=CHUNK_ROWS,
+        help=f"Readings per segment or row group (default: {CHUNK_ROWS})",
+    )
+    ap.add_argument("--info", nargs="+", default=[], metavar="SESSION", help="Summarize sessions")
+    args = ap.parse_args()
+    if not args.logs and not args.info:
+        ap.error("give logs to convert or --info SESSION")
+    if args.out and len(args.logs) > 1:
+        ap.error("--out needs a single log")
+
+    for log_path in args.logs:
+        started = time.perf_counter()
+        writer = convert_log(log_path, args.out, args.chunk_rows)
+        print(
+            f"[session] {log_path} -> {writer.path}: {writer.rows_written} readings "
+            f"({writer.skipped} skipped) in {time.perf_counter() - started:.2f}s, "
+            f"{disk_usage(log_path)} -> {disk_usage(writer.path)} bytes",
+            file=sys.stderr,
+        )
+
+    if args.info:
+        _numpy()  # import outside the timing
+    for session_path in args.info:
+        started = time.perf_counter()
+        session = load_session(session_path)
+        opened = time.perf_counter() - started
+        print(
+            f"{session_path}: {len(session)} readings, {len(session.devices())} devices, "
+            f"{session.duration:.1f}s, {disk_usage(session_path)} bytes, "
+            f"opened in {opened * 1000:.1f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,8 @@
+"""Make the flat scripts in code/ importable, as they are when run from there."""
+
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+CODE = ROOT / "code"
+sys.path.insert(0, str(CODE))
@@ -0,0 +1,30 @@
+"""HR broadcast decoding for OpenantStick, without a stick attached."""
+
+from ant_source import SEARCH, OpenantStick, Page, parse_broadcast
+
+# page 4, previous beat 0x0400 (1.0 s), beat time 0x0800 (2.0 s), count 7, 72 BPM,
+# then the extended flag and device number 0x1234
+PAGE_4 = [0x84, 0xFF, 0x00, 0x04, 0x00, 0x08, 7, 72, 0x80, 0x34, 0x12, 120, 1]
+
+
+def test_parse_page_4_with_extended_id():
+    assert parse_broadcast(PAGE_4) == (0x1234, 72, 7, 2.0, 1.0)
+
+
+def test_parse_other_pages_without_extended_id():
+    assert parse_broadcast([0x00, 0, 0, 0, 0x00, 0x02, 3, 60]) == (None, 60, 3, 0.5, None)
+    assert parse_broadcast([0x00, 0, 0]) is None
+
+
+def test_forward_uses_the_tuned_id_and_skips_unidentified_search_pages():
+    posted: list[Page] = []
+    stick = OpenantStick(index=1)
+    stick._post = posted.append
+    stick._devices = {0: 51861, 1: SEARCH}
+    stick._forward(0)(PAGE_4[:8])
+    stick._forward(1)(PAGE_4[:8])
+    stick._forward(1)(PAGE_4)
+    assert posted == [
+        Page(1, 0, 51861, 72, 7, 2.0, 1.0),
+        Page(1, 1, 0x1234, 72, 7, 2.0, 1.0),
+    ]
@@ -0,0 +1,26 @@
+"""The prototype's CSV log holds ISO timestamps whichever wire format fed it."""
+
+import csv
+
+from csv_sink import CSVSink
+from group_aggregator import GroupSnapshot
+from hr_readings import Reading
+from integrated_prototype import CSV_FIELDS, CsvOutput, GroupUpdate
+
+
+def test_binary_epoch_timestamps_are_written_as_iso(tmp_path):
+    path = tmp_path / "hr_log.csv"
+    output = CsvOutput(CSVSink(path, CSV_FIELDS))
+    readings = [
+        Reading(1735732800.5, "1", 70.0, 857),  # from a binary frame
+        Reading("2025-01-01T12:00:01+00:00", "2", 80.0, None),  # from JSON
+    ]
+    output.emit(GroupUpdate(readings, GroupSnapshot(2, 75.0, 75.0), 75.0, "group", 75.0))
+    output.close()
+    with open(path, newline="") as handle:
+        rows = list(csv.DictReader(handle))
+    assert [row["timestamp"] for row in rows] == [
+        "2025-01-01T12:00:00.500000+00:00",
+        "2025-01-01T12:00:01+00:00",
+    ]
+    assert rows[0]["rr_ms"] == "857" and rows[0]["group_average_bpm"] == "75.0"
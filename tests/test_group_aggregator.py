@@ -0,0 +1,58 @@
+"""Heap-backed median and trimmed mean match a direct computation."""
+
+import math
+import random
+import statistics
+from collections import deque
+
+import pytest
+
+from group_aggregator import RESUM_EVERY, MovingStatistic, RunningStatistic
+
+
+def _trimmed(values, trim):
+    ordered = sorted(values)
+    cut = int(len(ordered) * trim)
+    return statistics.fmean(ordered[cut:len(ordered) - cut])
+
+
+@pytest.mark.parametrize("statistic", ["median", "trimmed"])
+def test_moving_window_matches_a_sorted_copy(statistic):
+    rng = random.Random(1)
+    moving = MovingStatistic(25, statistic, trim=0.2)
+    window = deque(maxlen=25)
+    for _ in range(RESUM_EVERY + 500):
+        value = round(rng.gauss(80, 12))  # repeated values cross the heap boundaries
+        window.append(value)
+        expected = statistics.median(window) if statistic == "median" else _trimmed(window, 0.2)
+        assert moving.push(value) == pytest.approx(expected)
+
+
+def test_devices_leave_and_change_in_any_order():
+    rng = random.Random(2)
+    stat, values = RunningStatistic("trimmed", trim=0.25), []
+    for _ in range(3000):
+        if len(values) > 1 and rng.random() < 0.45:
+            old = values.pop(rng.randrange(len(values)))
+            if rng.random() < 0.5:
+                stat.remove(old)
+            else:
+                new = rng.uniform(50, 150)
+                stat.replace(old, new)
+                values.append(new)
+        else:
+            values.append(rng.uniform(50, 150))
+            stat.add(values[-1])
+        assert stat.value() == pytest.approx(_trimmed(values, 0.25))
+    for heap in (stat._low, stat._high, stat._mid_min, stat._mid_max):
+        assert len(heap.items) <= 2 * heap.size + 32  # deleted entries do not pile up
+
+
+@pytest.mark.parametrize("statistic", ["median", "trimmed"])
+def test_emptied_statistic_starts_over(statistic):
+    stat = RunningStatistic(statistic)
+    stat.add(70.0)
+    stat.remove(70.0)
+    assert math.isnan(stat.value())
+    stat.add(90.0)
+    assert stat.value() == 90.0
@@ -0,0 +1,61 @@
+"""ReadingFilter drops artifacts and spikes but follows real changes of level."""
+
+import pytest
+
+from hr_filter import ReadingFilter
+from hr_readings import Reading
+from integrated_prototype import Prototype, build_parser
+
+
+def _run(bpms, **options):
+    """Filtered BPMs (None = rejected) for one device reading once a second."""
+    reading_filter = ReadingFilter(**options)
+    return [reading_filter.check("51861", bpm, float(second)) for second, bpm in enumerate(bpms)]
+
+
+def test_ant_artifacts_and_spikes_are_dropped():
+    assert _run([80, 81, 0, 82, 255, 150, 81, 82]) == [80, 81, None, 82, None, None, 81, 82]
+
+
+def test_a_sustained_new_level_is_accepted_after_window_rejections():
+    accepted = _run([70, 71, 70, 120, 121, 120, 122, 121, 120, 121], window=5)
+    assert accepted[3:7] == [None] * 4
+    assert accepted[7:] == [121, 120, 121]
+
+
+def test_rate_limit():
+    assert _run([80, 110, 81], spike=0, max_rate=20) == [80, None, 81]
+
+
+def test_stats_count_each_rejection_reason():
+    reading_filter = ReadingFilter()
+    for second, bpm in enumerate([80, 81, 0, 82, 150]):
+        reading_filter.check("a", bpm, float(second))
+    stats = reading_filter.stats()["a"]
+    assert (stats.accepted, stats.range, stats.spike, stats.rejected) == (3, 1, 1, 2)
+    assert reading_filter.quality("a") < 1.0
+
+
+def test_ema_smoothing():
+    assert _run([80, 90], smoother="ema", alpha=0.5, spike=0, max_rate=0) == [80, 85]
+
+
+def test_unknown_smoother_is_rejected():
+    with pytest.raises(ValueError):
+        ReadingFilter(smoother="median")
+
+
+def test_filter_is_off_by_default():
+    assert Prototype(build_parser().parse_args([]), []).filter is None
+    assert Prototype(build_parser().parse_args(["--filter"]), []).filter is not None
+    assert Prototype(build_parser().parse_args(["--smooth", "ema"]), []).filter is not None
+
+
+def test_simulator_jitter_between_close_readings_passes():
+    jitter = [Reading(at / 4, "a", bpm) for at, bpm in enumerate([80, 96, 80, 64, 78])]
+    assert ReadingFilter().apply(jitter) == jitter
+
+
+def test_rate_limit_follows_reading_timestamps():
+    jump = [Reading(0.0, "a", 80.0), Reading(10.0, "a", 95.0), Reading(10.5, "a", 120.0)]
+    assert [reading.bpm for reading in ReadingFilter(spike=0).apply(jump)] == [80.0, 95.0]
@@ -0,0 +1,63 @@
+"""The ReadingDecoder fast paths agree with extract_readings on awkward input."""
+
+import json
+
+import pytest
+
+from hr_readings import BACKENDS, ReadingDecoder, extract_readings
+
+TS = "2025-01-01T12:00:00Z"
+
+
+def _reading(**fields):
+    return {"device_id": 51861, "bpm": 80, "rr_ms": 750, "ts_iso": TS, **fields}
+
+
+def _without(key):
+    reading = _reading()
+    del reading[key]
+    return reading
+
+
+READINGS = [
+    _reading(),
+    _reading(device_id=None),
+    _without("device_id"),
+    _reading(bpm=None),
+    _without("bpm"),
+    _reading(bpm="abc"),
+    _reading(bpm="81.5"),
+    _reading(bpm=0),
+    _reading(bpm=-5),
+    _reading(bpm=True),
+    _reading(device_id="strap-7"),
+    _reading(device_id=0),
+]
+MESSAGES = [{"type": "hr_single", "reading": reading} for reading in READINGS] + [
+    {"type": "hr_batch", "readings": READINGS},
+    {"type": "hr_batch", "readings": [_reading(), _reading(device_id=None), _reading(bpm="x")]},
+]
+
+
+def _backends():
+    available = []
+    for backend in BACKENDS[1:]:
+        try:
+            ReadingDecoder(backend)
+        except RuntimeError:
+            continue
+        available.append(backend)
+    return available
+
+
+@pytest.mark.parametrize("backend", _backends())
+@pytest.mark.parametrize("message", MESSAGES, ids=lambda message: json.dumps(message)[:80])
+def test_fast_path_matches_fallback(backend, message):
+    line = json.dumps(message).encode()
+    assert ReadingDecoder(backend).decode(line) == extract_readings(json.loads(line))
+
+
+
+def test_null_device_is_not_a_device_named_none():
+    line = json.dumps({"type": "hr_single", "reading": _reading(device_id=None)})
+    assert ReadingDecoder("json").decode(line) == []
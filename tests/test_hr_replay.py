@@ -0,0 +1,55 @@
+"""SessionReplay plays a session back in time order, batched by --batch-ms."""
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from hr_replay import SessionReplay  # noqa: E402
+from session_store import SessionWriter, load_session  # noqa: E402
+
+T0 = 1_735_732_800.0  # 2025-01-01T12:00:00Z
+ROWS = [  # (seconds after T0, device, bpm, rr_ms), recorded out of order
+    (0.000, 1, 70.0, 857),
+    (0.004, 2, 80.0, None),
+    (1.000, 1, 71.0, 845),
+    (0.500, 2, 81.0, 740),
+    (2.000, 2, 82.0, 731),
+]
+
+
+@pytest.fixture
+def session(tmp_path):
+    with SessionWriter(tmp_path / "s.session") as writer:
+        for offset, device, bpm, rr in ROWS:
+            writer.append(T0 + offset, device, bpm, rr)
+    return load_session(tmp_path / "s.session")
+
+
+def _played(replay):
+    return [
+        [(reading["device_id"], reading["bpm"], reading["rr_ms"]) for reading in batch]
+        for batch in replay.batches()
+    ]
+
+
+def test_readings_come_back_in_time_order_and_batched(session):
+    assert _played(SessionReplay(session, speed=0, batch_ms=10)) == [
+        [(1, 70.0, 857), (2, 80.0, None)],
+        [(2, 81.0, 740)],
+        [(1, 71.0, 845)],
+        [(2, 82.0, 731)],
+    ]
+
+
+def test_start_and_end_select_a_window(session):
+    replay = SessionReplay(
+        session, speed=0, start_ns=int((T0 + 0.5) * 1e9), end_ns=int((T0 + 2.0) * 1e9)
+    )
+    assert _played(replay) == [[(2, 81.0, 740)], [(1, 71.0, 845)]]
+    assert (replay.sent, replay.sent_batches) == (2, 2)
+
+
+def test_messages_use_the_live_shapes(session):
+    messages = list(SessionReplay(session, speed=0).messages())
+    assert [message["type"] for message in messages] == ["hr_batch"] + ["hr_single"] * 3
+    assert messages[1]["reading"]["ts_iso"].startswith("2025-01-01T12:00:00.5")
@@ -0,0 +1,101 @@
+"""SynchronyEngine finds the lagged correlation between two known signals."""
+
+import importlib.util
+import random
+import sys
+
+import pytest
+
+import hr_synchrony
+from hr_synchrony import SynchronyEngine
+
+PERIOD = 0.5  # the default 2 Hz grid
+TICKS = 60  # one 30 s window
+
+needs_numpy = pytest.mark.skipif(importlib.util.find_spec("numpy") is None, reason="needs numpy")
+
+
+def _noise(count, seed):
+    rng = random.Random(seed)
+    return [rng.gauss(80.0, 5.0) for _ in range(count)]
+
+
+def _feed(engine, signals, start=0):
+    """Sample each device's signal once per grid tick; returns the next tick."""
+    length = len(next(iter(signals.values())))
+    for tick in range(length):
+        for device_id, signal in signals.items():
+            engine.update(device_id, signal[tick])
+        engine.advance((start + tick) * PERIOD)
+    return start + length
+
+
+def _lagged(lag_ticks, seed=1):
+    """Device b repeats device a ``lag_ticks`` grid ticks later (earlier if negative)."""
+    source = _noise(TICKS + abs(lag_ticks), seed)
+    a, b = source[abs(lag_ticks):], source[: TICKS]
+    if lag_ticks < 0:
+        a, b = b, a
+    return {"a": a, "b": b}
+
+
+@needs_numpy
+@pytest.mark.parametrize("lag_ticks", [0, 4, -4])
+def test_a_lag_within_max_lag_is_found_either_way_round(lag_ticks):
+    engine = SynchronyEngine(window=30.0, max_lag=5.0)
+    _feed(engine, _lagged(lag_ticks))
+    result = engine.compute()
+    assert result.pairs == 1
+    assert result.group > 0.85
+    assert result.devices["a"] == result.devices["b"] == result.group
+
+
+@needs_numpy
+def test_a_lag_beyond_max_lag_is_not_synchrony():
+    engine = SynchronyEngine(window=30.0, max_lag=1.0)
+    _feed(engine, _lagged(4))
+    assert engine.compute().group < 0.5
+
+
+@needs_numpy
+def test_pair_blocks_do_not_change_the_result(monkeypatch):
+    signals = {f"d{i}": _noise(TICKS, seed=i) for i in range(6)}
+    signals["copy"] = signals["d0"]
+
+    def run():
+        engine = SynchronyEngine(window=30.0, max_lag=2.0)
+        _feed(engine, signals)
+        return engine.compute()
+
+    whole = run()
+    monkeypatch.setattr(hr_synchrony, "PAIR_BLOCK", 4)
+    blocked = run()
+    assert whole.pairs == blocked.pairs == 21
+    assert blocked.group == pytest.approx(whole.group)
+    assert blocked.devices == pytest.approx(whole.devices)
+    assert whole.devices["copy"] == pytest.approx(whole.devices["d0"])
+
+
+@needs_numpy
+def test_old_samples_leave_the_window():
+    engine = SynchronyEngine(window=30.0, max_lag=2.0)
+    tick = _feed(engine, _lagged(0))
+    assert engine.compute().group > 0.99
+    _feed(engine, {"a": _noise(TICKS, seed=2), "b": _noise(TICKS, seed=3)}, start=tick)
+    assert engine.compute().group < 0.5
+
+
+@needs_numpy
+def test_devices_need_half_a_window_and_can_leave():
+    engine = SynchronyEngine(window=30.0)
+    signals = _lagged(0)
+    _feed(engine, {device_id: signal[: TICKS // 2 - 1] for device_id, signal in signals.items()})
+    assert engine.compute().pairs == 0
+    engine.remove("b")
+    assert len(engine) == 1 and "b" not in engine.compute().devices
+
+
+def test_numpy_is_required(monkeypatch):
+    monkeypatch.setitem(sys.modules, "numpy", None)
+    with pytest.raises(RuntimeError, match="pip install numpy"):
+        SynchronyEngine()
@@ -0,0 +1,85 @@
+"""Binary frames carry the same readings as newline JSON and skip what they cannot."""
+
+import io
+
+from hr_wire import FRAME_COUNT, MAGIC, RECORD, MessageWriter, read_batches
+
+BATCH = {"type": "hr_batch", "readings": [
+    {"ts_iso": "2025-01-01T12:00:00+00:00", "device_id": 10001, "bpm": 72.5, "rr_ms": 828},
+    {"ts_iso": "2025-01-01T12:00:00+00:00", "device_id": 10002, "bpm": 64.0, "rr_ms": None},
+]}
+SINGLE = {"type": "hr_single", "reading": {"ts_iso": 1735732801.5, "device_id": 51861, "bpm": 90}}
+
+
+def _batches(fmt):
+    stream = io.BytesIO()
+    writer = MessageWriter(fmt, stream)
+    writer.emit(BATCH)
+    writer.emit(SINGLE)
+    stream.seek(0)
+    return [
+        [(r.device_id, r.bpm, r.rr_ms) for r in readings]
+        for _, readings in read_batches(stream)
+    ]
+
+
+def test_binary_and_json_streams_decode_alike():
+    expected = [
+        [("10001", 72.5, 828), ("10002", 64.0, None)],
+        [("51861", 90.0, None)],
+    ]
+    assert _batches("binary") == expected
+    assert _batches("json") == expected
+
+
+def test_binary_timestamps_are_epoch_seconds():
+    stream = io.BytesIO()
+    MessageWriter("binary", stream).emit(SINGLE)
+    stream.seek(0)
+    [(_, [reading])] = read_batches(stream)
+    assert reading.timestamp == 1735732801.5
+
+
+def test_binary_writer_skips_unencodable_readings():
+    stream = io.BytesIO()
+    writer = MessageWriter("binary", stream)
+    writer.emit({"type": "hr_batch", "readings": [
+        {"ts_iso": 1.0, "device_id": 10001, "bpm": 72.0, "rr_ms": 833},
+        {"ts_iso": 1.0, "device_id": "strap-a", "bpm": 80.0},
+        {"ts_iso": 1.0, "device_id": None, "bpm": 80.0},
+        {"ts_iso": 1.0, "device_id": -1, "bpm": 80.0},
+        {"ts_iso": 1.0, "device_id": 10002, "bpm": "n/a"},
+    ]})
+    writer.emit({"type": "hr_single", "reading": {"ts_iso": 2.0, "device_id": "51861", "bpm": 64}})
+    assert writer.skipped == 4
+
+    stream.seek(0)
+    batches = [readings for _, readings in read_batches(stream)]
+    assert [[(r.device_id, r.bpm, r.rr_ms) for r in batch] for batch in batches] == [
+        [("10001", 72.0, 833)],
+        [("51861", 64.0, None)],
+    ]
+
+
+def test_binary_frames_drop_what_json_readers_drop():
+    stream = io.BytesIO()
+    writer = MessageWriter("binary", stream)
+    writer.emit({"type": "hr_batch", "readings": [
+        {"ts_iso": 1.0, "device_id": 1, "bpm": 0},
+        {"ts_iso": 1.0, "device_id": 2, "bpm": -60},
+        {"ts_iso": 1.0, "device_id": 3, "bpm": float("nan")},
+        {"ts_iso": 1.0, "device_id": 4, "bpm": float("inf")},
+        {"ts_iso": 1.0, "device_id": 5, "bpm": 70, "rr_ms": [850, 857]},
+        {"ts_iso": 1.0, "device_id": 6, "bpm": 70, "rr_ms": float("nan")},
+    ]})
+    assert writer.skipped == 4
+    stream.seek(0)
+    [(_, readings)] = read_batches(stream)
+    assert [(r.device_id, r.rr_ms) for r in readings] == [("5", 857), ("6", None)]
+
+
+def test_zero_bpm_records_from_older_writers_are_skipped():
+    records = [RECORD.pack(1.0, 1, 0, 0xFFFF), RECORD.pack(1.0, 2, 700, 857)]
+    stream = io.BytesIO(MAGIC + FRAME_COUNT.pack(2) + b"".join(records))
+    [(_, readings)] = read_batches(stream)
+    assert [(r.device_id, r.bpm) for r in readings] == [("2", 70.0)]
@@ -0,0 +1,90 @@
+"""HRV from running sums matches a direct computation, counting each beat once."""
+
+import math
+import random
+import statistics
+
+import pytest
+
+from hrv import HrvEngine, RRWindow
+
+BEATS = [800.0, 900.0] * 20  # RMSSD 100 ms
+
+
+def _direct(intervals):
+    deltas = [b - a for a, b in zip(intervals, intervals[1:])]
+    return (
+        math.sqrt(sum(d * d for d in deltas) / len(deltas)),
+        statistics.stdev(intervals),
+        100.0 * sum(abs(d) > 50 for d in deltas) / len(deltas),
+    )
+
+
+def test_running_sums_match_the_window():
+    rng = random.Random(3)
+    window = RRWindow(window_ms=30_000)
+    intervals = []
+    for _ in range(500):
+        rr = rng.uniform(600, 1000)
+        window.add(rr)
+        intervals.append(rr)
+    kept = list(window.rr)
+    assert kept == intervals[-len(kept):]
+    assert sum(kept) <= 30_000 < sum(intervals[-len(kept) - 1:])
+    metrics = window.metrics()
+    for value, expected in zip((metrics.rmssd, metrics.sdnn, metrics.pnn50), _direct(kept)):
+        assert value == pytest.approx(expected)
+
+
+def test_devices_report_after_min_beats_and_the_group_averages_them():
+    engine = HrvEngine(window=60.0, min_beats=3)
+    for at, rr in enumerate((800, 900)):
+        engine.add("a", rr, at)
+        engine.add("b", rr - 100, at)
+    assert engine.device("a") is None and engine.group() is None
+    engine.add("a", 800, 2.0)
+    engine.add("b", [700, 900], 2.0)  # a list carries several beats
+    a, b = engine.device("a"), engine.device("b")
+    assert (a.rmssd, b.rmssd) == (100.0, pytest.approx(math.sqrt(60_000 / 3)))
+    assert engine.group().rmssd == pytest.approx((a.rmssd + b.rmssd) / 2)
+    engine.remove("b")
+    assert engine.group().rmssd == a.rmssd
+
+
+def test_readings_without_plausible_rr_are_ignored():
+    engine = HrvEngine()
+    assert not engine.add("a", None, 0.0)
+    assert not engine.add("a", 90, 0.0)  # 667 bpm
+    assert not engine.add("a", "n/a", 0.0)
+    assert "a" not in engine.windows
+
+
+def beats(page_rate: float):
+    """``(at, rr_ms)`` readings: every beat, repeated at ``page_rate`` until the next."""
+    at = 1_700_000_000.0
+    for rr in BEATS:
+        at += rr / 1000.0
+        pages = int(rr / 1000.0 * page_rate) or 1
+        for page in range(pages):
+            yield at + page * rr / 1000.0 / pages, rr
+
+
+@pytest.mark.parametrize("page_rate", [0.0, 4.0, 8.0])
+def test_repeated_rr_does_not_collapse_rmssd(page_rate):
+    engine = HrvEngine(window=60.0)
+    for at, rr in beats(page_rate):
+        engine.add("1", rr, at)
+    metrics = engine.device("1")
+    assert metrics is not None and metrics.beats == len(BEATS)
+    assert math.isclose(metrics.rmssd, 100.0)
+    assert math.isclose(metrics.pnn50, 100.0)
+
+
+def test_repeats_need_a_new_interval_or_a_missed_beat():
+    engine = HrvEngine(window=60.0, min_beats=2)
+    assert engine.add("1", 800, 0.0)
+    assert not engine.add("1", 800, 0.3)  # within half an interval
+    assert not engine.add("1", 800, 0.6)  # same interval, next beat not yet due
+    assert engine.add("1", 820, 0.82)  # a new interval is a new beat
+    assert engine.add("1", 820, 2.1)  # the same one again after a missed beat
+    assert engine.device("1").beats == 3
@@ -0,0 +1,12 @@
+"""EntertainmentStream tells the user which lights it cannot stream to."""
+
+import logging
+
+from hue_entertainment import MAX_LIGHTS, EntertainmentStream
+
+
+def test_lights_beyond_the_message_limit_are_reported(caplog):
+    with caplog.at_level(logging.WARNING, logger="hrp.hue-stream"):
+        stream = EntertainmentStream(transport=None, lights=range(1, MAX_LIGHTS + 3))
+    assert stream.lights == list(range(1, MAX_LIGHTS + 1))
+    assert "not streaming to lights 11, 12" in caplog.text
@@ -0,0 +1,69 @@
+"""HueSink sends the newest state per group, survives bridge errors and flushes on close."""
+
+import threading
+import time
+
+from hue_sink import HueSink
+
+
+def test_states_submitted_within_the_interval_coalesce():
+    sends = []
+    first, second = threading.Event(), threading.Event()
+
+    def on_sent(send):
+        sends.append(send)
+        (first if len(sends) == 1 else second).set()
+
+    sink = HueSink(lambda group_id, state: None, interval=0.2, on_sent=on_sent).start()
+    sink.submit("1", "a")
+    assert first.wait(1.0)
+    for state in "bcd":
+        sink.submit("1", state)
+    assert second.wait(2.0)
+    sink.close()
+    assert [(send.state, send.coalesced) for send in sends] == [("a", 0), ("d", 2)]
+    assert sink.stats.coalesced == 2
+
+
+def test_bridge_errors_are_counted_and_the_worker_carries_on():
+    errors, sent = [], threading.Event()
+
+    def send(group_id, state):
+        if state == "bad":
+            raise OSError("bridge down")
+
+    sink = HueSink(
+        send, interval=0.0, on_sent=lambda send: sent.set(),
+        on_error=lambda group_id, exc: errors.append((group_id, str(exc))),
+    ).start()
+    sink.submit("1", "bad")
+    sink.submit("2", "good")
+    assert sent.wait(1.0)
+    sink.close()
+    assert errors == [("1", "bridge down")]
+    assert (sink.stats.failed, sink.stats.sent) == (1, 1)
+
+
+def test_close_flushes_the_pending_state():
+    sent = []
+    sink = HueSink(lambda group_id, state: sent.append((group_id, state)), interval=60.0).start()
+    for value in range(5):
+        sink.submit("1", value)
+    time.sleep(0.05)
+    sink.submit("1", "final")
+    sink.submit("2", "other")
+    sink.close()
+    assert ("1", "final") in sent and ("2", "other") in sent
+    assert sink.pending() == 0
+
+
+def test_close_is_bounded_when_the_bridge_hangs():
+    release = threading.Event()
+    sink = HueSink(lambda group_id, state: release.wait(), interval=0.0).start()
+    sink.submit("1", "stuck")
+    time.sleep(0.05)
+    sink.submit("1", "final")
+    started = time.monotonic()
+    sink.close(timeout=0.2)
+    assert time.monotonic() - started < 1.0
+    release.set()
@@ -0,0 +1,76 @@
+"""Replaying a log converts it into a cache, never next to the log."""
+
+import os
+import shutil
+
+import pytest
+
+from conftest import ROOT
+
+pytest.importorskip("numpy")
+
+import session_store  # noqa: E402
+from hr_logreader import open_log  # noqa: E402
+from hr_replay import cached_session_path, open_session  # noqa: E402
+from session_store import MANIFEST, remove_session  # noqa: E402
+
+LOG = ROOT / "outputs" / "hr_logs" / "hr_stream_001.jsonl"
+
+
+@pytest.fixture
+def log(tmp_path):
+    logs = tmp_path / "logs"
+    logs.mkdir()
+    return shutil.copy(LOG, logs)
+
+
+def test_replay_leaves_the_log_directory_alone(log, tmp_path):
+    cache = tmp_path / "cache"
+    before = sorted(os.listdir(os.path.dirname(log)))
+    session = open_session(log, cache)
+    assert len(session) > 0
+    assert sorted(os.listdir(os.path.dirname(log))) == before
+    assert session.path == cached_session_path(log, cache)
+
+
+def test_conversion_is_reused_until_the_log_changes(log, tmp_path):
+    cache = tmp_path / "cache"
+    manifest = open_session(log, cache).path / MANIFEST
+    converted = manifest.stat().st_mtime_ns
+    assert (open_session(log, cache).path / MANIFEST).stat().st_mtime_ns == converted
+
+    with open_log(LOG) as stream:
+        lines = stream.read().decode().splitlines(keepends=True)
+    with open(log, "w", encoding="utf-8") as handle:
+        handle.writelines(lines + lines[-1:])
+    assert len(open_session(log, cache)) == len(open_session(LOG, cache)) + 1
+
+
+def test_a_foreign_directory_at_the_cache_path_is_not_deleted(log, tmp_path):
+    cache = tmp_path / "cache"
+    target = cached_session_path(log, cache)
+    target.mkdir(parents=True)
+    (target / "notes.txt").write_text("keep me")
+    with pytest.raises(FileNotFoundError):
+        open_session(log, cache)
+    assert (target / "notes.txt").read_text() == "keep me"
+
+
+def test_remove_session_only_deletes_what_the_manifest_names(log, tmp_path):
+    session = open_session(log, tmp_path / "cache")
+    (session.path / "notes.txt").write_text("keep me")
+    remove_session(session.path)
+    assert sorted(os.listdir(session.path)) == ["notes.txt"]
+
+
+def test_a_failed_conversion_uses_one_finished_elsewhere(log, tmp_path, monkeypatch):
+    cache = tmp_path / "cache"
+    target = cached_session_path(log, cache)
+
+    def convert_log(source, partial):  # another replay finishes first, then ours fails
+        session_store.convert_log(source, target)
+        raise OSError("disk full")
+
+    monkeypatch.setattr("hr_replay.convert_log", convert_log)
+    assert open_session(log, cache).path == target
+    assert sorted(os.listdir(cache)) == [target.name]
@@ -0,0 +1,27 @@
+"""Every hr_session_runner workflow runs in-process for a few ticks."""
+
+import argparse
+
+import pytest
+
+from hr_session_runner import SessionReport, run_inproc
+
+EXPECTED = {"sim": '"type": "hr_batch"', "router": "[router] ts=", "hue": "[sim-hue] group="}
+
+
+def _args(mode, duration=0.3):
+    return argparse.Namespace(
+        mode=mode, source="multi", devices=3, hz=20.0, duration=duration
+    )
+
+
+@pytest.mark.parametrize("mode", ["sim", "router", "osc", "hue"])
+def test_inproc_mode_runs(mode, capsys, monkeypatch):
+    monkeypatch.setattr("hr_session_runner.HUE_STAGE", ("Office", 0.1))
+    report = SessionReport()
+    run_inproc(_args(mode), report)
+    report.print("inproc")
+    out = capsys.readouterr().out
+    assert EXPECTED.get(mode, "[router] ts=") in out
+    assert "[runner] stopped." in out
+    assert "[report] latency ms:" in out